@@ -0,0 +1,93 @@
+"""Micro-benchmark: cost of serializing 100 rows for the list endpoints.
+
+    python -m benchmarks.bench_serialization [--rows 100] [--repeat 200]
+
+Compares the old path (per-row from_orm, response_model=dict re-validation
+through jsonable_encoder, stdlib json) with the bulk TypeAdapter + orjson path.
+"""
+from datetime import datetime, timedelta
+from timeit import repeat
+import argparse
+import json
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from models import User, Appointment, UserType, AppointmentStatus
+from schemas.user_schema import UserResponse
+from schemas.appointment_schema import AppointmentResponse
+from utils.serialization import serialize_appointments, serialize_users
+
+def make_user(index: int, user_type: UserType) -> User:
+    doctor = user_type == UserType.doctor
+    return User(
+        id=index, full_name=f"User {index}", email=f"user{index}@example.com",
+        mobile_number=f"+88017{index:08d}", password="x", user_type=user_type,
+        address_division="Dhaka", address_district="Dhaka", address_thana="Gulshan",
+        license_number="BMDC-1" if doctor else None, experience_years=10 if doctor else None,
+        consultation_fee=1000.0 if doctor else None, specialization="Cardiology" if doctor else None,
+        available_timeslots=[
+            (datetime(2025, 1, 1, 9) + timedelta(days=day, minutes=30 * slot)).strftime("%Y-%m-%d %H:%M:%S")
+            for day in range(20) for slot in range(6)
+        ] if doctor else None,
+        created_at=datetime(2024, 1, 1),
+    )
+
+def make_appointments(rows: int) -> list:
+    doctor = make_user(1, UserType.doctor)
+    appointments = []
+    for index in range(rows):
+        appointment = Appointment(
+            id=index, patient_id=100 + index, doctor_id=1,
+            appointment_datetime=datetime(2025, 1, 1, 9) + timedelta(hours=index),
+            notes="Follow-up", status=AppointmentStatus.pending, created_at=datetime(2024, 12, 1),
+        )
+        appointment.patient = make_user(100 + index, UserType.patient)
+        appointment.doctor = doctor
+        appointments.append(appointment)
+    return appointments
+
+def legacy_appointments(appointments):
+    payload = {
+        "appointments": [AppointmentResponse.from_orm(apt) for apt in appointments],
+        "total": len(appointments), "skip": 0, "limit": len(appointments),
+    }
+    return json.dumps(jsonable_encoder(payload)).encode()
+
+def fast_appointments(appointments):
+    payload = {
+        "appointments": serialize_appointments(appointments),
+        "total": len(appointments), "skip": 0, "limit": len(appointments),
+    }
+    return orjson.dumps(payload)
+
+def legacy_users(users):
+    payload = {"users": [UserResponse.from_orm(user) for user in users], "total": len(users)}
+    return json.dumps(jsonable_encoder(payload)).encode()
+
+def fast_users(users):
+    return orjson.dumps({"users": serialize_users(users), "total": len(users)})
+
+def measure(function, argument, repeat_count: int) -> float:
+    """Best time per call in microseconds"""
+    return min(repeat(lambda: function(argument), number=repeat_count, repeat=5)) / repeat_count * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serialization cost per page of rows")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    appointments = make_appointments(args.rows)
+    users = [appointment.patient for appointment in appointments]
+
+    for name, legacy, fast, rows in (
+        ("appointments", legacy_appointments, fast_appointments, appointments),
+        ("users", legacy_users, fast_users, users),
+    ):
+        legacy_us = measure(legacy, rows, args.repeat)
+        fast_us = measure(fast, rows, args.repeat)
+        print(
+            f"{name:<13} {args.rows} rows: legacy {legacy_us:>9.0f} us  fast {fast_us:>9.0f} us  "
+            f"({legacy_us / fast_us:.1f}x, {len(fast(rows)) / 1024:.0f} KiB)"
+        )
@@ -0,0 +1,379 @@
+"""Deterministic synthetic dataset generator for load and capacity testing.
+
+Rows are produced by generators and streamed straight into PostgreSQL with
+COPY (or into CSV files for offline use), so memory stays flat no matter how
+many rows are requested. The same seed always produces the same dataset.
+
+    python -m benchmarks.datagen --doctors 5000 --patients 500000 --appointments 5000000 --load
+    python -m benchmarks.datagen --appointments 100000 --output-dir /tmp/dataset --gzip
+"""
+from datetime import datetime, date, timedelta
+from bisect import bisect_left
+from itertools import accumulate
+from time import perf_counter
+import argparse
+import csv
+import gzip
+import io
+import os
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+DIVISIONS = {
+    # division: (population weight, districts)
+    "Dhaka": (0.30, ["Dhaka", "Gazipur", "Narayanganj", "Tangail", "Faridpur"]),
+    "Chattogram": (0.20, ["Chattogram", "Cox's Bazar", "Cumilla", "Noakhali", "Feni"]),
+    "Rajshahi": (0.11, ["Rajshahi", "Bogura", "Pabna", "Naogaon"]),
+    "Khulna": (0.10, ["Khulna", "Jashore", "Kushtia", "Satkhira"]),
+    "Rangpur": (0.09, ["Rangpur", "Dinajpur", "Kurigram"]),
+    "Mymensingh": (0.08, ["Mymensingh", "Jamalpur", "Netrokona"]),
+    "Sylhet": (0.07, ["Sylhet", "Moulvibazar", "Habiganj"]),
+    "Barishal": (0.05, ["Barishal", "Patuakhali", "Bhola"]),
+}
+SPECIALIZATIONS = {
+    # specialization: (share of doctors, base fee)
+    "Medicine": (0.22, 600), "Pediatrics": (0.12, 700), "Gynecology": (0.12, 800),
+    "Cardiology": (0.08, 1200), "Orthopedics": (0.08, 1000), "Dermatology": (0.08, 800),
+    "ENT": (0.07, 700), "Ophthalmology": (0.07, 700), "Neurology": (0.06, 1500),
+    "Psychiatry": (0.05, 1200), "Oncology": (0.05, 2000),
+}
+FIRST_NAMES = [
+    "Abdul", "Rahim", "Karim", "Fatema", "Ayesha", "Nusrat", "Tanvir", "Sakib", "Mehedi", "Farhana",
+    "Shirin", "Imran", "Rafiq", "Jahid", "Sumaiya", "Tahmina", "Arif", "Nasrin", "Habib", "Salma",
+]
+LAST_NAMES = [
+    "Rahman", "Hossain", "Islam", "Ahmed", "Khan", "Chowdhury", "Uddin", "Akter", "Begum", "Sarkar",
+    "Talukder", "Mia", "Sheikh", "Haque", "Alam", "Siddique",
+]
+# Relative booking volume per month (winter flu season, Ramadan dip) and weekday (Sunday closed)
+MONTH_WEIGHTS = [1.15, 1.10, 1.00, 0.95, 0.90, 0.95, 1.05, 1.05, 1.00, 0.95, 1.00, 1.10]
+WEEKDAY_WEIGHTS = [1.10, 1.05, 1.00, 1.00, 0.85, 1.20, 0.0]
+
+DAY_START_HOUR = 9
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = (18 - DAY_START_HOUR) * 60 // SLOT_MINUTES
+
+USER_COLUMNS = [
+    "id", "full_name", "email", "mobile_number", "password", "user_type",
+    "address_division", "address_district", "address_thana", "profile_image",
+    "license_number", "experience_years", "consultation_fee", "available_timeslots",
+    "specialization", "created_at", "updated_at",
+]
+APPOINTMENT_COLUMNS = [
+    "id", "patient_id", "doctor_id", "appointment_datetime", "notes", "status", "created_at", "updated_at",
+]
+REPORT_COLUMNS = [
+    "id", "doctor_id", "month", "total_patients", "total_appointments", "total_earnings", "created_at", "job_id", "updated_at",
+]
+
+class DatasetSpec:
+    """Sizes and shape of a generated dataset"""
+
+    def __init__(self, doctors: int = 50, patients: int = 2_000, appointments: int = 20_000,
+                 seed: int = 42, history_days: int = 730, future_days: int = 60,
+                 password_hash: str = None, now: datetime = None):
+        self.doctors = doctors
+        self.patients = patients
+        self.appointments = appointments
+        self.seed = seed
+        self.history_days = history_days
+        self.future_days = future_days
+        self.password_hash = password_hash
+        self.now = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+    @property
+    def first_doctor_id(self) -> int:
+        return 2
+
+    @property
+    def first_patient_id(self) -> int:
+        return 2 + self.doctors
+
+def _weighted(rng: random.Random, table: dict) -> str:
+    keys = list(table)
+    return rng.choices(keys, [table[key][0] for key in keys])[0]
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def slot_time(day: date, slot: int) -> datetime:
+    minutes = DAY_START_HOUR * 60 + slot * SLOT_MINUTES
+    return datetime(day.year, day.month, day.day, minutes // 60, minutes % 60)
+
+def generate_users(spec: DatasetSpec):
+    """Yield user rows (admin, doctors, patients) in USER_COLUMNS order"""
+    rng = random.Random(spec.seed)
+    created = spec.now - timedelta(days=spec.history_days + 30)
+    password = spec.password_hash or "!"
+
+    yield (1, "System Admin", "admin@bench.example.com", "+8801000000000", password, "admin",
+           "Dhaka", "Dhaka", None, None, None, None, None, None, None, created, created)
+
+    today = spec.now.date()
+    for index in range(spec.doctors):
+        division = _weighted(rng, DIVISIONS)
+        specialization = _weighted(rng, SPECIALIZATIONS)
+        experience = min(40, int(rng.expovariate(1 / 10)) + 1)
+        fee = round(SPECIALIZATIONS[specialization][1] * (1 + experience / 20) / 100) * 100
+        # Weekly chamber pattern: 3-5 working days with a contiguous block of slots
+        working_days = set(rng.sample(range(6), rng.randint(3, 5)))
+        first_slot = rng.randrange(0, SLOTS_PER_DAY - 6)
+        last_slot = min(SLOTS_PER_DAY, first_slot + rng.randint(4, 10))
+        slots = [
+            slot_time(today + timedelta(days=offset), slot).strftime("%Y-%m-%d %H:%M:%S")
+            for offset in range(1, 29)
+            if (today + timedelta(days=offset)).weekday() in working_days
+            for slot in range(first_slot, last_slot)
+        ]
+        row = (spec.first_doctor_id + index, f"Dr. {_name(rng)}", f"doctor{index}@bench.example.com",
+               f"+88017{index:08d}", password, "doctor",
+               division, rng.choice(DIVISIONS[division][1]), None, None,
+               f"BMDC-{index:06d}", experience, float(fee), slots, specialization,
+               created + timedelta(days=rng.randint(0, 30)))
+        # updated_at = created_at
+        yield row + (row[-1],)
+
+    for index in range(spec.patients):
+        division = _weighted(rng, DIVISIONS)
+        row = (spec.first_patient_id + index, _name(rng), f"patient{index}@bench.example.com",
+               f"+88018{index:08d}", password, "patient",
+               division, rng.choice(DIVISIONS[division][1]), None, None,
+               None, None, None, None, None,
+               created + timedelta(days=rng.randint(0, spec.history_days)))
+        yield row + (row[-1],)
+
+def _status(rng: random.Random, moment: datetime, now: datetime) -> str:
+    roll = rng.random()
+    if moment < now - timedelta(days=1):
+        # Past: mostly completed, some cancellations and unresolved no-shows
+        if roll < 0.78:
+            return "completed"
+        if roll < 0.93:
+            return "cancelled"
+        return "confirmed"
+    if roll < 0.55:
+        return "confirmed"
+    if roll < 0.90:
+        return "pending"
+    return "cancelled"
+
+def generate_appointments(spec: DatasetSpec, report_totals: dict = None):
+    """Yield appointment rows in APPOINTMENT_COLUMNS order.
+
+    Bookings are spread over days by month/weekday seasonality and over
+    doctors by a skewed popularity; a doctor never gets two bookings in the
+    same slot. When ``report_totals`` is given it is filled with completed
+    appointment counts per (doctor_id, "YYYY-MM") for generate_reports().
+    """
+    rng = random.Random(spec.seed + 1)
+    today = spec.now.date()
+    days = [today + timedelta(days=offset) for offset in range(-spec.history_days, spec.future_days)]
+    day_weights = [MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()] for day in days]
+    total_weight = sum(day_weights)
+
+    popularity = list(accumulate(rng.paretovariate(1.5) for _ in range(spec.doctors)))
+    next_id = 1
+    carry = 0.0
+
+    for day, weight in zip(days, day_weights):
+        carry += spec.appointments * weight / total_weight
+        budget = min(int(carry), spec.appointments - next_id + 1)
+        carry -= budget
+        if budget <= 0:
+            continue
+
+        per_doctor = {}
+        for _ in range(budget):
+            doctor = bisect_left(popularity, rng.random() * popularity[-1])
+            per_doctor[doctor] = per_doctor.get(doctor, 0) + 1
+
+        for doctor, count in sorted(per_doctor.items()):
+            doctor_id = spec.first_doctor_id + doctor
+            for slot in rng.sample(range(SLOTS_PER_DAY), min(count, SLOTS_PER_DAY)):
+                moment = slot_time(day, slot)
+                status = _status(rng, moment, spec.now)
+                if report_totals is not None and status == "completed":
+                    key = (doctor_id, moment.strftime("%Y-%m"))
+                    report_totals[key] = report_totals.get(key, 0) + 1
+                created = min(moment - timedelta(hours=1), spec.now) - timedelta(days=rng.randint(0, 21))
+                yield (next_id, spec.first_patient_id + rng.randrange(spec.patients), doctor_id,
+                       moment, None, status, created, created)
+                next_id += 1
+
+def generate_reports(spec: DatasetSpec, report_totals: dict, fees: dict):
+    """Yield monthly report rows for completed months from appointment totals.
+
+    total_patients is approximated by the appointment count: tracking distinct
+    patients per doctor-month would mean holding every patient id in memory.
+    """
+    current_month = spec.now.strftime("%Y-%m")
+    report_id = 1
+    for (doctor_id, month), completed in sorted(report_totals.items()):
+        if month >= current_month:
+            continue
+        year, month_number = int(month[:4]), int(month[5:])
+        created = datetime(year + month_number // 12, month_number % 12 + 1, 1, 2)
+        yield (report_id, doctor_id, month, completed, completed,
+               completed * fees.get(doctor_id, 0.0), created, None, created)
+        report_id += 1
+
+def _csv_value(value):
+    if value is None:
+        return None
+    if isinstance(value, list):
+        # PostgreSQL array literal
+        return "{" + ",".join('"' + item.replace('"', '\\"') + '"' for item in value) + "}"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+class _CsvStream(io.RawIOBase):
+    """File-like object rendering rows to CSV lazily, for COPY FROM STDIN"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = b""
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text, lineterminator="\n")
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def _fill(self, size: int):
+        while len(self._buffer) < size:
+            chunk = []
+            for row in self._rows:
+                chunk.append([_csv_value(value) for value in row])
+                if len(chunk) >= 1000:
+                    break
+            if not chunk:
+                return
+            self._writer.writerows(chunk)
+            self.count += len(chunk)
+            self._buffer += self._text.getvalue().encode()
+            self._text.seek(0)
+            self._text.truncate()
+
+    def readinto(self, target):
+        self._fill(len(target))
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+def copy_rows(connection, table: str, columns: list, rows) -> int:
+    """Stream rows into ``table`` with COPY, returns the number of rows"""
+    stream = _CsvStream(rows)
+    raw = connection.connection.dbapi_connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            io.BufferedReader(stream, buffer_size=1 << 20),
+        )
+    return stream.count
+
+def write_rows(path: str, columns: list, rows, compress: bool = False) -> int:
+    """Write rows to a CSV file (with header), optionally gzip-compressed"""
+    opener = gzip.open if compress else open
+    count = 0
+    with opener(path, "wt", newline="") as output:
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+            count += 1
+    return count
+
+def doctor_fees(spec: DatasetSpec) -> dict:
+    """Re-derive the doctor fees (cheap: the doctor rows come first)"""
+    fees = {}
+    for row in generate_users(spec):
+        if row[5] == "doctor":
+            fees[row[0]] = row[12]
+        elif row[5] == "patient":
+            break
+    return fees
+
+def load_dataset(engine, spec: DatasetSpec, truncate: bool = True) -> dict:
+    """Bulk-load the dataset into PostgreSQL via COPY"""
+    from sqlalchemy import text
+
+    counts = {}
+    report_totals = {}
+    with engine.begin() as connection:
+        if truncate:
+            connection.execute(text("TRUNCATE reports, appointments, users RESTART IDENTITY CASCADE"))
+
+        started = perf_counter()
+        counts["users"] = copy_rows(connection, "users", USER_COLUMNS, generate_users(spec))
+        logger.info(f"Copied {counts['users']} users in {perf_counter() - started:.1f}s")
+
+        started = perf_counter()
+        counts["appointments"] = copy_rows(
+            connection, "appointments", APPOINTMENT_COLUMNS, generate_appointments(spec, report_totals)
+        )
+        logger.info(f"Copied {counts['appointments']} appointments in {perf_counter() - started:.1f}s")
+
+        counts["reports"] = copy_rows(
+            connection, "reports", REPORT_COLUMNS, generate_reports(spec, report_totals, doctor_fees(spec))
+        )
+
+        for table in ("users", "appointments", "reports"):
+            connection.execute(text(
+                f"SELECT setval('{table}_id_seq', GREATEST((SELECT max(id) FROM {table}), 1))"
+            ))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE users, appointments, reports"))
+    return counts
+
+def write_dataset(directory: str, spec: DatasetSpec, compress: bool = False) -> dict:
+    """Write users/appointments/reports CSV files into ``directory``"""
+    os.makedirs(directory, exist_ok=True)
+    suffix = ".csv.gz" if compress else ".csv"
+    report_totals = {}
+    counts = {
+        "users": write_rows(os.path.join(directory, "users" + suffix), USER_COLUMNS,
+                            generate_users(spec), compress),
+        "appointments": write_rows(os.path.join(directory, "appointments" + suffix), APPOINTMENT_COLUMNS,
+                                   generate_appointments(spec, report_totals), compress),
+    }
+    counts["reports"] = write_rows(os.path.join(directory, "reports" + suffix), REPORT_COLUMNS,
+                                   generate_reports(spec, report_totals, doctor_fees(spec)), compress)
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic appointment dataset")
+    parser.add_argument("--doctors", type=int, default=5_000)
+    parser.add_argument("--patients", type=int, default=500_000)
+    parser.add_argument("--appointments", type=int, default=5_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--history-days", type=int, default=730)
+    parser.add_argument("--future-days", type=int, default=60)
+    parser.add_argument("--anchor", help="Date the dataset is generated around (YYYY-MM-DD), default today")
+    parser.add_argument("--password", default="Bench@1234", help="Password shared by every generated user")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--load", action="store_true", help="COPY into DATABASE_URL")
+    target.add_argument("--output-dir", help="Write CSV files instead")
+    parser.add_argument("--gzip", action="store_true", help="Compress the CSV files")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    from utils.auth import get_password_hash
+
+    spec = DatasetSpec(args.doctors, args.patients, args.appointments, args.seed,
+                       args.history_days, args.future_days, get_password_hash(args.password),
+                       datetime.strptime(args.anchor, "%Y-%m-%d") if args.anchor else None)
+    started = perf_counter()
+    if args.load:
+        from utils.database import engine, create_tables
+        create_tables()
+        from utils.partitions import ensure_appointment_partitions
+        ensure_appointment_partitions(engine, months_back=args.history_days // 30 + 1,
+                                      months_ahead=args.future_days // 30 + 1)
+        counts = load_dataset(engine, spec)
+    else:
+        counts = write_dataset(args.output_dir, spec, args.gzip)
+    print(f"Generated {counts} in {perf_counter() - started:.1f}s")
@@ -0,0 +1,298 @@
+"""Benchmark the API hot paths and compare against a stored baseline.
+
+Usage (from the backend directory, against a dedicated database):
+
+    DATABASE_URL=postgresql://.../appointment_bench python -m benchmarks.run --seed --scale small
+    python -m benchmarks.run --update-baseline
+    python -m benchmarks.run --base-url http://localhost:8000   # against a running server
+
+Exits with status 1 when a scenario regresses against the baseline.
+"""
+from datetime import datetime, timedelta
+from time import perf_counter
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+
+import httpx
+
+# The in-process app runs without admission control, so baselines measure
+# latency rather than load shedding; ADMISSION_CONTROL=true keeps it on.
+# Requests shed with 503 are reported apart from errors either way.
+os.environ.setdefault("ADMISSION_CONTROL", "false")
+
+from benchmarks.seed import (
+    SCALES, SPECIALIZATIONS, DIVISIONS, BENCH_PASSWORD, ADMIN_EMAIL,
+    doctor_email, patient_email, seed_database,
+)
+
+API = "/api/v1"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Allowed drift before a scenario counts as a regression
+DEFAULT_TOLERANCE = 0.15
+QUERY_TOLERANCE = 0.5
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+async def db_statement_total(client: httpx.AsyncClient) -> float:
+    """Read the server's db_statements_total counter from /metrics"""
+    response = await client.get("/metrics")
+    for line in response.text.splitlines():
+        if line.startswith("db_statements_total"):
+            return float(line.split()[-1])
+    return 0.0
+
+class Context:
+    """Tokens and ids shared by the scenarios"""
+
+    def __init__(self, scale: dict, rng: random.Random):
+        self.scale = scale
+        self.rng = rng
+        self.patient_tokens = []
+        self.doctor_tokens = []
+        self.admin_token = None
+        self.pending_ids = []
+
+    def patient(self):
+        return self.rng.choice(self.patient_tokens)
+
+    def doctor(self):
+        return self.rng.choice(self.doctor_tokens)
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+async def login(client: httpx.AsyncClient, email: str) -> dict:
+    response = await client.post(f"{API}/users/login", json={"email": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()
+
+async def prepare(client: httpx.AsyncClient, context: Context, users: int = 20):
+    scale = context.scale
+    for _ in range(users):
+        patient = await login(client, patient_email(context.rng.randrange(scale["patients"])))
+        context.patient_tokens.append(patient["access_token"])
+        doctor = await login(client, doctor_email(context.rng.randrange(scale["doctors"])))
+        context.doctor_tokens.append((doctor["access_token"], doctor["user_id"]))
+    context.admin_token = (await login(client, ADMIN_EMAIL))["access_token"]
+
+    for token, _ in context.doctor_tokens:
+        response = await client.get(
+            f"{API}/appointments/", params={"status": "pending", "limit": 100}, headers=auth(token)
+        )
+        for appointment in response.json().get("appointments", []):
+            context.pending_ids.append((token, appointment["id"]))
+    context.rng.shuffle(context.pending_ids)
+
+# Each scenario returns (method, url, kwargs) for one request
+def login_request(context):
+    email = patient_email(context.rng.randrange(context.scale["patients"]))
+    return "POST", f"{API}/users/login", {"json": {"email": email, "password": BENCH_PASSWORD}}
+
+def doctor_search_request(context):
+    params = {"specialization": context.rng.choice(SPECIALIZATIONS), "division": context.rng.choice(DIVISIONS)}
+    return "GET", f"{API}/users/doctors", {"params": params}
+
+def booking_request(context):
+    doctor_id = 2 + context.rng.randrange(context.scale["doctors"])
+    day = datetime.utcnow() + timedelta(days=context.rng.randint(1, 29))
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    moment = day.replace(hour=context.rng.randint(9, 17), minute=context.rng.choice((0, 30)), second=0, microsecond=0)
+    body = {"doctor_id": doctor_id, "appointment_datetime": moment.isoformat(), "notes": "benchmark"}
+    return "POST", f"{API}/appointments/", {"json": body, "headers": auth(context.patient())}
+
+def listing_request(context):
+    token, _ = context.doctor()
+    return "GET", f"{API}/appointments/", {"params": {"limit": 20}, "headers": auth(token)}
+
+def stats_request(context):
+    token, _ = context.doctor()
+    return "GET", f"{API}/appointments/stats/summary", {"headers": auth(token)}
+
+def status_update_request(context):
+    if context.pending_ids:
+        token, appointment_id = context.pending_ids.pop()
+    else:
+        token, _ = context.doctor()
+        appointment_id = 0
+    return "PUT", f"{API}/appointments/{appointment_id}/status", {
+        "json": {"status": "confirmed"}, "headers": auth(token)
+    }
+
+def report_request(context):
+    month = datetime.utcnow().replace(day=1) - timedelta(days=1)
+    return "POST", f"{API}/reports/generate/{month.year}/{month.month}", {"headers": auth(context.admin_token)}
+
+# name -> (request factory, requests per run, status codes that count as success)
+SCENARIOS = {
+    "login": (login_request, 200, {200}),
+    "doctor_search": (doctor_search_request, 1000, {200}),
+    "booking": (booking_request, 500, {201, 400}),
+    "appointment_listing": (listing_request, 1000, {200}),
+    "stats": (stats_request, 500, {200}),
+    "status_update": (status_update_request, 300, {200, 400, 404}),
+    "report": (report_request, 5, {200}),
+}
+
+async def run_scenario(client, context, name: str, concurrency: int, multiplier: float) -> dict:
+    factory, count, accepted = SCENARIOS[name]
+    total = max(1, int(count * multiplier))
+    latencies = []
+    statuses = {}
+    errors = 0
+    shed = 0
+    remaining = [total]
+
+    async def worker():
+        nonlocal errors, shed
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            method, url, kwargs = factory(context)
+            start = perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                code = response.status_code
+            except httpx.HTTPError:
+                code = "error"
+                response = None
+            statuses[code] = statuses.get(code, 0) + 1
+            if code == 503 and "retry-after" in response.headers:
+                # Turned away by admission control: no latency sample
+                shed += 1
+                continue
+            latencies.append(perf_counter() - start)
+            if code not in accepted:
+                errors += 1
+
+    statements_before = await db_statement_total(client)
+    started = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = perf_counter() - started
+    statements = await db_statement_total(client) - statements_before
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "shed": shed,
+        "statuses": {str(code): value for code, value in sorted(statuses.items(), key=str)},
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round(statements / total, 2),
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """List regressions of ``results`` against ``baseline``"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms vs baseline {previous['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['throughput_rps']} rps vs baseline {previous['throughput_rps']} rps"
+            )
+        if current["queries_per_request"] > previous["queries_per_request"] + QUERY_TOLERANCE:
+            regressions.append(
+                f"{name}: {current['queries_per_request']} queries/request "
+                f"vs baseline {previous['queries_per_request']}"
+            )
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {previous.get('errors', 0)}")
+        if current.get("shed", 0) > previous.get("shed", 0) * (1 + tolerance):
+            regressions.append(f"{name}: {current['shed']} shed vs baseline {previous.get('shed', 0)}")
+    return regressions
+
+def make_client(base_url: str = None) -> httpx.AsyncClient:
+    if base_url:
+        return httpx.AsyncClient(base_url=base_url, timeout=120)
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+async def main(args) -> int:
+    scale = SCALES[args.scale]
+    if args.seed:
+        from utils.database import engine
+        print(f"Seeding {args.scale} dataset: {scale}")
+        started = perf_counter()
+        seed_database(engine, scale["doctors"], scale["patients"], scale["appointments"], args.random_seed)
+        print(f"Seeded in {perf_counter() - started:.1f}s")
+
+    context = Context(scale, random.Random(args.random_seed))
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+
+    async with make_client(args.base_url) as client:
+        await prepare(client, context)
+        results = {
+            "meta": {
+                "scale": args.scale,
+                "concurrency": args.concurrency,
+                "multiplier": args.multiplier,
+                "admission_control": os.environ["ADMISSION_CONTROL"] if not args.base_url else "server",
+                "python": platform.python_version(),
+                "recorded_at": datetime.utcnow().isoformat() + "Z",
+            },
+            "scenarios": {},
+        }
+        for name in scenarios:
+            result = await run_scenario(client, context, name, args.concurrency, args.multiplier)
+            results["scenarios"][name] = result
+            print(
+                f"{name:<22} {result['throughput_rps']:>9.1f} rps  p50 {result['p50_ms']:>8.1f} ms  "
+                f"p95 {result['p95_ms']:>8.1f} ms  p99 {result['p99_ms']:>8.1f} ms  "
+                f"{result['queries_per_request']:>6.1f} q/req  {result['errors']} errors  {result['shed']} shed"
+            )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found, run with --update-baseline to record one")
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("meta", {}).get("scale") != args.scale:
+        print(f"Baseline was recorded at scale {baseline.get('meta', {}).get('scale')}, not comparing")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the appointment API hot paths")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", action="store_true", help="Recreate and seed the database first")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--multiplier", type=float, default=1.0, help="Scale the request count of every scenario")
+    parser.add_argument("--scenarios", help=f"Comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,68 @@
+from sqlalchemy import insert
+from benchmarks import datagen
+from models.user import User
+from models.appointment import Appointment
+from models.report import Report
+from utils.database import Base
+from utils.auth import get_password_hash
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every seeded account shares this password so the benchmark can log in
+BENCH_PASSWORD = "Bench@1234"
+ADMIN_EMAIL = "admin@bench.example.com"
+
+SCALES = {
+    "small": {"doctors": 50, "patients": 2_000, "appointments": 20_000},
+    "medium": {"doctors": 500, "patients": 50_000, "appointments": 500_000},
+    "full": {"doctors": 5_000, "patients": 500_000, "appointments": 5_000_000},
+}
+
+DIVISIONS = list(datagen.DIVISIONS)
+SPECIALIZATIONS = list(datagen.SPECIALIZATIONS)
+
+BATCH_SIZE = 10_000
+
+def doctor_email(index: int) -> str:
+    return f"doctor{index}@bench.example.com"
+
+def patient_email(index: int) -> str:
+    return f"patient{index}@bench.example.com"
+
+def _insert_batches(connection, table, columns, rows):
+    batch = []
+    for row in rows:
+        batch.append(dict(zip(columns, row)))
+        if len(batch) >= BATCH_SIZE:
+            connection.execute(insert(table), batch)
+            batch = []
+    if batch:
+        connection.execute(insert(table), batch)
+
+def seed_database(engine, doctors: int, patients: int, appointments: int, seed: int = 42) -> dict:
+    """Recreate the schema and fill it with a deterministic dataset"""
+    spec = datagen.DatasetSpec(doctors, patients, appointments, seed,
+                               password_hash=get_password_hash(BENCH_PASSWORD))
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    if engine.dialect.name == "postgresql":
+        from utils.partitions import ensure_appointment_partitions
+        ensure_appointment_partitions(engine, months_back=spec.history_days // 30 + 1,
+                                      months_ahead=spec.future_days // 30 + 1)
+        counts = datagen.load_dataset(engine, spec, truncate=False)
+    else:
+        # No COPY outside PostgreSQL, fall back to batched INSERTs
+        report_totals = {}
+        with engine.begin() as connection:
+            _insert_batches(connection, User.__table__, datagen.USER_COLUMNS, datagen.generate_users(spec))
+            _insert_batches(connection, Appointment.__table__, datagen.APPOINTMENT_COLUMNS,
+                            datagen.generate_appointments(spec, report_totals))
+            _insert_batches(connection, Report.__table__, datagen.REPORT_COLUMNS,
+                            datagen.generate_reports(spec, report_totals, datagen.doctor_fees(spec)))
+        counts = {"users": 1 + doctors + patients, "appointments": appointments}
+
+    logger.info(f"Seeded {counts}")
+    return counts
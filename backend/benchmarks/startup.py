@@ -0,0 +1,63 @@
+"""Measure cold start: time from launching the server until it is live and ready.
+
+    python -m benchmarks.startup [--runs 5] [--command "python server.py"]
+
+Starts the server as a subprocess, polls /health/live and /health/ready, and
+prints the median of several runs plus the phases the app reports itself.
+"""
+from time import perf_counter, sleep
+import argparse
+import os
+import shlex
+import signal
+import statistics
+import subprocess
+
+import httpx
+
+def measure_once(command: list, base_url: str, timeout: float) -> dict:
+    started = perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"live": None, "ready": None, "reported": None}
+    try:
+        with httpx.Client(base_url=base_url, timeout=1.0) as client:
+            while perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"server exited with status {process.returncode}")
+                try:
+                    if result["live"] is None and client.get("/health/live").status_code == 200:
+                        result["live"] = perf_counter() - started
+                    response = client.get("/health/ready")
+                    if response.status_code == 200:
+                        result["ready"] = perf_counter() - started
+                        result["reported"] = response.json().get("startup")
+                        return result
+                except httpx.TransportError:
+                    pass
+                sleep(0.02)
+        raise RuntimeError(f"server not ready after {timeout:.0f}s")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start time of the API server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--command", default="python server.py")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        run = measure_once(shlex.split(args.command), f"http://127.0.0.1:{args.port}", args.timeout)
+        runs.append(run)
+        print(f"live {run['live']:.2f}s  ready {run['ready']:.2f}s  reported {run['reported']}")
+
+    print(
+        f"median over {len(runs)} runs: live {statistics.median(r['live'] for r in runs):.2f}s  "
+        f"ready {statistics.median(r['ready'] for r in runs):.2f}s"
+    )
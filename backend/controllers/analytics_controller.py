@@ -0,0 +1,233 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, case, type_coerce, String
+from fastapi import HTTPException
+from models.appointment import Appointment
+from models.user import User, UserType, AppointmentStatus
+from utils.cache import TTLCache
+from utils.database import shard_router
+from datetime import date, datetime, timedelta
+from typing import Optional
+import os
+
+import numpy as np
+
+# Booking trends for admins.
+#
+# The database does the heavy lifting: two GROUP BYs return appointment
+# counts per (day, status) and per (doctor, status, before today) for the
+# range, a few thousand rows even for a year. Those become small arrays,
+# breakdowns by specialization or division are a np.add.at over them and
+# rolling windows come from cumulative sums. The arrays for a range are
+# cached, so switching breakdowns or windows on a dashboard does not query
+# again.
+
+MAX_ANALYTICS_DAYS = 3 * 366
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+GROUP_BY = ("day", "specialization", "division")
+
+STATUSES = [status.value for status in AppointmentStatus]
+PENDING, CONFIRMED, CANCELLED, COMPLETED = (
+    STATUSES.index(name) for name in ("pending", "confirmed", "cancelled", "completed")
+)
+
+_ranges = TTLCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL)
+
+def _label(value: Optional[str]) -> str:
+    return (value or "").strip().title() or "Unknown"
+
+class _RangeCounts:
+    """Appointment counts for one date range as small arrays.
+
+    ``daily`` is days x statuses. The per-doctor counts are parallel arrays
+    (doctor, status, past, count), where past marks days before ``today``.
+    """
+
+    def __init__(self, date_from: date, date_to: date, today: date, daily_rows: list, doctor_rows: list,
+                 doctors: list):
+        self.date_from = date_from
+        self.today = today
+        self.days = (date_to - date_from).days + 1
+
+        self.daily = np.zeros((self.days, len(STATUSES)), dtype=np.int64)
+        if daily_rows:
+            days, statuses, counts = zip(*daily_rows)
+            # date objects on PostgreSQL, ISO strings on SQLite; numpy parses both
+            offsets = (np.array(days, dtype="datetime64[D]") - np.datetime64(date_from, "D")).astype(np.int64)
+            np.add.at(self.daily, (offsets, self._status_codes(statuses)), np.array(counts, dtype=np.int64))
+
+        if doctor_rows:
+            doctor_ids, statuses, past, counts = zip(*doctor_rows)
+            self.doctor_id = np.array(doctor_ids, dtype=np.int64)
+            self.status = self._status_codes(statuses)
+            self.past = np.array(past, dtype=bool)
+            self.count = np.array(counts, dtype=np.int64)
+        else:
+            self.doctor_id = self.status = self.count = np.empty(0, dtype=np.int64)
+            self.past = np.empty(0, dtype=bool)
+
+        # Doctor attributes, joined onto the counts by sorted id lookup
+        self.doctor_ids = np.array([doctor.id for doctor in doctors], dtype=np.int64)
+        self.labels = {}
+        self.codes = {}
+        for name, values in (("specialization", [doctor.specialization for doctor in doctors]),
+                             ("division", [doctor.address_division for doctor in doctors])):
+            labels = sorted({_label(value) for value in values})
+            index = {label: code for code, label in enumerate(labels)}
+            self.labels[name] = labels
+            self.codes[name] = np.array([index[_label(value)] for value in values], dtype=np.int64)
+
+    @staticmethod
+    def _status_codes(statuses) -> np.ndarray:
+        return np.fromiter((STATUSES.index(value) for value in statuses), dtype=np.int64, count=len(statuses))
+
+    def by_day(self):
+        """(labels, counts, past counts) with one group per day of the range"""
+        labels = [(self.date_from + timedelta(days=offset)).isoformat() for offset in range(self.days)]
+        past = self.daily.copy()
+        past[max(0, (self.today - self.date_from).days):] = 0
+        return labels, self.daily, past
+
+    def by_doctor_attribute(self, name: str):
+        """(labels, counts, past counts) grouped by a doctor attribute"""
+        labels = list(self.labels[name])
+        groups = np.full(len(self.doctor_id), len(labels), dtype=np.int64)
+        known = np.zeros(len(self.doctor_id), dtype=bool)
+        if len(self.doctor_ids):
+            positions = np.minimum(np.searchsorted(self.doctor_ids, self.doctor_id), len(self.doctor_ids) - 1)
+            known = self.doctor_ids[positions] == self.doctor_id
+            groups[known] = self.codes[name][positions[known]]
+        if not known.all():
+            # Appointments of since-deleted doctors
+            labels.append("(deleted doctor)")
+        counts = np.zeros((len(labels), len(STATUSES)), dtype=np.int64)
+        np.add.at(counts, (groups, self.status), self.count)
+        past = np.zeros_like(counts)
+        np.add.at(past, (groups[self.past], self.status[self.past]), self.count[self.past])
+        return labels, counts, past
+
+def _rates(bookings: np.ndarray, cancelled: np.ndarray, completed: np.ndarray, no_show: np.ndarray):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cancellation_rate = np.where(bookings > 0, cancelled / bookings, 0.0)
+        # Of the appointments that should have taken place, the share that did not
+        attended = completed + no_show
+        no_show_rate = np.where(attended > 0, no_show / attended, 0.0)
+    return cancellation_rate, no_show_rate
+
+def _rolling(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing sums over ``window`` rows (shorter at the start)"""
+    cumulative = np.cumsum(values, axis=0)
+    shifted = np.zeros_like(cumulative)
+    shifted[window:] = cumulative[:-window]
+    return cumulative - shifted
+
+class AnalyticsController:
+    @staticmethod
+    def load_range(db: Session, date_from: date, date_to: date) -> _RangeCounts:
+        today = datetime.utcnow().date()
+        cached = _ranges.get((date_from, date_to, today))
+        if cached is not None:
+            return cached
+
+        # Status as plain text: skips enum conversion of every result row
+        status = type_coerce(Appointment.status, String)
+        in_range = (
+            Appointment.appointment_datetime >= datetime.combine(date_from, datetime.min.time()),
+            Appointment.appointment_datetime < datetime.combine(date_to + timedelta(days=1), datetime.min.time()),
+        )
+        day = func.date(Appointment.appointment_datetime)
+        past = case((Appointment.appointment_datetime < datetime.combine(today, datetime.min.time()), 1), else_=0)
+
+        def grouped(session):
+            daily = session.execute(
+                select(day, status, func.count()).where(*in_range).group_by(day, status)
+            ).all()
+            by_doctor = session.execute(
+                select(Appointment.doctor_id, status, past, func.count()).where(*in_range).group_by(
+                    Appointment.doctor_id, status, past
+                )
+            ).all()
+            return daily, by_doctor
+
+        # Rows of all shards side by side; np.add.at sums repeated keys
+        daily_rows, doctor_rows = [], []
+        for daily, by_doctor in shard_router.scatter(db, grouped):
+            daily_rows.extend(daily)
+            doctor_rows.extend(by_doctor)
+        doctors = db.execute(
+            select(User.id, User.specialization, User.address_division).where(
+                User.user_type == UserType.doctor
+            ).order_by(User.id)
+        ).all()
+
+        counts = _RangeCounts(date_from, date_to, today, daily_rows, doctor_rows, doctors)
+        _ranges.set((date_from, date_to, today), counts)
+        return counts
+
+    @staticmethod
+    def get_trends(db: Session, date_from: date, date_to: date, group_by: str = "day",
+                   window: Optional[int] = None) -> dict:
+        if date_to < date_from:
+            raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+        if (date_to - date_from).days >= MAX_ANALYTICS_DAYS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_ANALYTICS_DAYS} days per request")
+        if group_by not in GROUP_BY:
+            raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUP_BY)}")
+        if window is not None and group_by != "day":
+            raise HTTPException(status_code=400, detail="window is only supported with group_by=day")
+
+        data = AnalyticsController.load_range(db, date_from, date_to)
+        if group_by == "day":
+            labels, counts, past = data.by_day()
+        else:
+            labels, counts, past = data.by_doctor_attribute(group_by)
+        # No-show: still pending or confirmed after the day has passed
+        no_show = past[:, PENDING] + past[:, CONFIRMED]
+
+        bookings = counts.sum(axis=1)
+        cancelled, completed = counts[:, CANCELLED], counts[:, COMPLETED]
+        cancellation_rate, no_show_rate = _rates(bookings, cancelled, completed, no_show)
+
+        columns = {
+            "bookings": bookings,
+            "cancelled": cancelled,
+            "completed": completed,
+            "no_show": no_show,
+        }
+        rates = {"cancellation_rate": cancellation_rate, "no_show_rate": no_show_rate}
+        if window:
+            stacked = _rolling(np.stack([bookings, cancelled, completed, no_show], axis=1), window)
+            columns["rolling_bookings"] = stacked[:, 0]
+            rolling_cancellation, rolling_no_show = _rates(stacked[:, 0], stacked[:, 1], stacked[:, 2], stacked[:, 3])
+            rates["rolling_cancellation_rate"] = rolling_cancellation
+            rates["rolling_no_show_rate"] = rolling_no_show
+
+        plain = {name: values.tolist() for name, values in columns.items()}
+        plain.update({name: np.round(values, 4).tolist() for name, values in rates.items()})
+        series = [
+            {"key": label, **{name: values[position] for name, values in plain.items()}}
+            for position, label in enumerate(labels)
+        ]
+        if group_by != "day":
+            series = [item for item in series if item["bookings"]]
+
+        total_bookings = int(bookings.sum())
+        total_cancelled, total_completed, total_no_show = int(cancelled.sum()), int(completed.sum()), int(no_show.sum())
+        total_cancellation_rate, total_no_show_rate = _rates(
+            np.array(total_bookings), np.array(total_cancelled), np.array(total_completed), np.array(total_no_show)
+        )
+        return {
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "group_by": group_by,
+            "window": window,
+            "totals": {
+                "bookings": total_bookings,
+                "cancelled": total_cancelled,
+                "completed": total_completed,
+                "no_show": total_no_show,
+                "cancellation_rate": round(float(total_cancellation_rate), 4),
+                "no_show_rate": round(float(total_no_show_rate), 4),
+            },
+            "series": series,
+        }
@@ -1,15 +1,35 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
 from models.appointment import Appointment, AppointmentStatus
 from models.user import User, UserType
 from schemas.appointment_schema import AppointmentCreate, AppointmentFilter
+from utils.partitions import booking_horizon, BOOKING_MONTHS_AHEAD
+from utils.database import shard_router
+from utils.export import EXPORT_CHUNK_SIZE
+from controllers.availability_controller import AvailabilityController
+from controllers.user_controller import USER_RESPONSE_COLUMNS
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 from typing import List, Optional
+import heapq
+import itertools
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Load patient and doctor in the same query instead of two lookups per row
+WITH_USERS = (joinedload(Appointment.patient), joinedload(Appointment.doctor))
+
+EXPORT_COLUMNS = ("id", "patient_id", "doctor_id", "appointment_datetime", "status", "notes", "created_at")
+EXPORT_NAME_COLUMNS = ("patient_name", "doctor_name")
+
+def with_users(query):
+    """Join patient and doctor, which only the main database can do"""
+    return query if shard_router.enabled else query.options(*WITH_USERS)
+
 class AppointmentController:
     @staticmethod
     def create_appointment(db: Session, appointment: AppointmentCreate, patient_id: int):
@@ -22,63 +42,97 @@ class AppointmentController:
         ).first()
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor not found")
-        
-        # Check doctor availability for the requested datetime
-        appointment_hour = appointment_datetime.hour
-        
-        # Check if the time falls within any of the doctor's available slots
-        is_available = False
-        if doctor.available_timeslots:
-            for slot in doctor.available_timeslots:
-                # Ensure the slot is a string before attempting to split
-                if isinstance(slot, str):
-                    try:
-                        slot_datetime = datetime.strptime(slot, '%Y-%m-%d %H:%M:%S')
-                        # Check if appointment time matches available slot (within 1 hour window)
-                        time_diff = abs((appointment_datetime - slot_datetime).total_seconds())
-                        if time_diff <= 3600:  # Within 1 hour
-                            is_available = True
-                            break
-                    except ValueError:
-                        continue
-        
-        if not is_available:
+
+        # Only months whose partitions already exist can be booked
+        if appointment_datetime.date() >= booking_horizon():
+            raise HTTPException(
+                status_code=400,
+                detail=f"Appointments can be booked at most {BOOKING_MONTHS_AHEAD} months ahead"
+            )
+
+        # Within an hour of a declared timeslot or inside a weekly rule, and
+        # not during the doctor's time off
+        if not AvailabilityController.is_bookable(db, doctor.id, doctor.available_timeslots, appointment_datetime):
             raise HTTPException(
                 status_code=400, 
                 detail=f"Doctor is not available at {appointment_datetime.strftime('%Y-%m-%d %H:%M:%S')}. Available slots: {doctor.available_timeslots}"
             )
         
-        # Check for conflicting appointments
-        existing_appointment = db.query(Appointment).filter(
-            Appointment.doctor_id == appointment.doctor_id,
-            Appointment.appointment_datetime == appointment_datetime,
-            Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
-        ).first()
-        
-        if existing_appointment:
-            raise HTTPException(status_code=400, detail="This time slot is already booked")
-        
-        # Create appointment
-        db_appointment = Appointment(
-            **appointment.dict(),
-            patient_id=patient_id,
-            status=AppointmentStatus.pending
-        )
-        
-        db.add(db_appointment)
-        db.commit()
-        db.refresh(db_appointment)
+        # Appointments live on the shard of the doctor's division
+        with shard_router.session(db, shard_router.shard_for_division(doctor.address_division)) as session:
+            # Check for conflicting appointments
+            existing_appointment = AppointmentController._active_booking(session, appointment.doctor_id, appointment_datetime)
+            if existing_appointment:
+                raise HTTPException(status_code=400, detail="This time slot is already booked")
+            
+            # Create appointment
+            db_appointment = Appointment(
+                **appointment.dict(),
+                patient_id=patient_id,
+                status=AppointmentStatus.pending
+            )
+            
+            session.add(db_appointment)
+            try:
+                session.commit()
+            except IntegrityError:
+                # Lost a race for the slot (uq_appointments_doctor_slot_active)
+                session.rollback()
+                if AppointmentController._active_booking(session, appointment.doctor_id, appointment_datetime) is None:
+                    raise
+                raise HTTPException(status_code=400, detail="This time slot is already booked")
+            session.refresh(db_appointment)
         
         # Load relationships
-        db_appointment.patient = db.query(User).filter(User.id == patient_id).first()
-        db_appointment.doctor = doctor
+        AppointmentController.attach_users(db, [db_appointment])
         
         return db_appointment
 
     @staticmethod
-    def get_appointments(db: Session, filters: AppointmentFilter, user_id: int = None, user_type: str = None):
-        query = db.query(Appointment)
-        
+    def attach_users(db: Session, appointments: list):
+        """Set patient and doctor from one users query, without lazy loads or cascades"""
+        user_ids = {appointment.patient_id for appointment in appointments}
+        user_ids |= {appointment.doctor_id for appointment in appointments}
+        user_ids.discard(None)
+        users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))} if user_ids else {}
+        for appointment in appointments:
+            set_committed_value(appointment, "patient", users.get(appointment.patient_id))
+            set_committed_value(appointment, "doctor", users.get(appointment.doctor_id))
+
+    @staticmethod
+    def _active_booking(db: Session, doctor_id: int, appointment_datetime: datetime):
+        return db.query(Appointment).filter(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_datetime == appointment_datetime,
+            Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
+        ).first()
+
+    @staticmethod
+    def get_own_active_booking(db: Session, appointment: AppointmentCreate, patient_id: int):
+        """The patient's active booking of this exact slot, if any (for retried requests)"""
+        with shard_router.session(db, shard_router.shard_for_doctor(db, appointment.doctor_id)) as session:
+            existing = with_users(session.query(Appointment)).filter(
+                Appointment.doctor_id == appointment.doctor_id,
+                Appointment.appointment_datetime == appointment.appointment_datetime,
+                Appointment.patient_id == patient_id,
+                Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
+            ).first()
+        if existing is not None and shard_router.enabled:
+            AppointmentController.attach_users(db, [existing])
+        return existing
+
+    @staticmethod
+    def shards_for(db: Session, filters: AppointmentFilter, user_id: int = None, user_type: str = None) -> List[int]:
+        """Shards that can hold appointments matching the filters"""
+        if user_type == UserType.doctor.value and user_id:
+            return [shard_router.shard_for_doctor(db, user_id)]
+        if filters.doctor_id:
+            return [shard_router.shard_for_doctor(db, filters.doctor_id)]
+        return shard_router.shards
+
+    @staticmethod
+    def apply_filters(query, filters: AppointmentFilter, user_id: int = None, user_type: str = None):
+        """Restrict an appointment query to what the user may see and to ``filters``"""
         # Apply user-specific filters
         if user_type == UserType.patient.value and user_id:
             query = query.filter(Appointment.patient_id == user_id)
@@ -104,20 +158,81 @@ class AppointmentController:
             end_date = filters.date_to + timedelta(days=1)
             query = query.filter(Appointment.appointment_datetime < end_date)
         
+        return query
+
+    @staticmethod
+    def export_query(db: Session, filters: AppointmentFilter, include_names: bool = False):
+        """Column query for exports, in a stable order (no ORM objects, no offset)"""
+        columns = [getattr(Appointment, column) for column in EXPORT_COLUMNS]
+        if include_names:
+            patient, doctor = aliased(User), aliased(User)
+            query = db.query(*columns, patient.full_name, doctor.full_name)\
+                      .outerjoin(patient, patient.id == Appointment.patient_id)\
+                      .outerjoin(doctor, doctor.id == Appointment.doctor_id)
+        else:
+            query = db.query(*columns)
+        query = AppointmentController.apply_filters(query, filters)
+        return query.order_by(Appointment.appointment_datetime, Appointment.id)
+
+    @staticmethod
+    def export_rows(db: Session, filters: AppointmentFilter, include_names: bool = False,
+                    chunk_size: int = EXPORT_CHUNK_SIZE):
+        """Export rows in (appointment_datetime, id) order, merged across shards as they stream"""
+        if not shard_router.enabled:
+            yield from AppointmentController.export_query(db, filters, include_names).yield_per(chunk_size)
+            return
+        with ExitStack() as stack:
+            streams = [
+                AppointmentController.export_query(
+                    stack.enter_context(shard_router.session(db, shard)), filters
+                ).yield_per(chunk_size)
+                for shard in AppointmentController.shards_for(db, filters)
+            ]
+            rows = heapq.merge(*streams, key=lambda row: (row.appointment_datetime, row.id))
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    return
+                if include_names:
+                    # Users only live on the main database
+                    user_ids = {row.patient_id for row in chunk} | {row.doctor_id for row in chunk}
+                    names = dict(db.query(User.id, User.full_name).filter(User.id.in_(user_ids)).all())
+                    chunk = [tuple(row) + (names.get(row.patient_id), names.get(row.doctor_id)) for row in chunk]
+                yield from chunk
+
+    @staticmethod
+    def get_appointments(db: Session, filters: AppointmentFilter, user_id: int = None, user_type: str = None,
+                         load_users: bool = True):
+        if shard_router.enabled:
+            # Scatter-gather: each shard's first skip + limit rows, merged
+            total, appointments = shard_router.scatter_page(
+                db,
+                lambda session: AppointmentController.apply_filters(
+                    session.query(Appointment), filters, user_id, user_type
+                ),
+                (Appointment.appointment_datetime.desc(), Appointment.id.desc()),
+                lambda appointment: (appointment.appointment_datetime, appointment.id),
+                filters.skip, filters.limit, descending=True,
+                shards=AppointmentController.shards_for(db, filters, user_id, user_type)
+            )
+            if load_users:
+                AppointmentController.attach_users(db, appointments)
+            return {"appointments": appointments, "total": total, "skip": filters.skip, "limit": filters.limit}
+        
+        query = AppointmentController.apply_filters(db.query(Appointment), filters, user_id, user_type)
+        
         # Get total count
         total = query.count()
         
+        if load_users:
+            query = query.options(*WITH_USERS)
+        
         # Apply pagination and ordering
         appointments = query.order_by(Appointment.appointment_datetime.desc())\
                           .offset(filters.skip)\
                           .limit(filters.limit)\
                           .all()
         
-        # Load relationships
-        for appointment in appointments:
-            appointment.patient = db.query(User).filter(User.id == appointment.patient_id).first()
-            appointment.doctor = db.query(User).filter(User.id == appointment.doctor_id).first()
-        
         return {
             "appointments": appointments,
             "total": total,
@@ -127,10 +242,20 @@ class AppointmentController:
 
     @staticmethod
     def update_appointment_status(db: Session, appointment_id: int, status: str, user_id: int, user_type: str):
-        appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+        for shard in shard_router.shards_for_appointment(appointment_id):
+            with shard_router.session(db, shard) as session:
+                appointment = with_users(session.query(Appointment)).filter(Appointment.id == appointment_id).first()
+                if appointment:
+                    AppointmentController._change_status(session, appointment, status, user_id, user_type)
+                    break
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found")
-        
+        if shard_router.enabled:
+            AppointmentController.attach_users(db, [appointment])
+        return appointment
+
+    @staticmethod
+    def _change_status(db: Session, appointment: Appointment, status: str, user_id: int, user_type: str):
         # Authorization checks
         if user_type == UserType.patient.value:
             # Patients can only cancel their own pending appointments
@@ -172,16 +297,16 @@ class AppointmentController:
         appointment.status = new_status
         db.commit()
         db.refresh(appointment)
-        
-        # Load relationships
-        appointment.patient = db.query(User).filter(User.id == appointment.patient_id).first()
-        appointment.doctor = db.query(User).filter(User.id == appointment.doctor_id).first()
-        
-        return appointment
 
     @staticmethod
     def get_appointment_by_id(db: Session, appointment_id: int, user_id: int = None, user_type: str = None):
-        appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+        for shard in shard_router.shards_for_appointment(appointment_id):
+            with shard_router.session(db, shard) as session:
+                appointment = with_users(session.query(Appointment)).filter(Appointment.id == appointment_id).first()
+            if appointment:
+                if shard_router.enabled:
+                    AppointmentController.attach_users(db, [appointment])
+                break
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found")
         
@@ -191,34 +316,85 @@ class AppointmentController:
         elif user_type == UserType.doctor.value and appointment.doctor_id != user_id:
             raise HTTPException(status_code=403, detail="Not authorized to view this appointment")
         
-        # Load relationships
-        appointment.patient = db.query(User).filter(User.id == appointment.patient_id).first()
-        appointment.doctor = db.query(User).filter(User.id == appointment.doctor_id).first()
-        
         return appointment
 
     @staticmethod
-    def get_upcoming_appointments(db: Session, user_id: int, user_type: str):
+    def get_visible_versions(db: Session, appointment_id: int, requester_id: int, email: str) -> Optional[tuple]:
+        """(appointment, patient, doctor) versions if the token's account may read the appointment.
+
+        None means take the full path, which also produces the 401/403/404.
+        """
+        for shard in shard_router.shards_for_appointment(appointment_id):
+            with shard_router.session(db, shard) as session:
+                row = session.query(Appointment.patient_id, Appointment.doctor_id, Appointment.version).filter(
+                    Appointment.id == appointment_id
+                ).first()
+            if row:
+                break
+        if row is None:
+            return None
+        users = {
+            user.id: user for user in db.query(User.id, User.email, User.user_type, User.version).filter(
+                User.id.in_({requester_id, row.patient_id, row.doctor_id})
+            )
+        }
+        requester = users.get(requester_id)
+        if requester is None or requester.email != email:
+            return None
+        if requester.user_type != UserType.admin and requester_id not in (row.patient_id, row.doctor_id):
+            return None
+        patient, doctor = users.get(row.patient_id), users.get(row.doctor_id)
+        return (row.version, patient.version if patient else 0, doctor.version if doctor else 0)
+
+    @staticmethod
+    def etag_versions(appointment: Appointment) -> tuple:
+        """The versions get_visible_versions compares, from a loaded appointment"""
+        return (appointment.version,) + tuple(
+            user.version if user is not None else 0 for user in (appointment.patient, appointment.doctor)
+        )
+
+    @staticmethod
+    def get_upcoming_appointments(db: Session, user_id: int, user_type: str, load_users: bool = True):
         """Get upcoming appointments for reminders"""
         tomorrow = datetime.utcnow() + timedelta(days=1)
         day_after_tomorrow = tomorrow + timedelta(days=1)
         
-        query = db.query(Appointment).filter(
-            Appointment.appointment_datetime >= tomorrow,
-            Appointment.appointment_datetime < day_after_tomorrow,
-            Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
-        )
-        
-        if user_type == UserType.patient.value:
-            query = query.filter(Appointment.patient_id == user_id)
-        elif user_type == UserType.doctor.value:
-            query = query.filter(Appointment.doctor_id == user_id)
-        
-        appointments = query.all()
-        
-        # Load relationships
-        for appointment in appointments:
-            appointment.patient = db.query(User).filter(User.id == appointment.patient_id).first()
-            appointment.doctor = db.query(User).filter(User.id == appointment.doctor_id).first()
-        
-        return appointments
\ No newline at end of file
+        def upcoming(session):
+            query = session.query(Appointment).filter(
+                Appointment.appointment_datetime >= tomorrow,
+                Appointment.appointment_datetime < day_after_tomorrow,
+                Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
+            )
+            
+            if user_type == UserType.patient.value:
+                query = query.filter(Appointment.patient_id == user_id)
+            elif user_type == UserType.doctor.value:
+                query = query.filter(Appointment.doctor_id == user_id)
+            
+            if load_users:
+                query = with_users(query)
+            
+            return query.all()
+        
+        if not shard_router.enabled:
+            return upcoming(db)
+        appointments = [
+            appointment for rows in shard_router.scatter(
+                db, upcoming, AppointmentController.shards_for(db, AppointmentFilter(), user_id, user_type)
+            )
+            for appointment in rows
+        ]
+        appointments.sort(key=lambda appointment: appointment.appointment_datetime)
+        if load_users:
+            AppointmentController.attach_users(db, appointments)
+        return appointments
+
+    @staticmethod
+    def get_referenced_users(db: Session, appointments: list):
+        """Patients and doctors of the given appointments, each loaded once"""
+        user_ids = {appointment.patient_id for appointment in appointments}
+        user_ids |= {appointment.doctor_id for appointment in appointments}
+        user_ids.discard(None)
+        if not user_ids:
+            return []
+        return db.query(*USER_RESPONSE_COLUMNS).filter(User.id.in_(user_ids)).all()
\ No newline at end of file
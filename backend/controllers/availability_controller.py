@@ -0,0 +1,65 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from models.availability import AvailabilityRule, AvailabilityException
+from utils.slots import available_masks, is_available, parse_timeslots
+from utils.availability import load_rules, load_exceptions
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+# Upper bound on weekly rules per doctor (a few blocks per working day)
+MAX_RULES = 50
+
+class AvailabilityController:
+    @staticmethod
+    def bookable_masks(db: Session, doctor_id: int, timeslots: Optional[List[str]], days: list) -> Dict[date, int]:
+        """Bookable slot bitmaps of one doctor for ``days``"""
+        rules = load_rules(db, [doctor_id]).get(doctor_id, ())
+        exceptions = load_exceptions(db, min(days), max(days), [doctor_id]).get(doctor_id, ())
+        return available_masks(parse_timeslots(timeslots), rules, exceptions, days)
+
+    @staticmethod
+    def is_bookable(db: Session, doctor_id: int, timeslots: Optional[List[str]], moment: datetime) -> bool:
+        """Whether one doctor accepts a booking at ``moment`` (exact check, see utils.slots.is_available)"""
+        rules = load_rules(db, [doctor_id]).get(doctor_id, ())
+        exceptions = load_exceptions(db, moment.date(), moment.date(), [doctor_id]).get(doctor_id, ())
+        return is_available(moment, parse_timeslots(timeslots), rules, exceptions)
+
+    @staticmethod
+    def get_availability(db: Session, doctor_id: int, date_from: Optional[date] = None) -> dict:
+        """Weekly rules and the exceptions from ``date_from`` on"""
+        rules = db.query(AvailabilityRule).filter(AvailabilityRule.doctor_id == doctor_id).order_by(
+            AvailabilityRule.weekday, AvailabilityRule.start_time
+        ).all()
+        exceptions = db.query(AvailabilityException).filter(
+            AvailabilityException.doctor_id == doctor_id,
+            AvailabilityException.date >= (date_from or date.today())
+        ).order_by(AvailabilityException.date, AvailabilityException.start_time).all()
+        return {"doctor_id": doctor_id, "rules": rules, "exceptions": exceptions}
+
+    @staticmethod
+    def replace_rules(db: Session, doctor_id: int, rules: list) -> List[AvailabilityRule]:
+        """Replace the doctor's weekly rules as a whole"""
+        if len(rules) > MAX_RULES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_RULES} rules per doctor")
+        db.query(AvailabilityRule).filter(AvailabilityRule.doctor_id == doctor_id).delete(synchronize_session=False)
+        db_rules = [AvailabilityRule(doctor_id=doctor_id, **rule.dict()) for rule in rules]
+        db.add_all(db_rules)
+        db.commit()
+        return sorted(db_rules, key=lambda rule: (rule.weekday, rule.start_time))
+
+    @staticmethod
+    def add_exception(db: Session, doctor_id: int, exception) -> AvailabilityException:
+        db_exception = AvailabilityException(doctor_id=doctor_id, **exception.dict())
+        db.add(db_exception)
+        db.commit()
+        db.refresh(db_exception)
+        return db_exception
+
+    @staticmethod
+    def delete_exception(db: Session, doctor_id: int, exception_id: int):
+        deleted = db.query(AvailabilityException).filter(
+            AvailabilityException.id == exception_id, AvailabilityException.doctor_id == doctor_id
+        ).delete(synchronize_session=False)
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Availability exception not found")
+        db.commit()
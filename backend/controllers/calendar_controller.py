@@ -0,0 +1,133 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from models.appointment import Appointment, AppointmentStatus
+from models.user import User, UserType
+from utils.cache import TTLCache
+from utils.events import event_hub
+from utils.slots import (
+    SLOT_MINUTES, SLOTS_PER_DAY, DAY_START, day_range, busy_masks, elapsed_mask, render_day,
+)
+from utils.availability import availability_index
+from controllers.availability_controller import AvailabilityController
+from utils.database import SessionLocal, shard_router
+from datetime import date, datetime, timedelta
+from typing import Optional
+import itertools
+import os
+
+MAX_CALENDAR_DAYS = 62
+CALENDAR_CACHE_TTL = float(os.getenv("CALENDAR_CACHE_TTL", "30"))
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "50000"))
+
+class CalendarCache:
+    """(bookable, busy) bitmaps per doctor-day.
+
+    Booking events invalidate their day, a doctor.updated event bumps the
+    doctor's generation so all their days are rebuilt. Without the postgres
+    event backend other workers only catch up within CALENDAR_CACHE_TTL.
+    """
+
+    def __init__(self, maxsize: int = CALENDAR_CACHE_SIZE, ttl: float = CALENDAR_CACHE_TTL):
+        self._days = TTLCache(maxsize, ttl)
+        self._generations = {}
+        self._counter = itertools.count(1)
+
+    def _key(self, doctor_id: int, day: date) -> tuple:
+        return (doctor_id, self._generations.get(doctor_id, 0), day)
+
+    def get(self, doctor_id: int, day: date):
+        return self._days.get(self._key(doctor_id, day))
+
+    def set(self, doctor_id: int, day: date, masks: tuple):
+        self._days.set(self._key(doctor_id, day), masks)
+
+    def invalidate_day(self, doctor_id: int, day: date):
+        self._days.pop(self._key(doctor_id, day))
+
+    def invalidate_doctor(self, doctor_id: int):
+        self._generations[doctor_id] = next(self._counter)
+
+    def on_event(self, event_type: str, data: dict):
+        if event_type == "doctor.updated":
+            self.invalidate_doctor(data["doctor_id"])
+        elif "appointment" in data:
+            appointment = data["appointment"]
+            moment = appointment["appointment_datetime"]
+            moment = datetime.fromisoformat(moment) if isinstance(moment, str) else moment
+            self.invalidate_day(appointment["doctor_id"], moment.date())
+
+calendar_cache = CalendarCache()
+event_hub.add_listener(calendar_cache.on_event)
+
+class CalendarController:
+    @staticmethod
+    def load_day_masks(db: Session, doctor_id: int, days: list) -> dict:
+        """Compute (bookable, busy) for ``days`` with a few small column queries"""
+        doctor = db.query(User.available_timeslots, User.address_division).filter(
+            User.id == doctor_id, User.user_type == UserType.doctor
+        ).first()
+        if doctor is None:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+
+        with shard_router.session(db, shard_router.shard_for_division(doctor.address_division)) as session:
+            booked = session.query(Appointment.appointment_datetime).filter(
+                Appointment.doctor_id == doctor_id,
+                Appointment.appointment_datetime >= datetime.combine(min(days), datetime.min.time()),
+                Appointment.appointment_datetime < datetime.combine(max(days) + timedelta(days=1), datetime.min.time()),
+                Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
+            ).all()
+
+        bookable = AvailabilityController.bookable_masks(db, doctor_id, doctor.available_timeslots, days)
+        busy = busy_masks((row[0] for row in booked), days)
+        return {day: (bookable[day], busy[day]) for day in days}
+
+    @staticmethod
+    def get_doctor_calendar(db: Session, doctor_id: int, date_from: date, date_to: date) -> dict:
+        if date_to < date_from:
+            raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+        if (date_to - date_from).days >= MAX_CALENDAR_DAYS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_CALENDAR_DAYS} days per request")
+
+        days = list(day_range(date_from, date_to))
+        masks = {}
+        for day in days:
+            cached = calendar_cache.get(doctor_id, day)
+            if cached is not None:
+                masks[day] = cached
+
+        missing = [day for day in days if day not in masks]
+        if missing:
+            for day, day_masks in CalendarController.load_day_masks(db, doctor_id, missing).items():
+                calendar_cache.set(doctor_id, day, day_masks)
+                masks[day] = day_masks
+
+        # Past slots are hidden at render time so cached days stay valid all day
+        now = datetime.utcnow()
+        rendered = []
+        for day in days:
+            bookable, busy = masks[day]
+            bookable &= ~elapsed_mask(day, now)
+            rendered.append({
+                "date": day.isoformat(),
+                "grid": render_day(bookable, busy),
+                "free": bin(bookable & ~busy).count("1"),
+            })
+
+        return {
+            "doctor_id": doctor_id,
+            "slot_minutes": SLOT_MINUTES,
+            "day_start": DAY_START.strftime("%H:%M"),
+            "slots_per_day": SLOTS_PER_DAY,
+            "days": rendered,
+        }
+
+    @staticmethod
+    def get_earliest_slots(db: Session, limit: int = 10, after: Optional[datetime] = None,
+                           specialization: Optional[str] = None, division: Optional[str] = None,
+                           district: Optional[str] = None, max_fee: Optional[float] = None) -> list:
+        """Soonest free slots over all matching doctors, from the in-memory availability index"""
+        snapshot = availability_index.snapshot(db, SessionLocal)
+        return availability_index.earliest(
+            snapshot, limit, after, specialization=specialization, division=division,
+            district=district, max_fee=max_fee
+        )
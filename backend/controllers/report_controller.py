@@ -1,12 +1,93 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from models.report import Report
+from models.report_job import ReportJob, JobStatus, FINISHED_STATUSES
 from models.appointment import Appointment, AppointmentStatus
-from models.user import User
+from models.user import User, UserType
+from utils.jobs import report_job_runner
+from utils.database import shard_router
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, text
+from typing import List, Optional
+import uuid
+import zlib
+
+# A single job may cover at most this many months
+MAX_JOB_MONTHS = 120
+
+def month_bounds(year: int, month: int):
+    start_date = datetime(year, month, 1)
+    end_date = datetime(year, month + 1, 1) if month < 12 else datetime(year + 1, 1, 1)
+    return start_date, end_date
+
+def month_range(start_month: str, end_month: str) -> List[str]:
+    """'YYYY-MM' labels from start to end inclusive"""
+    year, month = int(start_month[:4]), int(start_month[5:])
+    months = []
+    while f"{year}-{month:02d}" <= end_month:
+        months.append(f"{year}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
 
 class ReportController:
+    @staticmethod
+    def write_month(db: Session, year: int, month: int, job_id: Optional[str] = None) -> List[Report]:
+        """Compute one month's reports for all doctors with one aggregate query per shard.
+
+        Reports already stored for the month by the same job (or, without a
+        job, by /generate) are replaced, so regenerating a month does not leave
+        duplicates behind while every job keeps its own results.
+        """
+        start_date, end_date = month_bounds(year, month)
+        label = f"{year}-{month:02d}"
+
+        def month_totals(session):
+            return session.query(
+                Appointment.doctor_id,
+                func.count(func.distinct(Appointment.patient_id)),
+                func.count(Appointment.id),
+            ).filter(
+                Appointment.status == AppointmentStatus.completed,
+                Appointment.appointment_datetime >= start_date,
+                Appointment.appointment_datetime < end_date
+            ).group_by(Appointment.doctor_id).all()
+
+        # A doctor's appointments live on one shard, so the totals of all
+        # shards never overlap
+        totals = {
+            doctor_id: (patients, appointments)
+            for shard_totals in shard_router.scatter(db, month_totals)
+            for doctor_id, patients, appointments in shard_totals
+        }
+        doctors = db.query(User.id, User.consultation_fee).filter(
+            User.user_type == UserType.doctor
+        ).order_by(User.id).all()
+        rows = [(doctor_id, fee) + totals.get(doctor_id, (0, 0)) for doctor_id, fee in doctors]
+
+        # Writers of the same month and job take turns, or both would delete
+        # nothing and insert a full set each
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"),
+                       {"key": zlib.crc32(f"reports:{label}:{job_id or ''}".encode())})
+        db.query(Report).filter(
+            Report.month == label,
+            Report.job_id == job_id if job_id is not None else Report.job_id.is_(None)
+        ).delete(synchronize_session=False)
+        reports = []
+        for doctor_id, fee, patients, appointments in rows:
+            report = Report(
+                doctor_id=doctor_id,
+                month=label,
+                total_patients=patients or 0,
+                total_appointments=appointments or 0,
+                total_earnings=(fee or 0) * (appointments or 0),
+                job_id=job_id
+            )
+            db.add(report)
+            reports.append(report)
+        db.commit()
+        return reports
+
     @staticmethod
     def generate_monthly_report(db: Session, year: int, month: int):
         # Validate year and month
@@ -16,35 +97,59 @@ class ReportController:
             raise HTTPException(status_code=400, detail="Year must be between 1900 and 9999")
         
         try:
-            start_date = datetime(year, month, 1)
-            end_date = datetime(year, month + 1, 1) if month < 12 else datetime(year + 1, 1, 1)
+            month_bounds(year, month)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid year or month")
         
-        doctors = db.query(User).filter(User.user_type == "doctor").all()
-        reports = []
-        
-        for doctor in doctors:
-            appointments = db.query(Appointment).filter(
-                Appointment.doctor_id == doctor.id,
-                Appointment.status == AppointmentStatus.completed,
-                Appointment.appointment_datetime >= start_date,
-                Appointment.appointment_datetime < end_date
-            ).all()
-            
-            total_patients = len(set(a.patient_id for a in appointments))
-            total_appointments = len(appointments)
-            total_earnings = sum(doctor.consultation_fee for _ in appointments)
-            
-            report = Report(
-                doctor_id=doctor.id,
-                month=f"{year}-{month:02d}",
-                total_patients=total_patients,
-                total_appointments=total_appointments,
-                total_earnings=total_earnings
-            )
-            db.add(report)
-            reports.append(report)
-        
+        return ReportController.write_month(db, year, month)
+
+    @staticmethod
+    def create_job(db: Session, start_month: str, end_month: str, user_id: int) -> ReportJob:
+        if end_month < start_month:
+            raise HTTPException(status_code=400, detail="end_month must not be before start_month")
+        months = month_range(start_month, end_month)
+        if len(months) > MAX_JOB_MONTHS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_JOB_MONTHS} months per job")
+
+        job = ReportJob(
+            id=uuid.uuid4().hex,
+            created_by=user_id,
+            start_month=start_month,
+            end_month=end_month,
+            status=JobStatus.queued.value,
+            total_months=len(months),
+            completed_months=0,
+            failed_months=0,
+            cancel_requested=False
+        )
+        db.add(job)
         db.commit()
-        return reports
\ No newline at end of file
+        db.refresh(job)
+
+        report_job_runner.submit(job.id, months, ReportController.write_month)
+        return job
+
+    @staticmethod
+    def get_job(db: Session, job_id: str) -> ReportJob:
+        job = db.query(ReportJob).filter(ReportJob.id == job_id).first()
+        if not job:
+            raise HTTPException(status_code=404, detail="Report job not found")
+        return job
+
+    @staticmethod
+    def cancel_job(db: Session, job_id: str) -> ReportJob:
+        """Ask a job to stop; months already being computed still finish"""
+        job = ReportController.get_job(db, job_id)
+        if job.status in {status.value for status in FINISHED_STATUSES}:
+            raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+        job.cancel_requested = True
+        db.commit()
+        db.refresh(job)
+        return job
+
+    @staticmethod
+    def get_job_reports(db: Session, job_id: str, skip: int = 0, limit: int = 100) -> List[Report]:
+        job = ReportController.get_job(db, job_id)
+        return db.query(Report).filter(Report.job_id == job.id).order_by(
+            Report.month, Report.doctor_id
+        ).offset(skip).limit(limit).all()
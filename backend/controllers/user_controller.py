@@ -4,19 +4,27 @@ from models.user import User, UserType
 from schemas.user_schema import UserCreate, UserResponse, UserUpdateRequest
 from fastapi import HTTPException, UploadFile
 from utils.auth import get_password_hash, verify_password
+from utils.database import shard_router
 from typing import List, Optional
 import os
 import logging
-from PIL import Image
 import uuid
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Columns needed by UserResponse. Listings select these as plain rows, which
+# skips the password hash and ORM object construction.
+USER_RESPONSE_COLUMNS = (
+    User.id, User.full_name, User.email, User.mobile_number, User.user_type,
+    User.address_division, User.address_district, User.address_thana, User.profile_image,
+    User.license_number, User.experience_years, User.consultation_fee,
+    User.available_timeslots, User.specialization, User.created_at,
+)
+
 class UserController:
     @staticmethod
     def create_user(db: Session, user: UserCreate):
-        logger.debug(f"Creating user: {user.email}")
+        logger.debug("Creating user: %s", user.email)
         
         # Check unique email/mobile
         existing_user = db.query(User).filter(
@@ -56,7 +64,7 @@ class UserController:
                   division: Optional[str] = None,
                   search: Optional[str] = None):
         
-        query = db.query(User)
+        query = db.query(*USER_RESPONSE_COLUMNS)
         
         # Apply filters
         if user_type:
@@ -95,14 +103,36 @@ class UserController:
             raise HTTPException(status_code=404, detail="User not found")
         return user
 
+    @staticmethod
+    def get_visible_version(db: Session, user_id: int, requester_id: int, email: str) -> Optional[int]:
+        """Version of a user's row if the token's account may read it; None means take the full path"""
+        rows = {
+            row.id: row for row in db.query(User.id, User.email, User.user_type, User.version).filter(
+                User.id.in_({user_id, requester_id})
+            )
+        }
+        requester = rows.get(requester_id)
+        if requester is None or requester.email != email or user_id not in rows:
+            return None
+        if requester_id != user_id and requester.user_type != UserType.admin:
+            return None
+        return rows[user_id].version
+
     @staticmethod
     def update_user(db: Session, user_id: int, user_update: UserUpdateRequest):
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
+        changes = user_update.dict(exclude_unset=True)
+        if (shard_router.enabled and user.user_type == UserType.doctor and "address_division" in changes
+                and shard_router.shard_for_division(changes["address_division"])
+                != shard_router.shard_for_division(user.address_division)):
+            # The doctor's appointments would stay behind on the old shard
+            raise HTTPException(status_code=400, detail="Changing a doctor's division to another region is not supported")
+        
         # Update fields
-        for field, value in user_update.dict(exclude_unset=True).items():
+        for field, value in changes.items():
             setattr(user, field, value)
         
         db.commit()
@@ -119,7 +149,7 @@ class UserController:
     @staticmethod
     def get_doctors_by_availability(db: Session, date: str, time_slot:str):
         """Get available doctors for a specific date (time_slot not required)"""
-        doctors = db.query(User).filter(
+        doctors = db.query(*USER_RESPONSE_COLUMNS).filter(
             User.user_type == UserType.doctor
         ).all()
         return doctors
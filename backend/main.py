@@ -1,20 +1,28 @@
 import logging
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
+from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
 
-from views import user_view, appointment_view, report_view
-from utils.database import Base, engine, create_tables, test_connection
-from models import User, Appointment, Report
-from utils.tasks import setup_scheduler
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from views import user_view, appointment_view, report_view, live_view
+from utils.metrics import MetricsMiddleware, render_metrics, APP_STARTUP_SECONDS
+from utils.profiling import QueryProfilerMiddleware
+from utils.admission import AdmissionControlMiddleware, ADMISSION_CONTROL
+from utils.timeouts import (
+    StatementTimeoutMiddleware, ClientDisconnected, is_statement_timeout, is_statement_cancelled
 )
+from utils.health import health_monitor
+from utils.events import event_hub
+from utils.jobs import report_job_runner
+from utils.startup import start_warm_up, seconds_since_start
+from utils.logging_config import setup_logging, shutdown_logging
+import asyncio
+import os
+
+# Configure logging (queue-backed, see utils/logging_config.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
@@ -23,31 +31,26 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up Healthcare Appointment System...")
     
-    try:
-        # Test database connection first
-        if not test_connection():
-            raise Exception("Database connection failed")
-        
-        # Create database tables
-        create_tables()
-        logger.info("Database tables created successfully!")
-    except Exception as e:
-        logger.error(f"Error creating database tables: {str(e)}")
-        # Don't raise here to allow the app to start even if DB is not ready
-        logger.warning("App starting without database connection")
+    # Database checks for the health probes run in the background
+    health_monitor.start()
     
-    try:
-        # Start background scheduler
-        scheduler = setup_scheduler()
-        logger.info("Background scheduler started successfully!")
-    except Exception as e:
-        logger.error(f"Failed to start scheduler: {str(e)}")
-        # Don't raise here as the app can still function without scheduler
+    # Table creation, pool warm-up and the scheduler run in a thread; readiness
+    # stays 503 until they are done (see utils/startup.py)
+    start_warm_up()
+    
+    # Live appointment events (SSE) are fanned out on this event loop
+    event_hub.start(asyncio.get_running_loop())
     
     yield
     
     # Shutdown
     logger.info("Shutting down Healthcare Appointment System...")
+    health_monitor.stop()
+    event_hub.stop()
+    report_job_runner.shutdown()
+    if health_monitor.scheduler is not None:
+        health_monitor.scheduler.shutdown(wait=False)
+    shutdown_logging()
 
 # Create FastAPI app
 app = FastAPI(
@@ -57,6 +60,14 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-request statement timeouts; queries of disconnected clients are cancelled
+app.add_middleware(StatementTimeoutMiddleware)
+
+# Admission control: per route class limits with fast 503s under overload.
+# Added first so CORS and metrics also cover the rejections
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionControlMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -73,10 +84,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics (latency, sizes, SQL per request), exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Development aid: flag N+1 patterns, slow statements and query-heavy requests
+if os.getenv("QUERY_PROFILER"):
+    app.add_middleware(QueryProfilerMiddleware, mode=os.getenv("QUERY_PROFILER"))
+
 # Global exception handler
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request, exc):
+    # Nobody is listening; 499 keeps these apart in the request metrics
+    return Response(status_code=499)
+
 @app.exception_handler(SQLAlchemyError)
 async def sqlalchemy_exception_handler(request, exc):
-    logger.error(f"Database error: {str(exc)}")
+    if is_statement_cancelled(exc):
+        return await client_disconnected_handler(request, exc)
+    if is_statement_timeout(exc):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "The request took too long. Please narrow it down or try again later."}
+        )
+    logger.error("Database error: %s", exc)
     return JSONResponse(
         status_code=500,
         content={"detail": "Database error occurred. Please try again later."}
@@ -84,7 +114,7 @@ async def sqlalchemy_exception_handler(request, exc):
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
-    logger.error(f"Unhandled error: {str(exc)}", exc_info=True)
+    logger.error("Unhandled error: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=500,
         content={"detail": "An unexpected error occurred. Please try again later."}
@@ -102,25 +132,41 @@ def health_check():
 
 @app.get("/health", tags=["Health"])
 def detailed_health_check():
-    """Detailed health check with system information"""
-    try:
-        # Test database connection
-        db_status = "healthy" if test_connection() else "unhealthy"
-    except Exception as e:
-        logger.error(f"Database health check failed: {str(e)}")
-        db_status = "unhealthy"
-    
+    """Detailed health check with system information (served from cached checks)"""
+    snapshot = health_monitor.snapshot()
     return {
         "api_status": "healthy",
-        "database_status": db_status,
+        "database_status": snapshot["database"]["status"],
+        "pool": snapshot["pool"],
+        "scheduler": snapshot["scheduler"],
         "version": "1.0.0",
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
 
+@app.get("/health/live", tags=["Health"])
+async def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness_check():
+    """Readiness probe backed by the background database check"""
+    snapshot = health_monitor.snapshot()
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Register API routers
 app.include_router(user_view.router, prefix="/api/v1")
 app.include_router(appointment_view.router, prefix="/api/v1")
 app.include_router(report_view.router, prefix="/api/v1")
+app.include_router(live_view.router, prefix="/api/v1")
+
+# Time spent importing the application (everything above)
+APP_STARTUP_SECONDS.set(seconds_since_start(), ("import",))
 
 # API documentation
 @app.get("/api/info", tags=["API Info"])
@@ -136,8 +182,12 @@ def api_info():
             "appointments": "/api/v1/appointments/",
             "users": "/api/v1/users/",
             "reports": "/api/v1/reports/",
+            "live_events": "/api/v1/live/appointments",
             "documentation": "/docs",
-            "health": "/health"
+            "health": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
+            "metrics": "/metrics"
         },
         "features": [
             "JWT Authentication",
@@ -152,11 +202,12 @@ def api_info():
     }
 
 if __name__ == "__main__":
+    # Development server; use server.py in production
     import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=os.getenv("RELOAD", "true").lower() in ("1", "true", "yes"),
         log_level="info"
     )
\ No newline at end of file
@@ -3,6 +3,9 @@ from utils.database import Base
 from .user import User, UserType, AppointmentStatus
 from .appointment import Appointment
 from .report import Report
+from .report_job import ReportJob, JobStatus
+from .availability import AvailabilityRule, AvailabilityException
 
 # Make sure all models are available
-__all__ = ['Base', 'User', 'UserType', 'AppointmentStatus', 'Appointment', 'Report']
\ No newline at end of file
+__all__ = ['Base', 'User', 'UserType', 'AppointmentStatus', 'Appointment', 'Report', 'ReportJob', 'JobStatus',
+           'AvailabilityRule', 'AvailabilityException']
\ No newline at end of file
@@ -1,21 +1,38 @@
-from sqlalchemy import Column, Integer, DateTime, String, Enum, ForeignKey, ARRAY, Text
+from sqlalchemy import Column, Integer, DateTime, String, Enum, ForeignKey, ARRAY, Text, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from utils.database import Base
+from models.types import SQLITE_ROWID
 from models.user import AppointmentStatus
 from datetime import datetime
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    # Range-partitioned by month on PostgreSQL (see utils/partitions.py).
+    # The partition key has to be part of the primary key (and of unique indexes).
+    __table_args__ = (
+        # At most one active booking per doctor and time slot, enforced by the
+        # database so concurrent or retried requests cannot double-book
+        Index(
+            "uq_appointments_doctor_slot_active", "doctor_id", "appointment_datetime", unique=True,
+            postgresql_where=text("status IN ('pending', 'confirmed')"),
+            sqlite_where=text("status IN ('pending', 'confirmed')"),
+        ),
+        {"postgresql_partition_by": "RANGE (appointment_datetime)"},
+    )
     
-    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
-    patient_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    appointment_datetime = Column(DateTime, nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True, info=SQLITE_ROWID)
+    patient_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    appointment_datetime = Column(DateTime, primary_key=True, nullable=False, index=True)
     notes = Column(String)
     status = Column(Enum(AppointmentStatus, name="appointmentstatus", create_type=False), 
                    default=AppointmentStatus.pending, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Maintained on every ORM update; incremental snapshots select on it
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Bumped by every UPDATE; ETags of conditional GETs are built from it
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"), onupdate=text("version + 1"))
     
     # Relationships
     patient = relationship("User", foreign_keys=[patient_id], lazy="select")
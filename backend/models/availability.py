@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Date, Time, DateTime, ForeignKey, Index
+from utils.database import Base
+from datetime import datetime
+
+class AvailabilityRule(Base):
+    """A doctor's recurring weekly hours, e.g. Mondays 09:00-13:00"""
+    __tablename__ = "availability_rules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # Monday = 0
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    # Optional bounds of the dates the rule applies to
+    valid_from = Column(Date)
+    valid_until = Column(Date)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<AvailabilityRule(doctor_id={self.doctor_id}, weekday={self.weekday}, {self.start_time}-{self.end_time})>"
+
+class AvailabilityException(Base):
+    """Time off (leave, holiday) overriding the weekly rules and declared slots"""
+    __tablename__ = "availability_exceptions"
+    __table_args__ = (
+        Index("ix_availability_exceptions_doctor_date", "doctor_id", "date"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    # Both empty: the whole day is off
+    start_time = Column(Time)
+    end_time = Column(Time)
+    reason = Column(String(200))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<AvailabilityException(doctor_id={self.doctor_id}, date={self.date})>"
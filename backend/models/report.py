@@ -13,6 +13,9 @@ class Report(Base):
     total_appointments = Column(Integer)
     total_earnings = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set when the report was produced by a background job
+    job_id = Column(String(32), ForeignKey("report_jobs.id", ondelete="SET NULL"), nullable=True, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     doctor = relationship("User", lazy="select")
     
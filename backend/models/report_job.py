@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from utils.database import Base
+from datetime import datetime
+import enum
+
+class JobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    cancelled = "cancelled"
+
+FINISHED_STATUSES = (JobStatus.succeeded, JobStatus.failed, JobStatus.cancelled)
+
+class ReportJob(Base):
+    """A background report generation over a range of months.
+
+    Kept in the database so any worker can answer status polls and
+    cancellations, whichever worker runs the job.
+    """
+    __tablename__ = "report_jobs"
+    
+    id = Column(String(32), primary_key=True)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    start_month = Column(String(7), nullable=False)
+    end_month = Column(String(7), nullable=False)
+    status = Column(String(20), nullable=False, default=JobStatus.queued.value)
+    total_months = Column(Integer, nullable=False)
+    completed_months = Column(Integer, nullable=False, default=0)
+    failed_months = Column(Integer, nullable=False, default=0)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<ReportJob(id={self.id}, {self.start_month}..{self.end_month}, status='{self.status}')>"
@@ -0,0 +1,28 @@
+from sqlalchemy import ARRAY, JSON, String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn, PrimaryKeyConstraint
+
+# Column types and DDL that work on PostgreSQL and on an embedded SQLite
+# database (DATABASE_URL=sqlite://, for unit tests and micro-benchmarks).
+
+# TEXT[] on PostgreSQL, a JSON list on SQLite
+StringList = ARRAY(String).with_variant(JSON(), "sqlite")
+
+# Marks the id of a table whose primary key also holds the PostgreSQL
+# partition key. SQLite only generates ids for a lone INTEGER PRIMARY KEY, so
+# there the id becomes that and the composite key is left out.
+SQLITE_ROWID = {"sqlite_rowid": True}
+
+@compiles(CreateColumn, "sqlite")
+def _sqlite_rowid_column(element, compiler, **kw):
+    column = element.element
+    if column.info.get("sqlite_rowid"):
+        return f"{compiler.preparer.format_column(column)} INTEGER PRIMARY KEY AUTOINCREMENT"
+    return compiler.visit_create_column(element, **kw)
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def _sqlite_rowid_primary_key(constraint, compiler, **kw):
+    if any(column.info.get("sqlite_rowid") for column in constraint.columns):
+        # Skipped by CREATE TABLE; the id alone is unique
+        return None
+    return compiler.visit_primary_key_constraint(constraint, **kw)
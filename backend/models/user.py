@@ -1,10 +1,9 @@
-from sqlalchemy import Column, Integer, String, Enum, Float, DateTime, ARRAY, Text
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Enum, Float, DateTime, Text, text
+from utils.database import Base
+from models.types import StringList
 from datetime import datetime
 import enum
 
-Base = declarative_base()
-
 class UserType(enum.Enum):
     admin = "admin"
     doctor = "doctor"
@@ -38,10 +37,14 @@ class User(Base):
     license_number = Column(String)
     experience_years = Column(Integer)
     consultation_fee = Column(Float)
-    available_timeslots = Column(ARRAY(String))
+    available_timeslots = Column(StringList)
     specialization = Column(String)  # Added for filtering
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Maintained on every ORM update; incremental snapshots select on it
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Bumped by every UPDATE; ETags of conditional GETs are built from it
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"), onupdate=text("version + 1"))
     
     def __repr__(self):
         return f"<User(id={self.id}, email='{self.email}', user_type='{self.user_type}')>"
\ No newline at end of file
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from enum import Enum
+import enum
 from .user_schema import UserResponse
 
 class AppointmentStatus(str, Enum):
@@ -42,10 +43,23 @@ class AppointmentResponse(AppointmentBase):
     patient: Optional[UserResponse] = None
     doctor: Optional[UserResponse] = None
     
+    @validator('status', pre=True)
+    def validate_status(cls, v):
+        # ORM rows carry the models.user.AppointmentStatus enum
+        return v.value if isinstance(v, enum.Enum) else v
+    
     class Config:
         orm_mode = True
         from_attributes = True
 
+class AppointmentPage(BaseModel):
+    appointments: List[AppointmentResponse]
+    # Only in the normalized view: referenced patients/doctors keyed by id
+    users: Optional[Dict[str, UserResponse]] = None
+    total: int
+    skip: int
+    limit: int
+
 class AppointmentStatusUpdate(BaseModel):
     status: AppointmentStatus
 
@@ -0,0 +1,79 @@
+from pydantic import BaseModel, validator
+from datetime import date, time, datetime
+from typing import Optional, List
+from utils.slots import DAY_START, DAY_END, CLOSED_WEEKDAYS
+
+class AvailabilityRuleBase(BaseModel):
+    weekday: int
+    start_time: time
+    end_time: time
+    valid_from: Optional[date] = None
+    valid_until: Optional[date] = None
+    
+    @validator('weekday')
+    def validate_weekday(cls, v):
+        if not 0 <= v <= 6:
+            raise ValueError('Weekday must be between 0 (Monday) and 6 (Sunday)')
+        if v in CLOSED_WEEKDAYS:
+            raise ValueError('Appointments cannot be scheduled on Sundays')
+        return v
+    
+    @validator('end_time')
+    def validate_end_time(cls, v, values):
+        start = values.get('start_time')
+        if start is not None and v <= start:
+            raise ValueError('end_time must be after start_time')
+        if start is not None and (start < DAY_START or v > DAY_END):
+            raise ValueError('Availability must be between 9 AM and 6 PM')
+        return v
+    
+    @validator('valid_until')
+    def validate_valid_until(cls, v, values):
+        valid_from = values.get('valid_from')
+        if v is not None and valid_from is not None and v < valid_from:
+            raise ValueError('valid_until must not be before valid_from')
+        return v
+
+class AvailabilityRuleResponse(AvailabilityRuleBase):
+    id: int
+    
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
+class AvailabilityRulesUpdate(BaseModel):
+    rules: List[AvailabilityRuleBase]
+
+class AvailabilityExceptionCreate(BaseModel):
+    date: date
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None
+    reason: Optional[str] = None
+    
+    @validator('end_time', always=True)
+    def validate_end_time(cls, v, values):
+        start = values.get('start_time')
+        if (start is None) != (v is None):
+            raise ValueError('Give both start_time and end_time, or neither for the whole day')
+        if v is not None and v <= start:
+            raise ValueError('end_time must be after start_time')
+        return v
+    
+    @validator('reason')
+    def validate_reason(cls, v):
+        if v is not None and len(v) > 200:
+            raise ValueError('Reason must be at most 200 characters')
+        return v
+
+class AvailabilityExceptionResponse(AvailabilityExceptionCreate):
+    id: int
+    created_at: datetime
+    
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
+class AvailabilityResponse(BaseModel):
+    doctor_id: int
+    rules: List[AvailabilityRuleResponse]
+    exceptions: List[AvailabilityExceptionResponse]
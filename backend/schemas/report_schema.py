@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from datetime import datetime
 from typing import Optional
 
@@ -12,4 +12,35 @@ class ReportResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class ReportJobCreate(BaseModel):
+    start_month: str
+    end_month: str
+
+    @validator('start_month', 'end_month')
+    def validate_month(cls, v):
+        try:
+            parsed = datetime.strptime(v, "%Y-%m")
+        except ValueError:
+            raise ValueError('Month must be in YYYY-MM format')
+        if parsed.year < 1900:
+            raise ValueError('Year must be between 1900 and 9999')
+        return parsed.strftime("%Y-%m")
+
+class ReportJobResponse(BaseModel):
+    id: str
+    start_month: str
+    end_month: str
+    status: str
+    total_months: int
+    completed_months: int
+    failed_months: int
+    cancel_requested: bool
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        orm_mode = True
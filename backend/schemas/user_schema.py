@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, validator, Field
 from typing import Optional, List
 from datetime import datetime
+import enum
 import re
 
 class UserBase(BaseModel):
@@ -97,10 +98,27 @@ class UserResponse(UserBase):
     available_timeslots: Optional[List[str]] = None
     specialization: Optional[str] = None
     
+    @validator('user_type', pre=True)
+    def validate_user_type(cls, v):
+        # ORM rows carry the models.user.UserType enum
+        return v.value if isinstance(v, enum.Enum) else v
+    
     class Config:
         orm_mode = True
         from_attributes = True
 
+class UserPage(BaseModel):
+    users: List[UserResponse]
+    total: int
+    skip: int
+    limit: int
+
+class DoctorPage(BaseModel):
+    doctors: List[UserResponse]
+    total: int
+    skip: int
+    limit: int
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
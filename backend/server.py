@@ -0,0 +1,107 @@
+"""Production entry point.
+
+    python server.py
+
+Runs gunicorn with uvicorn workers on uvloop and httptools. The application is
+imported once in the master (preload) and workers fork with every module
+already loaded. The scheduler runs once in the master rather than in every
+worker. Without gunicorn (e.g. on Windows) it falls back to uvicorn's own
+process manager.
+
+Settings: HOST, PORT, WEB_CONCURRENCY (workers), WORKER_TIMEOUT,
+GRACEFUL_TIMEOUT, KEEPALIVE, RUN_SCHEDULER, AUTO_CREATE_TABLES (defaults to
+false here: run migrations, or `python -c "from utils.database import
+create_tables; create_tables()"`, before deploying).
+"""
+import multiprocessing
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+
+try:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn.workers import UvicornWorker
+
+    class Worker(UvicornWorker):
+        CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools", "lifespan": "on"}
+except ImportError:
+    BaseApplication = None
+
+def post_fork(server, worker):
+    # Never share pooled connections opened in the master with a worker
+    from utils.database import replica_engines, shard_router
+    # shard_router.engines includes the main engine (shard 0)
+    for each in (*shard_router.engines.values(), *replica_engines):
+        each.dispose(close=False)
+    shard_router.reset_pool()
+
+def when_ready(server):
+    if os.getenv("MASTER_SCHEDULER") == "true":
+        from utils.tasks import setup_scheduler
+        server.scheduler = setup_scheduler()
+
+def on_exit(server):
+    scheduler = getattr(server, "scheduler", None)
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+
+def configure_environment():
+    os.environ.setdefault("AUTO_CREATE_TABLES", "false")
+    # Workers skip the scheduler; the master runs it when enabled
+    if os.getenv("RUN_SCHEDULER", "true").lower() in ("1", "true", "yes"):
+        os.environ["MASTER_SCHEDULER"] = "true"
+    os.environ["RUN_SCHEDULER"] = "false"
+
+if BaseApplication is not None:
+    class Server(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+def main():
+    configure_environment()
+    if BaseApplication is None:
+        import uvicorn
+        # No master process here, so the scheduler runs in the workers again
+        if os.environ.pop("MASTER_SCHEDULER", None):
+            if WORKERS == 1:
+                os.environ["RUN_SCHEDULER"] = "true"
+            else:
+                logger.warning("No process runs the scheduler: uvicorn's %d workers would each run it. "
+                               "Start one extra process with RUN_SCHEDULER=true (reminders, cleanup, "
+                               "partition maintenance), or install gunicorn", WORKERS)
+        else:
+            logger.warning("No process runs the scheduler (RUN_SCHEDULER=false)")
+        uvicorn.run("main:app", host=HOST, port=PORT, workers=WORKERS, loop="uvloop", http="httptools")
+        return
+
+    if os.getenv("MASTER_SCHEDULER") != "true":
+        logger.warning("No process runs the scheduler (RUN_SCHEDULER=false)")
+    Server({
+        "bind": f"{HOST}:{PORT}",
+        "workers": WORKERS,
+        "worker_class": "server.Worker",
+        "preload_app": True,
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "30")),
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        "keepalive": int(os.getenv("KEEPALIVE", "5")),
+        "post_fork": post_fork,
+        "when_ready": when_ready,
+        "on_exit": on_exit,
+    }).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+
+# The suite runs on an embedded database (see README, "Embedded SQLite")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# No background database work racing the tests
+os.environ.setdefault("RUN_SCHEDULER", "false")
+os.environ.setdefault("HEALTH_CHECK_INTERVAL", "3600")
+
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+PASSWORD = "Secret123!"
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+def next_monday() -> date:
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+def register(client, name: str, email: str, mobile: str, user_type: str = "patient", **fields) -> dict:
+    response = client.post("/api/v1/users/register", json={
+        "full_name": name, "email": email, "mobile_number": mobile, "password": PASSWORD,
+        "user_type": user_type, "address_division": "Dhaka", "address_district": "Dhaka",
+        "address_thana": "Gulshan", **fields,
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
+
+def login(client, email: str) -> dict:
+    response = client.post("/api/v1/users/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,90 @@
+"""Admission control: requests over a route class's budget are turned away with 503 and Retry-After"""
+import asyncio
+import sqlite3
+
+import httpx
+from sqlalchemy.pool import QueuePool
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import utils.admission
+from utils.admission import AdmissionControlMiddleware
+
+def make_client(release: asyncio.Event, pool=None, **classes) -> httpx.AsyncClient:
+    async def endpoint(request):
+        # Reads hold their slot until released
+        if request.method == "GET":
+            await release.wait()
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/api/v1/{path:path}", endpoint, methods=["GET", "POST"])])
+    middleware = AdmissionControlMiddleware(app, pool=pool if pool is not None else object(), classes=classes)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://testserver")
+
+def test_queue_then_shed():
+    async def run():
+        release = asyncio.Event()
+        async with make_client(release, reads=(1, 1, None, 3)) as client:
+            running = asyncio.create_task(client.get("/api/v1/users/doctors"))
+            queued = asyncio.create_task(client.get("/api/v1/users/doctors"))
+            await asyncio.sleep(0.05)
+            shed = await client.get("/api/v1/users/doctors")
+            release.set()
+            return shed, await running, await queued
+
+    shed, running, queued = asyncio.run(run())
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "3"
+    assert running.status_code == queued.status_code == 200
+
+def test_queue_timeout(monkeypatch):
+    monkeypatch.setattr(utils.admission, "ADMISSION_QUEUE_TIMEOUT", 0.05)
+
+    async def run():
+        release = asyncio.Event()
+        async with make_client(release, reads=(1, 1, None, 1)) as client:
+            running = asyncio.create_task(client.get("/api/v1/users/doctors"))
+            await asyncio.sleep(0.05)
+            timed_out = await client.get("/api/v1/users/doctors")
+            release.set()
+            return timed_out, await running
+
+    timed_out, running = asyncio.run(run())
+    assert timed_out.status_code == 503
+    assert running.status_code == 200
+
+def test_classes_are_independent_and_unlisted_routes_pass():
+    async def run():
+        release = asyncio.Event()
+        async with make_client(release, reads=(1, 0, None, 1), booking=(1, 0, None, 1)) as client:
+            running = asyncio.create_task(client.get("/api/v1/users/doctors"))
+            await asyncio.sleep(0.05)
+            shed = await client.get("/api/v1/users/doctors")
+            booking = await client.post("/api/v1/appointments/")
+            # No limits configured for login
+            login = await client.post("/api/v1/users/login")
+            release.set()
+            return shed, booking, login, await running
+
+    assert [response.status_code for response in asyncio.run(run())] == [503, 200, 200, 200]
+
+def test_shed_by_pool_pressure():
+    pool = QueuePool(lambda: sqlite3.connect(":memory:"), pool_size=2, max_overflow=0)
+    connections = [pool.connect() for _ in range(2)]
+
+    async def run():
+        release = asyncio.Event()
+        release.set()
+        async with make_client(release, pool, reports=(3, 6, 0.7, 10), booking=(10, 50, None, 1)) as client:
+            return await client.get("/api/v1/reports/analytics/bookings"), await client.post("/api/v1/appointments/")
+
+    try:
+        report, booking = asyncio.run(run())
+    finally:
+        for connection in connections:
+            connection.close()
+    assert report.status_code == 503
+    assert report.headers["Retry-After"] == "10"
+    # Booking is only limited by its own budget
+    assert booking.status_code == 200
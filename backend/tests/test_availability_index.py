@@ -0,0 +1,45 @@
+"""Earliest-slot search: the in-memory index follows registrations and bookings made after it was built"""
+from datetime import datetime
+
+from conftest import register, login, next_monday
+
+SPECIALIZATION = "Cardiology"
+
+def earliest(client, headers, day) -> set:
+    response = client.get("/api/v1/users/doctors/earliest-slots", headers=headers, params={
+        "specialization": SPECIALIZATION, "after": f"{day}T00:00:00", "limit": 50})
+    assert response.status_code == 200, response.text
+    return {(slot["doctor_id"], datetime.fromisoformat(slot["appointment_datetime"]))
+            for slot in response.json()["slots"]}
+
+def test_register_book_search(client):
+    day = next_monday()
+    register(client, "Patient Echo", "echo@example.com", "+8801800000101")
+    headers = login(client, "echo@example.com")
+    # Builds the index before the doctor exists
+    assert earliest(client, headers, day) == set()
+
+    doctor = register(client, "Doctor Foxtrot", "foxtrot@example.com", "+8801700000101", user_type="doctor",
+                      license_number="L101", experience_years=5, consultation_fee=500,
+                      specialization=SPECIALIZATION, available_timeslots=[f"{day} 10:00:00"])
+    response = client.post("/api/v1/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_datetime": f"{day}T10:00:00"})
+    assert response.status_code == 201, response.text
+
+    slots = earliest(client, headers, day)
+    assert (doctor["id"], datetime.combine(day, datetime.min.time()).replace(hour=10)) not in slots
+    assert (doctor["id"], datetime.combine(day, datetime.min.time()).replace(hour=10, minute=30)) in slots
+
+def test_non_padded_timeslots_are_bookable(client):
+    day = next_monday()
+    doctor = register(client, "Doctor Golf", "golf@example.com", "+8801700000102", user_type="doctor",
+                      license_number="L102", experience_years=5, consultation_fee=500,
+                      specialization=SPECIALIZATION,
+                      available_timeslots=[f"{day.year}-{day.month}-{day.day} 9:30:00"])
+    headers = login(client, "echo@example.com")
+
+    slots = earliest(client, headers, day)
+    assert (doctor["id"], datetime.combine(day, datetime.min.time()).replace(hour=9, minute=30)) in slots
+    response = client.post("/api/v1/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_datetime": f"{day}T09:30:00"})
+    assert response.status_code == 201, response.text
@@ -0,0 +1,66 @@
+"""Doctor calendars: the day grid, its cache following bookings and profile changes, and the booking rule"""
+import pytest
+
+from utils.slots import SLOT_MINUTES, SLOTS_PER_DAY
+from conftest import register, login, next_monday
+
+def slot(hour: int, minute: int = 0) -> int:
+    return ((hour - 9) * 60 + minute) // SLOT_MINUTES
+
+@pytest.fixture(scope="module")
+def doctor(client):
+    day = next_monday()
+    doctor = register(client, "Doctor Mike", "mike@example.com", "+8801700000401", user_type="doctor",
+                      license_number="L401", experience_years=5, consultation_fee=500,
+                      specialization="Dermatology", available_timeslots=[f"{day} 10:00:00"])
+    register(client, "Patient November", "november@example.com", "+8801800000401")
+    return doctor, login(client, "november@example.com"), day
+
+def grid(client, headers, doctor_id, day) -> str:
+    response = client.get(f"/api/v1/users/doctors/{doctor_id}/calendar", headers=headers,
+                          params={"date_from": str(day), "date_to": str(day)})
+    assert response.status_code == 200, response.text
+    days = response.json()["days"]
+    assert len(days) == 1 and len(days[0]["grid"]) == SLOTS_PER_DAY
+    return days[0]["grid"]
+
+def test_grid_follows_bookings(client, doctor):
+    doctor, headers, day = doctor
+    # Within an hour of the declared 10:00
+    before = grid(client, headers, doctor["id"], day)
+    assert before[slot(9):slot(11) + 1] == "f" * (slot(11) - slot(9) + 1)
+    assert set(before[slot(11) + 1:]) == {"."}
+
+    response = client.post("/api/v1/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_datetime": f"{day}T10:30:00"})
+    assert response.status_code == 201, response.text
+    # The cached day is invalidated by the booking event
+    booked = grid(client, headers, doctor["id"], day)
+    assert booked[slot(10, 30)] == "b"
+
+    response = client.put(f"/api/v1/appointments/{response.json()['id']}/status", headers=headers,
+                          json={"status": "cancelled"})
+    assert response.status_code == 200, response.text
+    assert grid(client, headers, doctor["id"], day) == before
+
+def test_grid_follows_timeslot_changes(client, doctor):
+    doctor, headers, day = doctor
+    grid(client, headers, doctor["id"], day)
+    response = client.put("/api/v1/users/me", headers=login(client, "mike@example.com"),
+                          json={"available_timeslots": [f"{day} 16:00:00"]})
+    assert response.status_code == 200, response.text
+    after = grid(client, headers, doctor["id"], day)
+    assert after[slot(15):slot(17) + 1] == "f" * (slot(17) - slot(15) + 1)
+    assert after[slot(10)] == "."
+
+def test_booking_rule_is_exact(client, doctor):
+    doctor, headers, day = doctor
+    # Declared 16:00 (test_grid_follows_timeslot_changes): 16:59 is off the
+    # slot grid but within the hour, 17:01 is not
+    response = client.post("/api/v1/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_datetime": f"{day}T17:01:00"})
+    assert response.status_code == 400
+    assert "Available slots" in response.json()["detail"]
+    response = client.post("/api/v1/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_datetime": f"{day}T16:59:00"})
+    assert response.status_code == 201, response.text
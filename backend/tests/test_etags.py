@@ -0,0 +1,70 @@
+"""Conditional GETs: 304 while the rows behind a representation are unchanged"""
+import pytest
+
+from conftest import register, login, next_monday
+
+@pytest.fixture(scope="module")
+def appointment(client):
+    day = next_monday()
+    doctor = register(client, "Doctor Romeo", "romeo@example.com", "+8801700000601", user_type="doctor",
+                      license_number="L601", experience_years=5, consultation_fee=500,
+                      specialization="Psychiatry", available_timeslots=[f"{day} 10:00:00"])
+    register(client, "Patient Sierra", "sierra@example.com", "+8801800000601")
+    headers = login(client, "sierra@example.com")
+    response = client.post("/api/v1/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_datetime": f"{day}T10:00:00"})
+    assert response.status_code == 201, response.text
+    return headers, response.json()["id"]
+
+def get(client, path, headers, etag=None):
+    return client.get(path, headers={**headers, **({"If-None-Match": etag} if etag else {})})
+
+def test_profile(client, appointment):
+    headers, _ = appointment
+    first = get(client, "/api/v1/users/me", headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    unchanged = get(client, "/api/v1/users/me", headers, etag)
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["ETag"] == etag
+    assert get(client, "/api/v1/users/me", headers, f'"other", W/{etag}').status_code == 304
+
+    update = client.put("/api/v1/users/me", headers=headers, json={"full_name": "Patient Sierra Two"})
+    assert update.status_code == 200, update.text
+    changed = get(client, "/api/v1/users/me", headers, etag)
+    assert changed.status_code == 200
+    assert changed.json()["full_name"] == "Patient Sierra Two"
+    assert changed.headers["ETag"] == update.headers["ETag"] != etag
+
+def test_appointment(client, appointment):
+    headers, appointment_id = appointment
+    path = f"/api/v1/appointments/{appointment_id}"
+    etag = get(client, path, headers).headers["ETag"]
+    assert get(client, path, headers, etag).status_code == 304
+
+    # The doctor's profile is part of the representation
+    doctor_headers = login(client, "romeo@example.com")
+    assert client.put("/api/v1/users/me", headers=doctor_headers, json={"consultation_fee": 600}).status_code == 200
+    response = get(client, path, headers, etag)
+    assert response.status_code == 200
+    assert response.json()["doctor"]["consultation_fee"] == 600
+    etag = response.headers["ETag"]
+
+    response = client.put(f"{path}/status", headers=doctor_headers, json={"status": "confirmed"})
+    assert response.status_code == 200, response.text
+    response = get(client, path, headers, etag)
+    assert response.status_code == 200
+    assert response.json()["status"] == "confirmed"
+
+def test_no_304_without_access(client, appointment):
+    headers, appointment_id = appointment
+    path = f"/api/v1/appointments/{appointment_id}"
+    etag = get(client, path, headers).headers["ETag"]
+    register(client, "Patient Tango", "tango@example.com", "+8801800000602")
+    response = get(client, path, login(client, "tango@example.com"), etag)
+    assert response.status_code in (403, 404)
+    response = get(client, path, {"Authorization": "Bearer invalid"}, etag)
+    assert response.status_code == 401
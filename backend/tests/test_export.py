@@ -0,0 +1,95 @@
+"""Appointment exports: CSV and NDJSON, names, gzip, and encoding chunk by chunk"""
+import csv
+import gzip
+import io
+
+import orjson
+import pytest
+
+from controllers.appointment_controller import EXPORT_COLUMNS, EXPORT_NAME_COLUMNS
+from utils.export import stream_rows
+from conftest import register, login, next_monday
+
+HOURS = ("10:00:00", "12:00:00", "14:00:00")
+
+@pytest.fixture(scope="module")
+def exported(client):
+    day = next_monday()
+    doctor = register(client, "Doctor Oscar", "oscar@example.com", "+8801700000501", user_type="doctor",
+                      license_number="L501", experience_years=5, consultation_fee=500,
+                      specialization="Pediatrics", available_timeslots=[f"{day} {hour}" for hour in HOURS])
+    register(client, "Patient Papa", "papa@example.com", "+8801800000501")
+    headers = login(client, "papa@example.com")
+    ids = []
+    for hour in HOURS:
+        response = client.post("/api/v1/appointments/", headers=headers, json={
+            "doctor_id": doctor["id"], "appointment_datetime": f"{day}T{hour}"})
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    register(client, "Admin Quebec", "quebec@example.com", "+8801900000501", user_type="admin")
+    return login(client, "quebec@example.com"), doctor, ids
+
+def export(client, headers, doctor, **params):
+    response = client.get("/api/v1/appointments/export", headers=headers,
+                          params={"doctor_id": doctor["id"], **params})
+    assert response.status_code == 200, response.text
+    return response
+
+def test_csv(client, exported):
+    headers, doctor, ids = exported
+    response = export(client, headers, doctor, include_names=True)
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="appointments.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert tuple(rows[0]) == EXPORT_COLUMNS + EXPORT_NAME_COLUMNS
+    assert sorted(int(row["id"]) for row in rows) == sorted(ids)
+    assert {row["doctor_name"] for row in rows} == {"Doctor Oscar"}
+    assert {row["status"] for row in rows} == {"pending"}
+
+def test_ndjson(client, exported):
+    headers, doctor, ids = exported
+    response = export(client, headers, doctor, format="ndjson")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [orjson.loads(line) for line in response.content.splitlines()]
+    assert sorted(record["id"] for record in records) == sorted(ids)
+    assert set(records[0]) == set(EXPORT_COLUMNS)
+
+def test_gzip_matches_plain_export(client, exported):
+    headers, doctor, _ = exported
+    plain = export(client, headers, doctor).content
+    response = export(client, headers, doctor, gzip=True)
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="appointments.csv.gz"' in response.headers["content-disposition"]
+    assert gzip.decompress(response.content) == plain
+
+def test_admins_only(client, exported):
+    _, doctor, _ = exported
+    response = client.get("/api/v1/appointments/export", headers=login(client, "papa@example.com"))
+    assert response.status_code == 403
+
+class Session:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_rows_are_encoded_chunk_by_chunk(compress):
+    session = Session()
+    rows = [(index, f"note {index}") for index in range(5)]
+    chunks = list(stream_rows(lambda: session, lambda _: iter(rows), ("id", "notes"), "csv",
+                              compress=compress, chunk_size=2))
+    body = b"".join(chunks)
+    if compress:
+        body = gzip.decompress(body)
+    else:
+        # Header with the first chunk, then one chunk per two rows
+        assert chunks[0] == b"id,notes\r\n0,note 0\r\n1,note 1\r\n"
+        assert len(chunks) == 3
+    assert body.decode().splitlines() == ["id,notes"] + [f"{index},note {index}" for index in range(5)]
+    assert session.closed
+
+def test_empty_export_has_header():
+    session = Session()
+    assert b"".join(stream_rows(lambda: session, lambda _: [], ("id", "notes"), "csv")) == b"id,notes\r\n"
+    assert b"".join(stream_rows(lambda: session, lambda _: [], ("id", "notes"), "ndjson")) == b""
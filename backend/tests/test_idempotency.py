@@ -0,0 +1,65 @@
+"""Idempotency-Key on booking: replays, reuse with another body and retries while the first is running"""
+import pytest
+
+from schemas.appointment_schema import AppointmentCreate
+from utils.idempotency import REPLAY_HEADER, fingerprint, idempotency_store
+from conftest import register, login, next_monday
+
+@pytest.fixture(scope="module")
+def booking(client):
+    day = next_monday()
+    doctor = register(client, "Doctor Juliet", "juliet@example.com", "+8801700000301", user_type="doctor",
+                      license_number="L301", experience_years=5, consultation_fee=500,
+                      specialization="Orthopedics",
+                      available_timeslots=[f"{day} {hour}" for hour in ("10:00:00", "12:00:00", "14:00:00")])
+    patient = register(client, "Patient Kilo", "kilo@example.com", "+8801800000301")
+    return patient, login(client, "kilo@example.com"), doctor, day
+
+def book(client, headers, key, doctor, moment):
+    return client.post("/api/v1/appointments/", headers={**headers, "Idempotency-Key": key},
+                       json={"doctor_id": doctor["id"], "appointment_datetime": moment})
+
+def test_retry_replays_first_response(client, booking):
+    _, headers, doctor, day = booking
+    first = book(client, headers, "replay-1", doctor, f"{day}T10:00:00")
+    assert first.status_code == 201, first.text
+    assert REPLAY_HEADER not in first.headers
+
+    retry = book(client, headers, "replay-1", doctor, f"{day}T10:00:00")
+    assert retry.status_code == 201
+    assert retry.headers[REPLAY_HEADER] == "true"
+    assert retry.json() == first.json()
+    listing = client.get("/api/v1/appointments/", headers=headers).json()
+    assert [appointment["id"] for appointment in listing["appointments"]] == [first.json()["id"]]
+
+def test_client_errors_are_replayed(client, booking):
+    _, headers, doctor, day = booking
+    # Outside the declared timeslots
+    first = book(client, headers, "unavailable-1", doctor, f"{day}T17:00:00")
+    assert first.status_code == 400
+    retry = book(client, headers, "unavailable-1", doctor, f"{day}T17:00:00")
+    assert retry.status_code == first.status_code
+    assert retry.headers[REPLAY_HEADER] == "true"
+    assert retry.json() == first.json()
+
+def test_key_reused_with_other_body_is_rejected(client, booking):
+    _, headers, doctor, day = booking
+    assert book(client, headers, "reuse-1", doctor, f"{day}T12:00:00").status_code == 201
+    response = book(client, headers, "reuse-1", doctor, f"{day}T14:00:00")
+    assert response.status_code == 422
+    assert "different request" in response.json()["detail"]
+
+def test_retry_while_first_is_running(client, booking):
+    patient, headers, doctor, day = booking
+    body = {"doctor_id": doctor["id"], "appointment_datetime": f"{day}T14:00:00"}
+    # The first request has claimed the key and not finished yet
+    assert idempotency_store.begin(str(patient["id"]), "running-1", fingerprint(AppointmentCreate(**body))) is None
+    try:
+        response = book(client, headers, "running-1", doctor, body["appointment_datetime"])
+        assert response.status_code == 409
+        assert response.headers["Retry-After"] == "1"
+    finally:
+        idempotency_store.release(str(patient["id"]), "running-1")
+    # Keys are per user
+    register(client, "Patient Lima", "lima@example.com", "+8801800000302")
+    assert book(client, login(client, "lima@example.com"), "reuse-1", doctor, body["appointment_datetime"]).status_code == 201
@@ -0,0 +1,57 @@
+"""N+1 guards: list and detail endpoints run a fixed number of queries however many rows they return"""
+import pytest
+
+from utils.profiling import profile_queries
+from conftest import register, login, next_monday
+
+DOCTORS = 3
+HOURS = ("10:00:00", "11:00:00", "12:00:00")
+
+@pytest.fixture(scope="module")
+def bookings(client):
+    day = next_monday()
+    doctors = [
+        register(client, f"Doctor {name}", f"doctor{index}@example.com", f"+88017000000{index:02d}",
+                 user_type="doctor", license_number=f"L{index}", experience_years=5,
+                 consultation_fee=500, specialization="Medicine",
+                 available_timeslots=[f"{day} {hour}" for hour in HOURS])
+        for index, name in enumerate(("Alpha", "Bravo", "Charlie")[:DOCTORS], start=1)
+    ]
+    register(client, "Patient Delta", "patient@example.com", "+8801800000001")
+    headers = login(client, "patient@example.com")
+    ids = []
+    for doctor in doctors:
+        for hour in HOURS[:2]:
+            response = client.post("/api/v1/appointments/", headers=headers, json={
+                "doctor_id": doctor["id"], "appointment_datetime": f"{day}T{hour}"})
+            assert response.status_code == 201, response.text
+            ids.append(response.json()["id"])
+    return headers, ids
+
+def test_appointment_list_has_no_n_plus_one(client, bookings):
+    headers, ids = bookings
+    with profile_queries("list appointments", requests_only=True, max_queries=6):
+        response = client.get("/api/v1/appointments/", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total"] == len(ids)
+
+def test_appointment_detail_has_no_n_plus_one(client, bookings):
+    headers, ids = bookings
+    with profile_queries("appointment detail", requests_only=True, max_queries=5):
+        response = client.get(f"/api/v1/appointments/{ids[-1]}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["doctor"]["id"]
+
+def test_doctor_appointment_list_has_no_n_plus_one(client, bookings):
+    headers = login(client, "doctor1@example.com")
+    with profile_queries("doctor's appointments", requests_only=True, max_queries=6):
+        response = client.get("/api/v1/appointments/", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total"] == len(HOURS[:2])
+
+def test_doctor_list_has_no_n_plus_one(client, bookings):
+    headers, _ = bookings
+    with profile_queries("list doctors", requests_only=True, max_queries=5):
+        response = client.get("/api/v1/users/doctors", headers=headers, params={"specialization": "Medicine"})
+    assert response.status_code == 200
+    assert response.json()["total"] == DOCTORS
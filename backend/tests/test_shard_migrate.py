@@ -0,0 +1,39 @@
+"""Moving appointments booked before their division got a shard"""
+from sqlalchemy import select
+
+from models.appointment import Appointment
+from utils.database import ShardRouter, _shard_metadata
+from utils.shard_migrate import move_appointments, unmoved_appointments
+from conftest import register, login, next_monday
+
+def test_move_appointments_to_new_shard(client):
+    day = next_monday()
+    doctor = register(client, "Doctor Hotel", "hotel@example.com", "+8801700000201", user_type="doctor",
+                      license_number="L201", experience_years=5, consultation_fee=500,
+                      specialization="Neurology", address_division="Sylhet",
+                      available_timeslots=[f"{day} 10:00:00"])
+    register(client, "Patient India", "india@example.com", "+8801800000201")
+    response = client.post("/api/v1/appointments/", headers=login(client, "india@example.com"), json={
+        "doctor_id": doctor["id"], "appointment_datetime": f"{day}T10:00:00"})
+    assert response.status_code == 201, response.text
+    appointment_id = response.json()["id"]
+
+    router = ShardRouter([({"sylhet"}, "sqlite://")])
+    shard_table = _shard_metadata().tables["appointments"]
+    shard_table.create(bind=router.engines[1])
+    # An interrupted run: copied to the shard but not yet deleted
+    with router.engines[0].connect() as connection:
+        row = dict(connection.execute(
+            select(Appointment.__table__).where(Appointment.__table__.c.id == appointment_id)
+        ).mappings().one())
+    with router.engines[1].begin() as connection:
+        connection.execute(shard_table.insert(), [row])
+    assert unmoved_appointments(router) == 1
+
+    assert move_appointments(router, dry_run=True) == {1: 1}
+    assert move_appointments(router) == {1: 1}
+    assert unmoved_appointments(router) == 0
+    assert move_appointments(router) == {1: 0}
+    with router.engines[1].connect() as connection:
+        moved = connection.execute(select(shard_table.c.id, shard_table.c.doctor_id)).all()
+    assert [tuple(row) for row in moved] == [(appointment_id, doctor["id"])]
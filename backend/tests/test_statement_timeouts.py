@@ -0,0 +1,67 @@
+"""Statement timeouts per route and cancelling a request's statements when its client goes away"""
+import sqlite3
+import threading
+
+import pytest
+
+from utils.timeouts import (
+    ClientDisconnected, RequestStatements, STATEMENT_TIMEOUTS, is_statement_cancelled, statement_timeout_for,
+)
+
+# Runs until interrupted, bounded in case it is not
+LONG_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1e9) SELECT count(*) FROM n"
+
+def test_timeout_by_route_class_and_prefix(monkeypatch):
+    assert statement_timeout_for("GET", "/api/v1/appointments/") == STATEMENT_TIMEOUTS["reads"]
+    assert statement_timeout_for("POST", "/api/v1/appointments/") == STATEMENT_TIMEOUTS["booking"]
+    assert statement_timeout_for("GET", "/health") is None
+    monkeypatch.setitem(STATEMENT_TIMEOUTS, "/api/v1/users/", 3.0)
+    monkeypatch.setitem(STATEMENT_TIMEOUTS, "/api/v1/users/doctors", 0.0)
+    assert statement_timeout_for("GET", "/api/v1/users/me") == 3.0
+    # Longest prefix wins, and 0 means no timeout
+    assert statement_timeout_for("GET", "/api/v1/users/doctors") is None
+
+def test_cancel_interrupts_running_statement():
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    # Loads the schema, which runs statements of its own: the handler then
+    # only fires once LONG_QUERY is running
+    connection.execute("SELECT 1")
+    running = threading.Event()
+    connection.set_progress_handler(lambda: running.set() or 0, 1000)
+    statements = RequestStatements(None, "reads")
+    errors = []
+
+    def run():
+        statements.started(connection)
+        try:
+            connection.execute(LONG_QUERY).fetchall()
+        except sqlite3.OperationalError as e:
+            errors.append(e)
+        finally:
+            statements.finished(connection)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert running.wait(10)
+    assert statements.cancel() == 1
+    thread.join(10)
+    assert not thread.is_alive()
+    assert len(errors) == 1 and is_statement_cancelled(errors[0])
+    # Nothing more runs for a client that has gone away
+    with pytest.raises(ClientDisconnected):
+        statements.started(connection)
+
+def test_cancel_skips_finished_connections():
+    interrupted = []
+
+    class Connection:
+        def interrupt(self):
+            interrupted.append(self)
+
+    statements = RequestStatements(5, "reads")
+    done, running = Connection(), Connection()
+    statements.started(done)
+    statements.started(running)
+    statements.finished(done)
+    assert statements.cancel() == 1
+    assert interrupted == [running]
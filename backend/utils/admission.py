@@ -0,0 +1,148 @@
+from starlette.responses import JSONResponse
+from sqlalchemy.pool import QueuePool
+from typing import Dict, Optional
+import asyncio
+import logging
+import os
+
+from utils.metrics import ADMISSION_REJECTED, ADMISSION_IN_FLIGHT, ADMISSION_QUEUED
+
+logger = logging.getLogger(__name__)
+
+# Admission control. Each route class may run a limited number of requests at
+# once; a few more wait briefly in a bounded queue and the rest are turned
+# away at once with 503 and Retry-After, instead of queueing inside the
+# SQLAlchemy pool until pool_timeout and dragging every request down with them.
+#
+# The classes also shed by database pool pressure (checked-out connections /
+# pool_size + max_overflow): reports go first, then login and reads, while
+# booking is only limited by its own budget.
+#
+#   ADMISSION_<CLASS>=concurrency:queue, e.g. ADMISSION_REPORTS=2:4
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+# How long a queued request may wait for a slot
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+
+# class -> (concurrency, queue, shed at pool pressure, Retry-After seconds)
+DEFAULT_CLASSES = {
+    "booking": (10, 50, None, 1),
+    "reads": (16, 64, 0.95, 1),
+    "login": (4, 16, 0.9, 2),
+    "reports": (3, 6, 0.7, 10),
+}
+
+# Long-lived or operational routes never wait for admission
+EXEMPT_PREFIXES = ("/api/v1/live/",)
+REPORT_PREFIXES = ("/api/v1/reports/generate/", "/api/v1/reports/analytics/", "/api/v1/appointments/export")
+LOGIN_PATHS = ("/api/v1/users/login", "/api/v1/users/register")
+BOOKING_PREFIX = "/api/v1/appointments/"
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Admission class of a request, None when it is not limited"""
+    if not path.startswith("/api/") or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith(REPORT_PREFIXES):
+        return "reports"
+    if path in LOGIN_PATHS:
+        # bcrypt: CPU-bound, tens of milliseconds each
+        return "login"
+    if method in ("POST", "PUT") and path.startswith(BOOKING_PREFIX):
+        return "booking"
+    # Everything else: cheap reads and small profile writes
+    return "reads"
+
+def _class_config(name: str, defaults: tuple) -> tuple:
+    concurrency, queue, shed_at, retry_after = defaults
+    value = os.getenv(f"ADMISSION_{name.upper()}")
+    if value:
+        concurrency, _, queue = value.partition(":")
+        concurrency, queue = int(concurrency), int(queue or 0)
+    return concurrency, queue, shed_at, retry_after
+
+def pool_pressure(pool) -> float:
+    """Share of the pool's connections (including overflow) checked out"""
+    if not isinstance(pool, QueuePool):
+        return 0.0
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    return pool.checkedout() / capacity if capacity else 0.0
+
+class _RouteClass:
+    """Concurrency limit and bounded wait queue of one route class"""
+
+    def __init__(self, name: str, concurrency: int, queue: int, shed_at: Optional[float], retry_after: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.shed_at = shed_at
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = None
+
+    async def acquire(self, pressure: float) -> Optional[str]:
+        """Take a slot; returns the rejection reason instead when there is none to be had"""
+        if self.shed_at is not None and pressure >= self.shed_at:
+            return "pool_pressure"
+        if self._semaphore is None:
+            # Created on the serving event loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self._semaphore.locked():
+            if self.waiting >= self.queue:
+                return "queue_full"
+            self.waiting += 1
+            ADMISSION_QUEUED.inc(labels=(self.name,))
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), ADMISSION_QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return "timeout"
+            finally:
+                self.waiting -= 1
+                ADMISSION_QUEUED.dec(labels=(self.name,))
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        ADMISSION_IN_FLIGHT.inc(labels=(self.name,))
+        return None
+
+    def release(self):
+        self.active -= 1
+        ADMISSION_IN_FLIGHT.dec(labels=(self.name,))
+        self._semaphore.release()
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying the route class limits (disable with ADMISSION_CONTROL=false)"""
+
+    def __init__(self, app, pool=None, classes: Optional[Dict[str, tuple]] = None):
+        self.app = app
+        if pool is None:
+            from utils.database import engine
+            pool = engine.pool
+        self.pool = pool
+        self.classes = {
+            name: _RouteClass(name, *_class_config(name, defaults))
+            for name, defaults in (classes or DEFAULT_CLASSES).items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        route = self.classes.get(name)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await route.acquire(pool_pressure(self.pool))
+        if reason is not None:
+            ADMISSION_REJECTED.inc(labels=(name, reason))
+            logger.debug("Admission control: %s %s rejected (%s, %s)", scope["method"], scope["path"], name, reason)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "The server is busy. Please try again shortly."},
+                headers={"Retry-After": str(route.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route.release()
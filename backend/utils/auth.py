@@ -2,12 +2,12 @@ from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from models.user import User
 from sqlalchemy.orm import Session
 from fastapi import Depends, HTTPException, status
 from schemas.user_schema import UserResponse
-from utils.database import get_db
+from utils.database import get_read_db, SessionLocal
 import secrets
 import os
 
@@ -18,6 +18,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login")
+# For endpoints that also accept the token elsewhere (EventSource cannot set headers)
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login", auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -48,13 +50,17 @@ def verify_token(token: str) -> dict:
     except JWTError:
         return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserResponse:
-    """Get current authenticated user"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def token_claims(token: Optional[str]) -> Tuple[int, str]:
+    """(user_id, email) of a valid bearer token, raising 401 otherwise; no database access"""
+    if not token:
+        raise _credentials_exception()
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -62,16 +68,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         user_id: int = payload.get("user_id")
         
         if email is None or user_id is None:
-            raise credentials_exception
+            raise _credentials_exception()
             
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
     
+    return user_id, email
+
+def load_token_user(db: Session, user_id: int, email: str) -> User:
+    """The user a token was issued to, raising 401 when the account is gone"""
     user = db.query(User).filter(User.email == email, User.id == user_id).first()
+    if user is None and db.info.get("replica"):
+        # The account may be too new to have reached the replica yet
+        with SessionLocal() as primary:
+            user = primary.query(User).filter(User.email == email, User.id == user_id).first()
     if user is None:
-        raise credentials_exception
-    
-    return UserResponse.from_orm(user)
+        raise _credentials_exception()
+    return user
+
+def authenticate_token(token: Optional[str], db: Session) -> UserResponse:
+    """Resolve a bearer token to its user, raising 401 when it is missing or invalid"""
+    return UserResponse.from_orm(load_token_user(db, *token_claims(token)))
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)) -> UserResponse:
+    """Get current authenticated user"""
+    return authenticate_token(token, db)
 
 async def get_current_active_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
     """Get current active user (can be extended to check if user is active/disabled)"""
@@ -0,0 +1,415 @@
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from time import monotonic
+from typing import Dict, Iterable, List, Optional
+import heapq
+import threading
+import os
+import logging
+
+import numpy as np
+
+from models.appointment import Appointment, AppointmentStatus
+from models.user import User, UserType
+from models.availability import AvailabilityRule, AvailabilityException
+from utils.database import shard_router
+from utils.events import event_hub
+from utils.slots import (
+    SLOTS_PER_DAY, SLOT_MINUTES, DAY_START, day_range, parse_timeslots, available_masks, slot_index, slot_start,
+)
+
+logger = logging.getLogger(__name__)
+
+# In-memory index for "earliest free slots across doctors".
+#
+# Every doctor is a row of a boolean matrix over the slot grid of the next
+# AVAILABILITY_HORIZON_DAYS days (utils/slots.py), True where the slot can be
+# booked and is not. A search selects the matching rows with array
+# comparisons, takes the first free column of each row with argmax, and
+# merges rows on a heap until it has the requested number of slots.
+#
+# Bookings and status changes arrive as events (utils/events.py) and update
+# single cells. A doctor.updated event (registration, timeslots, rules, time
+# off) marks the doctor's row stale; the next lookup reloads that row before
+# answering, so the search never serves availability the calendar no longer
+# shows. Bookings of a doctor registered after the build are loaded with the
+# new row, and booking events that arrive before the row exists are kept and
+# replayed onto it. A full rebuild from the database runs on first use, when the day
+# changes and every AVAILABILITY_REBUILD_SECONDS as a safety net.
+
+AVAILABILITY_HORIZON_DAYS = int(os.getenv("AVAILABILITY_HORIZON_DAYS", "60"))
+AVAILABILITY_REBUILD_SECONDS = float(os.getenv("AVAILABILITY_REBUILD_SECONDS", "600"))
+ACTIVE_STATUSES = (AppointmentStatus.pending.value, AppointmentStatus.confirmed.value)
+DOCTOR_COLUMNS = (
+    User.id, User.full_name, User.specialization, User.address_division, User.address_district,
+    User.consultation_fee, User.available_timeslots,
+)
+
+def _mask_bits(mask: int) -> np.ndarray:
+    """Day bitmap (bit i = slot i) as SLOTS_PER_DAY booleans"""
+    return np.unpackbits(
+        np.frombuffer(mask.to_bytes(8, "little"), dtype=np.uint8), bitorder="little"
+    )[:SLOTS_PER_DAY].astype(bool)
+
+def load_rules(db: Session, doctor_ids: Optional[Iterable[int]] = None) -> Dict[int, list]:
+    """Weekly availability rules per doctor, for ``doctor_ids`` or all doctors"""
+    query = db.query(
+        AvailabilityRule.doctor_id, AvailabilityRule.weekday, AvailabilityRule.start_time,
+        AvailabilityRule.end_time, AvailabilityRule.valid_from, AvailabilityRule.valid_until
+    )
+    if doctor_ids is not None:
+        query = query.filter(AvailabilityRule.doctor_id.in_(list(doctor_ids)))
+    rules = {}
+    for rule in query.all():
+        rules.setdefault(rule.doctor_id, []).append(rule)
+    return rules
+
+def load_exceptions(db: Session, date_from: date, date_to: date,
+                    doctor_ids: Optional[Iterable[int]] = None) -> Dict[int, list]:
+    """Availability exceptions between two dates (inclusive) per doctor"""
+    query = db.query(
+        AvailabilityException.doctor_id, AvailabilityException.date, AvailabilityException.start_time,
+        AvailabilityException.end_time
+    ).filter(AvailabilityException.date >= date_from, AvailabilityException.date <= date_to)
+    if doctor_ids is not None:
+        query = query.filter(AvailabilityException.doctor_id.in_(list(doctor_ids)))
+    exceptions = {}
+    for exception in query.all():
+        exceptions.setdefault(exception.doctor_id, []).append(exception)
+    return exceptions
+
+def load_bookings(db: Session, origin: date, doctor_ids: Optional[Iterable[int]] = None) -> list:
+    """Pending and confirmed appointments in the horizon from ``origin``, on every shard"""
+    def query(session: Session):
+        rows = session.query(
+            Appointment.id, Appointment.doctor_id, Appointment.appointment_datetime
+        ).filter(
+            Appointment.appointment_datetime >= datetime.combine(origin, datetime.min.time()),
+            Appointment.appointment_datetime < datetime.combine(
+                origin + timedelta(days=AVAILABILITY_HORIZON_DAYS), datetime.min.time()
+            ),
+            Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
+        )
+        if doctor_ids is not None:
+            rows = rows.filter(Appointment.doctor_id.in_(list(doctor_ids)))
+        return rows.all()
+    return [row for rows in shard_router.scatter(db, query) for row in rows]
+
+def _as_datetime(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+class _Snapshot:
+    """Arrays for one build; replaced as a whole on rebuild"""
+
+    def __init__(self, origin: date, doctors: list, bookings: list, rules: dict = None, exceptions: dict = None):
+        self.origin = origin
+        self.built_at = monotonic()
+        count = len(doctors)
+        columns = AVAILABILITY_HORIZON_DAYS * SLOTS_PER_DAY
+        days = list(day_range(origin, origin + timedelta(days=AVAILABILITY_HORIZON_DAYS - 1)))
+
+        self.rows = {}
+        self.doctor_ids = np.empty(count, dtype=np.int64)
+        self.names = [None] * count
+        self.fees = np.full(count, np.nan)
+        self.bookable = np.zeros((count, columns), dtype=bool)
+        self._codes = {"specialization": {}, "division": {}, "district": {}}
+        self.attributes = {name: np.full(count, -1, dtype=np.int32) for name in self._codes}
+
+        for row, doctor in enumerate(doctors):
+            self.rows[doctor.id] = row
+            self._fill_row(row, doctor, (rules or {}).get(doctor.id, ()), (exceptions or {}).get(doctor.id, ()))
+
+        self.free = self.bookable.copy()
+        # (row, column) -> ids of active bookings in that slot
+        self.booked = {}
+        # doctor_id -> {appointment_id: (moment, active)} for doctors without
+        # a row yet (registered after the build), replayed by set_doctor
+        self.unplaced = {}
+        for booking in bookings:
+            self.book(booking.id, booking.doctor_id, booking.appointment_datetime)
+
+    def _fill_row(self, row: int, doctor, rules: Iterable, exceptions: Iterable):
+        """Attributes and bookable slots of one doctor"""
+        self.doctor_ids[row] = doctor.id
+        self.names[row] = doctor.full_name
+        self.fees[row] = np.nan if doctor.consultation_fee is None else doctor.consultation_fee
+        for name, value in (("specialization", doctor.specialization), ("division", doctor.address_division),
+                            ("district", doctor.address_district)):
+            codes = self._codes[name]
+            self.attributes[name][row] = codes.setdefault(value.strip().lower(), len(codes)) if value else -1
+        days = list(day_range(self.origin, self.origin + timedelta(days=AVAILABILITY_HORIZON_DAYS - 1)))
+        masks = available_masks(parse_timeslots(doctor.available_timeslots), rules, exceptions, days)
+        self.bookable[row] = False
+        for day, mask in masks.items():
+            if mask:
+                offset = (day - self.origin).days * SLOTS_PER_DAY
+                self.bookable[row, offset:offset + SLOTS_PER_DAY] = _mask_bits(mask)
+
+    def set_doctor(self, doctor, rules: Iterable, exceptions: Iterable, bookings: Iterable = ()):
+        """Reload one doctor's row, keeping its bookings
+
+        A new doctor's row is appended and gets ``bookings`` (its active
+        appointments as loaded from the database) plus the booking events
+        seen for it since.
+        """
+        row = self.rows.get(doctor.id)
+        added = row is None
+        if added:
+            row = len(self.doctor_ids)
+            self.rows[doctor.id] = row
+            self.doctor_ids = np.append(self.doctor_ids, doctor.id)
+            self.names.append(None)
+            self.fees = np.append(self.fees, np.nan)
+            self.attributes = {name: np.append(values, -1) for name, values in self.attributes.items()}
+            self.bookable = np.vstack([self.bookable, np.zeros((1, self.bookable.shape[1]), dtype=bool)])
+            self.free = np.vstack([self.free, np.zeros((1, self.free.shape[1]), dtype=bool)])
+        self._fill_row(row, doctor, rules, exceptions)
+        self.free[row] = self.bookable[row]
+        for booked_row, column in self.booked:
+            if booked_row == row:
+                self.free[row, column] = False
+        if added:
+            for booking in bookings:
+                self.book(booking.id, booking.doctor_id, booking.appointment_datetime)
+            for appointment_id, (moment, active) in self.unplaced.pop(doctor.id, {}).items():
+                (self.book if active else self.release)(appointment_id, doctor.id, moment)
+
+    def code(self, name: str, value: str) -> Optional[int]:
+        return self._codes[name].get(value.strip().lower())
+
+    def column(self, moment: datetime) -> Optional[int]:
+        index = slot_index(moment)
+        offset = (moment.date() - self.origin).days
+        if index is None or not 0 <= offset < AVAILABILITY_HORIZON_DAYS:
+            return None
+        return offset * SLOTS_PER_DAY + index
+
+    def first_column_after(self, moment: datetime) -> Optional[int]:
+        """First slot starting strictly after ``moment`` (bookings must be in the future)"""
+        offset = (moment.date() - self.origin).days
+        if offset < 0:
+            return 0
+        minutes = (moment - datetime.combine(moment.date(), DAY_START)).total_seconds() / 60
+        index = 0 if minutes < 0 else int(minutes // SLOT_MINUTES) + 1
+        if index >= SLOTS_PER_DAY:
+            offset, index = offset + 1, 0
+        column = offset * SLOTS_PER_DAY + index
+        return column if column < AVAILABILITY_HORIZON_DAYS * SLOTS_PER_DAY else None
+
+    def book(self, appointment_id: int, doctor_id: int, moment: datetime):
+        row, column = self.rows.get(doctor_id), self.column(moment)
+        if column is None:
+            return
+        if row is None:
+            self.unplaced.setdefault(doctor_id, {})[appointment_id] = (moment, True)
+            return
+        self.booked.setdefault((row, column), set()).add(appointment_id)
+        self.free[row, column] = False
+
+    def release(self, appointment_id: int, doctor_id: int, moment: datetime):
+        row, column = self.rows.get(doctor_id), self.column(moment)
+        if column is None:
+            return
+        if row is None:
+            self.unplaced.setdefault(doctor_id, {})[appointment_id] = (moment, False)
+            return
+        holders = self.booked.get((row, column))
+        if holders is not None:
+            holders.discard(appointment_id)
+            if not holders:
+                del self.booked[(row, column)]
+        self.free[row, column] = self.bookable[row, column] and (row, column) not in self.booked
+
+    def slot_time(self, column: int) -> datetime:
+        return slot_start(self.origin + timedelta(days=int(column) // SLOTS_PER_DAY), int(column) % SLOTS_PER_DAY)
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        # One build at a time
+        self._build_lock = threading.Lock()
+        # Events seen while a rebuild reads the database, replayed onto it
+        self._pending = None
+        # Doctors whose row is reloaded before the next lookup
+        self._stale_doctors = set()
+
+    def build(self, db: Session) -> _Snapshot:
+        """Load doctors and bookings in the horizon and swap in a new snapshot"""
+        with self._build_lock:
+            return self._build(db)
+
+    def _build(self, db: Session) -> _Snapshot:
+        origin = datetime.utcnow().date()
+        with self._lock:
+            self._pending = []
+        try:
+            doctors = db.query(*DOCTOR_COLUMNS).filter(User.user_type == UserType.doctor).order_by(User.id).all()
+            bookings = load_bookings(db, origin)
+            rules = load_rules(db)
+            exceptions = load_exceptions(db, origin, origin + timedelta(days=AVAILABILITY_HORIZON_DAYS - 1))
+            snapshot = _Snapshot(origin, doctors, bookings, rules, exceptions)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            for event_type, data in self._pending:
+                self._apply(snapshot, event_type, data)
+            self._pending = None
+            self._snapshot = snapshot
+        logger.info("Availability index built: %d doctors, %d booked slots", len(doctors), len(snapshot.booked))
+        return snapshot
+
+    def _rebuild_in_background(self, session_factory):
+        def run():
+            try:
+                with session_factory() as db:
+                    self.build(db)
+            except Exception as e:
+                logger.error("Availability index rebuild failed: %s", e)
+            finally:
+                self._rebuilding = False
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=run, name="availability-index", daemon=True).start()
+
+    def snapshot(self, db: Session, session_factory=None) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._build_lock:
+                if self._snapshot is None:
+                    return self._build(db)
+                return self._snapshot
+        if self._stale_doctors:
+            self._refresh_doctors(db, session_factory)
+        stale = snapshot.origin != datetime.utcnow().date() or monotonic() - snapshot.built_at > AVAILABILITY_REBUILD_SECONDS
+        if stale and session_factory is not None:
+            # Keep answering from the current snapshot meanwhile
+            self._rebuild_in_background(session_factory)
+        return snapshot
+
+    def _refresh_doctors(self, db: Session, session_factory=None):
+        """Reload the rows of doctors changed since the snapshot was built"""
+        with self._lock:
+            doctor_ids, self._stale_doctors = self._stale_doctors, set()
+        if not doctor_ids:
+            return
+        # From the primary when possible: a lagging replica may not have the change yet
+        session = session_factory() if session_factory is not None else db
+        try:
+            doctors = session.query(*DOCTOR_COLUMNS).filter(
+                User.id.in_(doctor_ids), User.user_type == UserType.doctor
+            ).all()
+            origin = self._snapshot.origin
+            rules = load_rules(session, doctor_ids)
+            exceptions = load_exceptions(session, origin, origin + timedelta(days=AVAILABILITY_HORIZON_DAYS - 1),
+                                         doctor_ids)
+            # Doctors registered after the build have no row, so their
+            # bookings so far are not in the snapshot
+            new_ids = [doctor.id for doctor in doctors if doctor.id not in self._snapshot.rows]
+            bookings = {}
+            for booking in load_bookings(session, origin, new_ids) if new_ids else ():
+                bookings.setdefault(booking.doctor_id, []).append(booking)
+        except Exception:
+            with self._lock:
+                self._stale_doctors |= doctor_ids
+            raise
+        finally:
+            if session is not db:
+                session.close()
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot.origin != origin:
+                # Rebuilt meanwhile, from data at least this recent
+                return
+            for doctor in doctors:
+                snapshot.set_doctor(doctor, rules.get(doctor.id, ()), exceptions.get(doctor.id, ()),
+                                    bookings.get(doctor.id, ()))
+
+    def _apply(self, snapshot: _Snapshot, event_type: str, data: dict):
+        if event_type.startswith("doctor."):
+            # Timeslots, rules or profile changed: reload the row on next use
+            self._stale_doctors.add(data["doctor_id"])
+            return
+        appointment = data.get("appointment")
+        if not appointment:
+            return
+        moment = _as_datetime(appointment["appointment_datetime"])
+        if appointment["status"] in ACTIVE_STATUSES:
+            snapshot.book(appointment["id"], appointment["doctor_id"], moment)
+        else:
+            snapshot.release(appointment["id"], appointment["doctor_id"], moment)
+
+    def on_event(self, event_type: str, data: dict):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((event_type, data))
+            if self._snapshot is not None:
+                self._apply(self._snapshot, event_type, data)
+
+    def earliest(self, snapshot: _Snapshot, limit: int = 10, after: Optional[datetime] = None,
+                 specialization: Optional[str] = None, division: Optional[str] = None,
+                 district: Optional[str] = None, max_fee: Optional[float] = None) -> List[dict]:
+        """The ``limit`` earliest free slots over all matching doctors, at most one scan per row"""
+        # Rows may be appended concurrently (set_doctor)
+        with self._lock:
+            return self._earliest(snapshot, limit, after, specialization, division, district, max_fee)
+
+    def _earliest(self, snapshot: _Snapshot, limit: int, after: Optional[datetime], specialization: Optional[str],
+                  division: Optional[str], district: Optional[str], max_fee: Optional[float]) -> List[dict]:
+        now = datetime.utcnow()
+        first_column = snapshot.first_column_after(max(after or now, now))
+        if first_column is None:
+            return []
+
+        selected = np.ones(len(snapshot.doctor_ids), dtype=bool)
+        for name, value in (("specialization", specialization), ("division", division), ("district", district)):
+            if value:
+                code = snapshot.code(name, value)
+                if code is None:
+                    return []
+                selected &= snapshot.attributes[name] == code
+        if max_fee is not None:
+            selected &= snapshot.fees <= max_fee
+        rows = np.flatnonzero(selected)
+        if not len(rows):
+            return []
+
+        window = snapshot.free[rows, first_column:]
+        has_free = window.any(axis=1)
+        rows, window = rows[has_free], window[has_free]
+        if not len(rows):
+            return []
+        firsts = window.argmax(axis=1)
+
+        # Only doctors whose first free slot is among the ``limit`` earliest
+        # firsts can contribute to the result
+        if len(rows) > limit:
+            keep = np.argpartition(firsts, limit - 1)[:limit]
+            rows, window, firsts = rows[keep], window[keep], firsts[keep]
+
+        heap = [(int(column), int(row), index) for index, (row, column) in enumerate(zip(rows, firsts))]
+        heapq.heapify(heap)
+        results = []
+        while heap and len(results) < limit:
+            column, row, index = heapq.heappop(heap)
+            results.append({
+                "doctor_id": int(snapshot.doctor_ids[row]),
+                "full_name": snapshot.names[row],
+                "consultation_fee": None if np.isnan(snapshot.fees[row]) else float(snapshot.fees[row]),
+                "appointment_datetime": snapshot.slot_time(first_column + column),
+            })
+            following = np.flatnonzero(window[index, column + 1:])
+            if len(following):
+                heapq.heappush(heap, (column + 1 + int(following[0]), row, index))
+        return results
+
+availability_index = AvailabilityIndex()
+event_hub.add_listener(availability_index.on_event)
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable, Optional
+import threading
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire after ``ttl`` seconds.
+
+    Holds at most ``maxsize`` entries; when full the least recently used one
+    is evicted. Expired entries are dropped when they are looked up or when
+    they reach the LRU end.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires < monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def add(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set ``key`` only if it has no live entry; returns whether it was set"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= monotonic():
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def _set(self, key: Hashable, value: Any, ttl: Optional[float]):
+        now = monotonic()
+        self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        # Expired entries at the LRU end go first
+        while self._data:
+            oldest = next(iter(self._data))
+            if self._data[oldest][0] >= now:
+                break
+            del self._data[oldest]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
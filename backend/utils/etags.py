@@ -0,0 +1,30 @@
+from fastapi import Response
+from typing import Optional
+
+# Conditional GETs. Users and appointments carry a version counter that every
+# UPDATE bumps, so a representation's ETag is made of the versions of the rows
+# it is built from. When a request brings If-None-Match, the view fetches just
+# those versions (which also proves the token's account still exists) and
+# answers 304 before loading, authorising in full or serialising anything.
+
+# Per-user data: browsers and proxies may keep it but must revalidate
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(kind: str, *versions) -> str:
+    return '"' + "-".join([kind, *(str(version) for version in versions)]) + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists ``etag`` (weak comparison)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
@@ -0,0 +1,241 @@
+from collections import deque
+from typing import Callable, Iterable, Optional
+import asyncio
+import itertools
+import select
+import threading
+import os
+import logging
+
+import orjson
+
+from utils.metrics import LIVE_SUBSCRIBERS, LIVE_EVENTS, LIVE_SUBSCRIBERS_DROPPED
+from utils.serialization import serialize_appointment_summary
+
+logger = logging.getLogger(__name__)
+
+# Live appointment events for dashboards, pushed as Server-Sent Events.
+#
+# Every subscriber listens on one topic: "admin" (all appointments),
+# "doctor:<id>" or "patient:<id>". An event is encoded once and the same
+# bytes are put on the queue of every subscriber of its topics, so a publish
+# costs one dict lookup per topic plus one put per subscriber. Subscribers
+# only live on the event loop; publishers (sync endpoints in the threadpool)
+# hand the event over with a single call_soon_threadsafe per publish.
+#
+# The hub is per process. With several workers set LIVE_EVENTS_BACKEND=postgres
+# and events are relayed between them with LISTEN/NOTIFY.
+
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+LIVE_REPLAY_SIZE = int(os.getenv("LIVE_REPLAY_SIZE", "1000"))
+LIVE_EVENTS_BACKEND = os.getenv("LIVE_EVENTS_BACKEND", "memory")
+
+ADMIN_TOPIC = "admin"
+
+def user_topic(user_type: str, user_id: int) -> str:
+    return ADMIN_TOPIC if user_type == "admin" else f"{user_type}:{user_id}"
+
+def appointment_topics(patient_id: int, doctor_id: int) -> tuple:
+    return (ADMIN_TOPIC, f"doctor:{doctor_id}", f"patient:{patient_id}")
+
+def encode_frame(event_id: str, event_type: str, data: dict) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event_id.encode(), event_type.encode(), orjson.dumps(data))
+
+class Subscription:
+    """One connected client; ``None`` on the queue means the stream has to end"""
+    __slots__ = ("topic", "queue", "closed")
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            # Make room for the sentinel; the client reconnects with Last-Event-ID
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+class EventHub:
+    """In-process fan-out of live events to SSE subscribers"""
+
+    def __init__(self, replay_size: int = LIVE_REPLAY_SIZE):
+        self._topics = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._prefix = ""
+        # (event id, topics, frame) of recent events for reconnecting clients
+        self._recent = deque(maxlen=replay_size)
+        self.bridge = None
+        self._listeners = []
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        # Event ids stay unique across workers (the hub is created before fork)
+        self._prefix = f"{os.getpid():x}"
+        if LIVE_EVENTS_BACKEND == "postgres":
+            from utils.database import engine
+            self.bridge = PostgresEventBridge(engine, self)
+            self.bridge.start()
+
+    def stop(self):
+        if self.bridge is not None:
+            self.bridge.stop()
+            self.bridge = None
+        for subscriptions in list(self._topics.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+        self._topics.clear()
+        LIVE_SUBSCRIBERS.set(0)
+
+    def subscribe(self, topic: str) -> Subscription:
+        """Register a subscriber; call from the event loop"""
+        subscription = Subscription(topic)
+        self._topics.setdefault(topic, set()).add(subscription)
+        LIVE_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._topics.get(subscription.topic)
+        if subscriptions is not None and subscription in subscriptions:
+            subscriptions.discard(subscription)
+            LIVE_SUBSCRIBERS.dec()
+            if not subscriptions:
+                del self._topics[subscription.topic]
+
+    def replay_after(self, last_event_id: str, topic: str) -> Optional[list]:
+        """Frames after ``last_event_id`` for ``topic``, None when it is no longer buffered"""
+        recent = list(self._recent)
+        for index, (event_id, _, _) in enumerate(recent):
+            if event_id == last_event_id:
+                return [frame for _, topics, frame in recent[index + 1:] if topic in topics]
+        return None
+
+    def publish(self, event_type: str, data: dict, topics: Iterable[str]):
+        """Send an event to the subscribers of ``topics``; safe to call from any thread"""
+        event_id = f"{self._prefix}-{next(self._ids)}"
+        topics = tuple(topics)
+        LIVE_EVENTS.inc(labels=(event_type,))
+        if self.bridge is not None:
+            self.bridge.publish(event_id, event_type, data, topics)
+        else:
+            self.dispatch(event_id, event_type, data, topics)
+
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        """Call ``listener(event_type, data)`` for every event, from the dispatching thread.
+
+        Used by in-process state that follows appointment changes (see
+        utils/availability.py); with the postgres backend that includes
+        changes made by other workers.
+        """
+        self._listeners.append(listener)
+
+    def dispatch(self, event_id: str, event_type: str, data: dict, topics: tuple):
+        """Deliver an event to this process' listeners and subscribers"""
+        for listener in self._listeners:
+            try:
+                listener(event_type, data)
+            except Exception:
+                logger.exception("Live event listener failed for %s", event_type)
+
+        frame = encode_frame(event_id, event_type, data)
+        self._recent.append((event_id, topics, frame))
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(topics, frame)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, topics, frame)
+
+    def _fan_out(self, topics: tuple, frame: bytes):
+        for topic in topics:
+            for subscription in list(self._topics.get(topic, ())):
+                try:
+                    subscription.queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    # A client this far behind gets disconnected instead of
+                    # buffering without bound
+                    LIVE_SUBSCRIBERS_DROPPED.inc()
+                    self.unsubscribe(subscription)
+                    subscription.close()
+
+class PostgresEventBridge:
+    """Relays events between worker processes through LISTEN/NOTIFY"""
+
+    CHANNEL = "live_events"
+    # NOTIFY payloads are limited to 8000 bytes
+    MAX_PAYLOAD = 7900
+
+    def __init__(self, engine, hub: EventHub):
+        self.engine = engine
+        self.hub = hub
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, event_id: str, event_type: str, data: dict, topics: tuple):
+        payload = orjson.dumps({"id": event_id, "type": event_type, "data": data, "topics": topics}).decode()
+        if len(payload) > self.MAX_PAYLOAD:
+            logger.warning("Live event %s too large for NOTIFY, delivered locally only", event_id)
+            self.hub.dispatch(event_id, event_type, data, topics)
+            return
+        try:
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql("SELECT pg_notify(%(channel)s, %(payload)s)",
+                                           {"channel": self.CHANNEL, "payload": payload})
+                connection.commit()
+        except Exception as e:
+            logger.error("Failed to relay live event %s: %s", event_id, e)
+            self.hub.dispatch(event_id, event_type, data, topics)
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        try:
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.CHANNEL}")
+            while not self._stop.is_set():
+                if select.select([connection], [], [], 1.0)[0]:
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        message = orjson.loads(notify.payload)
+                        self.hub.dispatch(message["id"], message["type"], message["data"], tuple(message["topics"]))
+        finally:
+            raw.invalidate()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error("Live event listener failed, reconnecting: %s", e)
+                self._stop.wait(1)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="live-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+event_hub = EventHub()
+
+def publish_appointment_event(event_type: str, appointment):
+    """Push a created/updated appointment to its patient, its doctor and admins"""
+    event_hub.publish(
+        event_type,
+        {"appointment": serialize_appointment_summary(appointment)},
+        appointment_topics(appointment.patient_id, appointment.doctor_id),
+    )
+
+def publish_doctor_event(doctor_id: int):
+    """A doctor's profile or timeslots changed (for in-process availability state only)"""
+    event_hub.publish("doctor.updated", {"doctor_id": doctor_id}, ())
@@ -0,0 +1,80 @@
+from typing import Callable, Iterator, Sequence
+import csv
+import enum
+import io
+import os
+import zlib
+
+import orjson
+
+# Streaming exports. Rows are read through a server-side cursor
+# (Query.yield_per, psycopg2 named cursor) EXPORT_CHUNK_SIZE at a time,
+# encoded per chunk and optionally gzip-compressed as they go, so memory use
+# does not depend on the number of rows exported.
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+def encode_csv(columns: Sequence[str], rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+def encode_ndjson(columns: Sequence[str], rows, header: bool) -> bytes:
+    option = orjson.OPT_APPEND_NEWLINE
+    return b"".join(
+        orjson.dumps({column: _plain(value) for column, value in zip(columns, row)}, option=option)
+        for row in rows
+    )
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson}
+
+def stream_rows(session_factory: Callable, build_rows: Callable, columns: Sequence[str], fmt: str,
+                compress: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the encoded export chunk by chunk.
+
+    ``build_rows(session)`` returns the rows, e.g. a query with yield_per.
+    The session is opened here rather than taken from a request dependency,
+    which FastAPI closes before a streaming response is sent.
+    """
+    encode = ENCODERS[fmt]
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    session = session_factory()
+    rows = None
+    try:
+        rows = build_rows(session)
+        header = True
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                data = encode(columns, chunk, header)
+                header = False
+                chunk.clear()
+                data = compressor.compress(data) if compressor else data
+                if data:
+                    yield data
+        if chunk or header:
+            data = encode(columns, chunk, header)
+            yield compressor.compress(data) + compressor.flush() if compressor else data
+        elif compressor:
+            yield compressor.flush()
+    finally:
+        if hasattr(rows, "close"):
+            # Generators close their shard sessions
+            rows.close()
+        session.close()
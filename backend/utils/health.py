@@ -0,0 +1,121 @@
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from datetime import datetime
+from time import monotonic, perf_counter
+from typing import Optional
+import threading
+import os
+import logging
+from utils.database import engine
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+# A check older than this no longer counts, e.g. when the checker thread hangs
+HEALTH_CHECK_TTL = float(os.getenv("HEALTH_CHECK_TTL", "15"))
+
+class HealthMonitor:
+    """Background database check so health probes only read cached state.
+
+    A daemon thread runs ``SELECT 1`` every HEALTH_CHECK_INTERVAL seconds;
+    liveness and readiness endpoints answer from the last result, so any
+    number of load balancers can poll them without touching the database.
+    """
+
+    def __init__(self, engine, interval: float = HEALTH_CHECK_INTERVAL, ttl: float = HEALTH_CHECK_TTL):
+        self.engine = engine
+        self.interval = interval
+        self.ttl = ttl
+        self.scheduler = None
+        self._database_ok = False
+        self._latency_ms = None
+        self._error = None
+        self._checked_at = None
+        self._checked_monotonic = None
+        self._warm = False
+        self._startup = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check_database(self) -> bool:
+        """Run one database check and cache the result"""
+        start = perf_counter()
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+            logger.warning(f"Database health check failed: {error}")
+
+        self._database_ok = ok
+        self._error = error
+        self._latency_ms = round((perf_counter() - start) * 1000, 2)
+        self._checked_at = datetime.utcnow()
+        self._checked_monotonic = monotonic()
+        return ok
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check_database()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def set_scheduler(self, scheduler):
+        self.scheduler = scheduler
+
+    def mark_warm(self, **timings):
+        """Open the readiness gate once start-up warm-up has finished"""
+        self._startup = timings
+        self._warm = True
+
+    @property
+    def database_ok(self) -> bool:
+        if self._checked_monotonic is None:
+            return False
+        return self._database_ok and monotonic() - self._checked_monotonic <= self.ttl
+
+    def is_ready(self) -> bool:
+        return self._warm and self.database_ok
+
+    def pool_stats(self) -> Optional[dict]:
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return None
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+        }
+
+    def scheduler_state(self) -> dict:
+        if self.scheduler is None:
+            return {"running": False, "jobs": 0}
+        return {"running": bool(self.scheduler.running), "jobs": len(self.scheduler.get_jobs())}
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "warm": self._warm,
+            "startup": self._startup,
+            "database": {
+                "status": "healthy" if self.database_ok else "unhealthy",
+                "latency_ms": self._latency_ms,
+                "checked_at": self._checked_at.isoformat() + "Z" if self._checked_at else None,
+                "error": self._error,
+            },
+            "pool": self.pool_stats(),
+            "scheduler": self.scheduler_state(),
+        }
+
+health_monitor = HealthMonitor(engine)
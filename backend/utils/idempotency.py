@@ -0,0 +1,100 @@
+from fastapi import HTTPException
+from fastapi.responses import Response
+from typing import Optional
+import hashlib
+import os
+
+import orjson
+
+from utils.cache import TTLCache
+from utils.metrics import IDEMPOTENCY_REQUESTS
+
+# Idempotency-Key support for POST endpoints.
+#
+# The first response for (user, key) is kept for IDEMPOTENCY_TTL_SECONDS and
+# retries with the same key and body get it back without running the
+# endpoint again. A retry that arrives while the first request is still
+# running gets 409, a key reused with a different body 422. 5xx responses
+# are not stored, so those can be retried for real.
+#
+# The store is per process; the database constraint on active bookings
+# (see models/appointment.py) is what prevents double booking across workers.
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# A claim older than this is treated as abandoned (worker killed mid-request)
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status_code", "body", "media_type")
+
+    def __init__(self, fingerprint: str, status_code: int, body: bytes, media_type: Optional[str]):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.body = body
+        self.media_type = media_type
+
+    def to_response(self) -> Response:
+        return Response(self.body, status_code=self.status_code, media_type=self.media_type,
+                        headers={REPLAY_HEADER: "true"})
+
+class _InProgress:
+    __slots__ = ("fingerprint",)
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+
+def fingerprint(payload) -> str:
+    """Stable hash of a request body (dict or pydantic model)"""
+    if hasattr(payload, "model_dump"):
+        payload = payload.model_dump(mode="json")
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+class IdempotencyStore:
+    def __init__(self, maxsize: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self._entries = TTLCache(maxsize, ttl)
+
+    def begin(self, scope: str, key: str, request_fingerprint: str) -> Optional[Response]:
+        """Claim ``key`` for this request, or return the stored response to replay.
+
+        Raises 409 while another request holds the key and 422 when the key
+        was used with a different body.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+        entry_key = (scope, key)
+        if self._entries.add(entry_key, _InProgress(request_fingerprint), IDEMPOTENCY_LOCK_SECONDS):
+            IDEMPOTENCY_REQUESTS.inc(labels=("new",))
+            return None
+
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            # Expired between the two calls
+            return self.begin(scope, key, request_fingerprint)
+        if entry.fingerprint != request_fingerprint:
+            IDEMPOTENCY_REQUESTS.inc(labels=("mismatch",))
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if isinstance(entry, _InProgress):
+            IDEMPOTENCY_REQUESTS.inc(labels=("in_progress",))
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed",
+                                headers={"Retry-After": "1"})
+        IDEMPOTENCY_REQUESTS.inc(labels=("replayed",))
+        return entry.to_response()
+
+    def finish(self, scope: str, key: str, request_fingerprint: str, response: Response):
+        """Store the final response for ``key`` (server errors release it instead)"""
+        if response.status_code >= 500:
+            self.release(scope, key)
+            return
+        self._entries.set((scope, key), StoredResponse(
+            request_fingerprint, response.status_code, bytes(response.body), response.media_type
+        ))
+
+    def release(self, scope: str, key: str):
+        self._entries.pop((scope, key))
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List
+import threading
+import os
+import logging
+
+from models.report_job import ReportJob, JobStatus
+from utils.database import SessionLocal
+from utils.metrics import REPORT_JOB_MONTHS
+
+logger = logging.getLogger(__name__)
+
+# Background report generation. A job's months are submitted to a shared
+# thread pool as separate tasks, each with its own session, so a year of
+# reports is computed REPORT_JOB_WORKERS months at a time. Progress and
+# cancellation go through the report_jobs row: tasks bump completed_months
+# with an UPDATE and check cancel_requested before they start, which lets
+# any worker process answer polls and accept cancellations.
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "4"))
+
+class ReportJobRunner:
+    def __init__(self, workers: int = REPORT_JOB_WORKERS):
+        self._workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Created on first use so a preforked master never owns the threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="report-job")
+            return self._executor
+
+    def submit(self, job_id: str, months: List[str], write_month: Callable):
+        pool = self._pool()
+        remaining = {"count": len(months)}
+        for label in months:
+            pool.submit(self._run_month, job_id, label, write_month, remaining)
+
+    def _run_month(self, job_id: str, label: str, write_month: Callable, remaining: dict):
+        db = SessionLocal()
+        try:
+            job = db.query(ReportJob.status, ReportJob.cancel_requested).filter(ReportJob.id == job_id).first()
+            if job is None or job.cancel_requested:
+                REPORT_JOB_MONTHS.inc(labels=("skipped",))
+                return
+            db.query(ReportJob).filter(
+                ReportJob.id == job_id, ReportJob.status == JobStatus.queued.value
+            ).update({"status": JobStatus.running.value, "started_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+
+            try:
+                write_month(db, int(label[:4]), int(label[5:]), job_id=job_id)
+            except Exception as e:
+                db.rollback()
+                logger.error("Report job %s failed for %s: %s", job_id, label, e)
+                db.query(ReportJob).filter(ReportJob.id == job_id).update({
+                    "failed_months": ReportJob.failed_months + 1,
+                    "error": f"{label}: {e}",
+                }, synchronize_session=False)
+                db.commit()
+                REPORT_JOB_MONTHS.inc(labels=("failed",))
+                return
+
+            db.query(ReportJob).filter(ReportJob.id == job_id).update(
+                {"completed_months": ReportJob.completed_months + 1}, synchronize_session=False
+            )
+            db.commit()
+            REPORT_JOB_MONTHS.inc(labels=("completed",))
+        except Exception as e:
+            db.rollback()
+            logger.error("Report job %s: %s", job_id, e)
+        finally:
+            with self._lock:
+                remaining["count"] -= 1
+                last = remaining["count"] == 0
+            if last:
+                self._finish(db, job_id)
+            db.close()
+
+    def _finish(self, db, job_id: str):
+        try:
+            job = db.query(ReportJob).filter(ReportJob.id == job_id).first()
+            if job is None:
+                return
+            if job.failed_months:
+                job.status = JobStatus.failed.value
+            elif job.completed_months < job.total_months:
+                job.status = JobStatus.cancelled.value
+            else:
+                job.status = JobStatus.succeeded.value
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            logger.info("Report job %s %s: %d/%d months", job_id, job.status, job.completed_months, job.total_months)
+        except Exception as e:
+            db.rollback()
+            logger.error("Could not finalize report job %s: %s", job_id, e)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+report_job_runner = ReportJobRunner()
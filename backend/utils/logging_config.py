@@ -0,0 +1,136 @@
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+from queue import SimpleQueue
+from typing import Optional
+import logging
+import random
+import copy
+import sys
+import os
+
+import orjson
+
+# Logging setup for the application.
+#
+# Request threads only put records on an in-memory queue; a listener thread
+# formats and writes them. DEBUG/INFO records can be sampled before they are
+# queued (LOG_SAMPLE_DEBUG / LOG_SAMPLE_INFO between 0 and 1), warnings and
+# errors are always kept. Levels are set globally with LOG_LEVEL and per
+# logger with LOG_LEVELS="controllers=DEBUG,sqlalchemy.engine=WARNING".
+# LOG_FORMAT=text switches from JSON lines to the classic text format.
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including ``extra=`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Rendered before the record was queued
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of low-severity records"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        return rate is None or rate >= 1 or random.random() < rate
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves only the output formatting to the listener thread.
+
+    The message and traceback are rendered on the calling thread, as the
+    default prepare() does: arguments may be ORM instances or mutable objects
+    that must not be touched after their session closed or they changed. The
+    JSON or text line itself is built by the listener.
+    """
+
+    _formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _parse_levels(value: str) -> dict:
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging() -> QueueListener:
+    """Route all logging through a queue to a background writer (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(sys.stderr)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    queue = SimpleQueue()
+    handler = _DeferredQueueHandler(queue)
+    handler.addFilter(SamplingFilter({
+        logging.DEBUG: float(os.getenv("LOG_SAMPLE_DEBUG", "1")),
+        logging.INFO: float(os.getenv("LOG_SAMPLE_INFO", "1")),
+    }))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def _restart_after_fork():
+    """Forked workers (gunicorn --preload) inherit the queue but not the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
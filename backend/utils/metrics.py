@@ -0,0 +1,281 @@
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from contextvars import ContextVar
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Optional, Sequence
+import threading
+
+# Lightweight in-process metrics exposed in Prometheus text format on /metrics.
+# Updates are a dict lookup plus a few additions under a lock, so they are
+# cheap enough to run on every request and every SQL statement.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, labels: tuple = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in items]
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the (unlabelled) value lazily when /metrics is scraped"""
+        self._function = function
+
+    def set(self, value: float, labels: tuple = ()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1, labels: tuple = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, labels: tuple = ()):
+        self.inc(-amount, labels)
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(self._function())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [bucket counts..., +Inf count], sum
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = [(labels, (list(state[0]), state[1])) for labels, state in self._values.items()]
+
+        lines = []
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+# HTTP metrics
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served")
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size by route", ("method", "route"), SIZE_BUCKETS
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request", ("method", "route"), COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request", ("method", "route")
+)
+
+# Process start-up, by phase (import, ready)
+APP_STARTUP_SECONDS = Gauge("app_startup_seconds", "Seconds from process start to each start-up phase", ("phase",))
+
+# Live event feed
+LIVE_SUBSCRIBERS = Gauge("live_subscribers", "Connected live event subscribers")
+LIVE_EVENTS = Counter("live_events_published_total", "Live events published", ("event",))
+LIVE_SUBSCRIBERS_DROPPED = Counter(
+    "live_subscribers_dropped_total", "Subscribers disconnected because they fell too far behind"
+)
+
+# Idempotent POSTs by outcome (new, replayed, in_progress, mismatch)
+IDEMPOTENCY_REQUESTS = Counter("idempotency_requests_total", "Requests carrying an Idempotency-Key", ("outcome",))
+
+# Background report job months by outcome (completed, failed, skipped)
+REPORT_JOB_MONTHS = Counter("report_job_months_total", "Months processed by background report jobs", ("outcome",))
+
+# Admission control: requests turned away with 503 by route class and reason
+# (queue_full, timeout, pool_pressure), and requests admitted per class
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests rejected by admission control", ("route_class", "reason")
+)
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Admitted requests being served", ("route_class",))
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for admission", ("route_class",))
+
+# Database metrics
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed")
+DB_STATEMENT_SECONDS = Counter("db_statement_seconds_total", "Time spent executing SQL statements")
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets=WAIT_BUCKETS
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool")
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool size")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections currently open beyond the pool size")
+DB_READ_ROUTING = Counter("db_read_routing_total", "Read sessions by target database", ("target",))
+# Statements stopped by statement_timeout or cancelled for a disconnected client
+DB_STATEMENTS_CANCELLED = Counter(
+    "db_statements_cancelled_total", "Statements stopped before completing", ("reason", "route_class")
+)
+
+class RequestStats:
+    """Per-request SQL accounting, filled in by the engine event listeners"""
+    __slots__ = ("statements", "sql_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+def instrument_engine(engine, track_pool: bool = True):
+    """Count SQL statements and their duration, globally and per request"""
+
+    # The start time lives on the statement's execution context, so a failed
+    # statement (no after_cursor_execute) leaves nothing behind
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_query_start = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - context._metrics_query_start
+        DB_STATEMENTS.inc()
+        DB_STATEMENT_SECONDS.inc(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.sql_seconds += elapsed
+
+    pool = engine.pool
+    if track_pool and isinstance(pool, QueuePool):
+        DB_POOL_SIZE.set_function(pool.size)
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+        DB_POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(perf_counter() - start)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, size and SQL usage per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        response = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+
+            # The router stores the matched route in the scope, so the label is
+            # the path template (/appointments/{appointment_id}), not the raw path
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.observe(perf_counter() - start, (method, path, response["status"]))
+            RESPONSE_SIZE.observe(response["size"], (method, path))
+            REQUEST_DB_STATEMENTS.observe(stats.statements, (method, path))
+            REQUEST_DB_SECONDS.observe(stats.sql_seconds, (method, path))
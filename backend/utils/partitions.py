@@ -0,0 +1,218 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Query
+from datetime import datetime, date, timedelta
+from typing import List
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "appointments"
+
+# Partitions are created ahead of time (startup and the daily scheduler job),
+# never while booking: CREATE TABLE ... PARTITION OF locks the parent table
+# and would hold up every other booking until the transaction commits.
+# Bookings are therefore limited to BOOKING_MONTHS_AHEAD, which stays below
+# PARTITION_MONTHS_AHEAD so a missed maintenance run does not matter.
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "12"))
+BOOKING_MONTHS_AHEAD = int(os.getenv("BOOKING_MONTHS_AHEAD", str(max(PARTITION_MONTHS_AHEAD - 1, 0))))
+
+def _month_start(year: int, month: int) -> date:
+    return date(year, month, 1)
+
+def _next_month(year: int, month: int):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+def _add_months(year: int, month: int, months: int):
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+def partition_name(year: int, month: int) -> str:
+    """Name of the monthly partition, e.g. appointments_y2024m01"""
+    return f"{PARENT_TABLE}_y{year:04d}m{month:02d}"
+
+def is_partitioned(connection: Connection) -> bool:
+    """Check whether the appointments table is range-partitioned"""
+    if connection.dialect.name != "postgresql":
+        return False
+    result = connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table"
+    ), {"table": PARENT_TABLE})
+    return result.first() is not None
+
+def create_month_partition(connection: Connection, year: int, month: int) -> str:
+    """Create the partition holding appointments for the given month"""
+    name = partition_name(year, month)
+    next_year, next_month = _next_month(year, month)
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{_month_start(year, month).isoformat()}') "
+        f"TO ('{_month_start(next_year, next_month).isoformat()}')"
+    ))
+    return name
+
+def ensure_appointment_partitions(engine, months_back: int = 1, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create missing monthly partitions around the current month"""
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            logger.info("Appointments table is not partitioned, skipping partition maintenance")
+            return []
+
+        today = datetime.utcnow()
+        created = []
+        for offset in range(-months_back, months_ahead + 1):
+            year, month = _add_months(today.year, today.month, offset)
+            created.append(create_month_partition(connection, year, month))
+
+    logger.info(f"Ensured {len(created)} appointment partitions")
+    return created
+
+def booking_horizon() -> date:
+    """First day that can no longer be booked (start of the month after BOOKING_MONTHS_AHEAD)"""
+    today = datetime.utcnow()
+    year, month = _add_months(today.year, today.month, BOOKING_MONTHS_AHEAD + 1)
+    return _month_start(year, month)
+
+def list_partitions(connection: Connection) -> List[dict]:
+    """List attached partitions with their bounds, oldest first"""
+    result = connection.execute(text(
+        "SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bounds "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table "
+        "ORDER BY c.relname"
+    ), {"table": PARENT_TABLE})
+    return [{"name": row.name, "bounds": row.bounds} for row in result]
+
+def detach_partition(engine, year: int, month: int, concurrently: bool = False) -> str:
+    """Detach a monthly partition so it can be archived or dropped separately.
+
+    The detached table keeps its name and data. CONCURRENTLY (PostgreSQL 14+)
+    avoids blocking queries on the parent but cannot run inside a transaction.
+    """
+    name = partition_name(year, month)
+    statement = f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"
+    if concurrently:
+        statement += " CONCURRENTLY"
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(statement))
+    else:
+        with engine.begin() as connection:
+            connection.execute(text(statement))
+
+    logger.info(f"Detached partition {name}")
+    return name
+
+def detach_partitions_before(engine, cutoff: date, concurrently: bool = False) -> List[str]:
+    """Detach every monthly partition that ends on or before ``cutoff``"""
+    with engine.connect() as connection:
+        partitions = list_partitions(connection)
+
+    detached = []
+    for partition in partitions:
+        suffix = partition["name"][len(PARENT_TABLE) + 1:]
+        try:
+            year, month = int(suffix[1:5]), int(suffix[6:8])
+        except ValueError:
+            continue
+        next_year, next_month = _next_month(year, month)
+        if _month_start(next_year, next_month) <= cutoff:
+            detached.append(detach_partition(engine, year, month, concurrently))
+    return detached
+
+def scanned_partitions(connection: Connection, query: Query) -> List[str]:
+    """Return the partitions the planner will touch for ``query``.
+
+    Used to verify partition pruning: a date-bounded query should list only
+    the months it covers, not every partition of the table.
+    """
+    statement = query.statement.compile(
+        dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+    )
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+
+    relations = []
+    def walk(node):
+        name = node.get("Relation Name")
+        if name and name.startswith(PARENT_TABLE) and name not in relations:
+            relations.append(name)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return relations
+
+def pruning_report(session) -> dict:
+    """Partitions scanned by the date-bounded controller queries"""
+    from models.appointment import Appointment, AppointmentStatus
+
+    now = datetime.utcnow()
+    start_of_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_tomorrow = start_of_today + timedelta(days=1)
+    start_of_month = start_of_today.replace(day=1)
+    next_year, next_month = _next_month(start_of_month.year, start_of_month.month)
+    active = [AppointmentStatus.pending, AppointmentStatus.confirmed]
+
+    queries = {
+        "todays_appointments": session.query(Appointment).filter(
+            Appointment.appointment_datetime >= start_of_today,
+            Appointment.appointment_datetime < start_of_tomorrow
+        ),
+        "reminder_window": session.query(Appointment).filter(
+            Appointment.appointment_datetime >= start_of_tomorrow,
+            Appointment.appointment_datetime < start_of_tomorrow + timedelta(days=1),
+            Appointment.status.in_(active)
+        ),
+        "monthly_report": session.query(Appointment).filter(
+            Appointment.status == AppointmentStatus.completed,
+            Appointment.appointment_datetime >= start_of_month,
+            Appointment.appointment_datetime < datetime(next_year, next_month, 1)
+        ),
+    }
+
+    connection = session.connection()
+    return {name: scanned_partitions(connection, query) for name, query in queries.items()}
+
+if __name__ == "__main__":
+    import argparse
+    from utils.database import engine
+
+    parser = argparse.ArgumentParser(description="Manage monthly appointment partitions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ensure_parser = subparsers.add_parser("ensure", help="Create missing partitions")
+    ensure_parser.add_argument("--months-back", type=int, default=1)
+    ensure_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+
+    subparsers.add_parser("list", help="List attached partitions")
+    subparsers.add_parser("verify", help="Show partitions scanned by the controller queries")
+
+    detach_parser = subparsers.add_parser("detach", help="Detach partitions before a month (YYYY-MM)")
+    detach_parser.add_argument("before")
+    detach_parser.add_argument("--concurrently", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        for name in ensure_appointment_partitions(engine, args.months_back, args.months_ahead):
+            print(name)
+    elif args.command == "list":
+        with engine.connect() as connection:
+            for partition in list_partitions(connection):
+                print(f"{partition['name']}\t{partition['bounds']}")
+    elif args.command == "verify":
+        from utils.database import SessionLocal
+        session = SessionLocal()
+        try:
+            for name, partitions in pruning_report(session).items():
+                print(f"{name}: {', '.join(partitions) or '-'}")
+        finally:
+            session.close()
+    elif args.command == "detach":
+        cutoff = datetime.strptime(args.before, "%Y-%m").date()
+        for name in detach_partitions_before(engine, cutoff, args.concurrently):
+            print(name)
@@ -0,0 +1,264 @@
+from sqlalchemy import event
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from datetime import datetime
+from typing import Optional
+import threading
+import json
+import os
+import re
+import logging
+
+from utils.metrics import current_request_stats
+
+logger = logging.getLogger(__name__)
+
+# Query profiler for development and tests.
+#
+# Statements are grouped by their normalized shape (literals and bind
+# parameters replaced by "?"), so the per-row lookups of an N+1 pattern show
+# up as one shape executed many times. Usage in a test:
+#
+#     with profile_queries("list appointments", requests_only=True, max_queries=5):
+#         client.get("/api/v1/appointments/", headers=headers)
+#
+# raises QueryProfileError when the block repeats a statement shape, runs a
+# slow statement or goes over its query budget (tests/test_query_budgets.py
+# guards the list and detail endpoints this way). For a running server set
+# QUERY_PROFILER=log|raise|trace to profile every request.
+
+DEFAULT_MAX_QUERIES = int(os.getenv("QUERY_PROFILER_MAX_QUERIES", "20"))
+DEFAULT_SLOW_MS = float(os.getenv("QUERY_PROFILER_SLOW_MS", "100"))
+DEFAULT_REPEAT_THRESHOLD = int(os.getenv("QUERY_PROFILER_REPEAT_THRESHOLD", "3"))
+TRACE_DIR = os.getenv("QUERY_PROFILER_TRACE_DIR", "query_traces")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_WHITESPACE = re.compile(r"\s+")
+
+class QueryProfileError(AssertionError):
+    """Raised when a profiled block breaks its query budget"""
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape: literals and parameters become '?'"""
+    shape = _POSTCOMPILE.sub("(?)", statement)
+    shape = _STRING_LITERAL.sub("?", shape)
+    shape = _PARAMETER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+class QueryProfile:
+    """Statements captured during one request or profiled block"""
+
+    def __init__(self, label: str, max_queries: Optional[int] = DEFAULT_MAX_QUERIES,
+                 slow_ms: Optional[float] = DEFAULT_SLOW_MS,
+                 repeat_threshold: Optional[int] = DEFAULT_REPEAT_THRESHOLD):
+        self.label = label
+        self.max_queries = max_queries
+        self.slow_ms = slow_ms
+        self.repeat_threshold = repeat_threshold
+        self.statements = []
+        self.requests_only = False
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float):
+        with self._lock:
+            self.statements.append((statement, duration))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_time(self) -> float:
+        return sum(duration for _, duration in self.statements)
+
+    def shapes(self) -> dict:
+        """Statement shapes with their execution count and total time"""
+        shapes = {}
+        for statement, duration in self.statements:
+            entry = shapes.setdefault(normalize_sql(statement), {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += duration * 1000
+        return shapes
+
+    def problems(self) -> list:
+        """Human readable list of budget violations"""
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(f"{self.count} queries (budget {self.max_queries})")
+
+        if self.repeat_threshold is not None:
+            for shape, entry in self.shapes().items():
+                if entry["count"] >= self.repeat_threshold:
+                    problems.append(f"possible N+1: {entry['count']}x {shape}")
+
+        if self.slow_ms is not None:
+            for statement, duration in self.statements:
+                if duration * 1000 > self.slow_ms:
+                    problems.append(
+                        f"slow statement ({duration * 1000:.1f} ms > {self.slow_ms:.0f} ms): "
+                        f"{normalize_sql(statement)}"
+                    )
+        return problems
+
+    def report(self) -> str:
+        lines = [f"Query profile for {self.label}: {self.count} queries, {self.total_time * 1000:.1f} ms"]
+        for shape, entry in sorted(self.shapes().items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"  {entry['count']:>4}x {entry['total_ms']:>8.1f} ms  {shape}")
+        for problem in self.problems():
+            lines.append(f"  ! {problem}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "count": self.count,
+            "total_ms": self.total_time * 1000,
+            "statements": [
+                {"sql": statement, "ms": duration * 1000} for statement, duration in self.statements
+            ],
+            "shapes": self.shapes(),
+            "problems": self.problems(),
+        }
+
+    def dump(self, directory: str = TRACE_DIR) -> str:
+        """Write the profile as JSON into ``directory`` and return the file path"""
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.label).strip("_") or "profile"
+        path = os.path.join(directory, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{slug}.json")
+        with open(path, "w") as trace_file:
+            json.dump(self.to_dict(), trace_file, indent=2)
+        return path
+
+    def check(self, mode: str = "raise"):
+        """Act on budget violations: 'raise', 'log' or 'trace'"""
+        problems = self.problems()
+        if mode == "trace":
+            path = self.dump()
+            if problems:
+                logger.warning("%s (trace: %s)", self.report(), path)
+        elif problems and mode == "log":
+            logger.warning("%s", self.report())
+        elif problems and mode == "raise":
+            raise QueryProfileError(self.report())
+
+# Per-request profile (set by the middleware) and explicitly opened profiles,
+# which capture every statement on the engine while active. The latter is what
+# tests need: TestClient runs the app in another thread, outside their context.
+_request_profile: ContextVar[Optional[QueryProfile]] = ContextVar("request_profile", default=None)
+_open_profiles = []
+_open_profiles_lock = threading.Lock()
+
+def install_query_profiler(engine):
+    """Register the engine listeners; they cost one lookup when nothing is profiled"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _open_profiles or _request_profile.get() is not None:
+            # On the execution context, so failed statements leave nothing behind
+            context._profiler_query_start = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_profiler_query_start", None)
+        if start is None:
+            return
+        duration = perf_counter() - start
+        profile = _request_profile.get()
+        if profile is not None:
+            profile.record(statement, duration)
+        in_request = current_request_stats() is not None
+        for open_profile in list(_open_profiles):
+            if open_profile is not profile and (in_request or not open_profile.requests_only):
+                open_profile.record(statement, duration)
+
+@contextmanager
+def profile_queries(label: str = "profiled block", mode: str = "raise", requests_only: bool = False, **budgets):
+    """Profile every statement executed inside the block and check the budgets.
+
+    With ``requests_only`` only statements run while serving an HTTP request
+    count (see MetricsMiddleware), not those of background threads such as
+    the health monitor, warm-up or the scheduler.
+    """
+    profile = QueryProfile(label, **budgets)
+    profile.requests_only = requests_only
+    with _open_profiles_lock:
+        _open_profiles.append(profile)
+    try:
+        yield profile
+    finally:
+        with _open_profiles_lock:
+            _open_profiles.remove(profile)
+    profile.check(mode)
+
+class QueryProfilerMiddleware:
+    """ASGI middleware profiling each request (enable with QUERY_PROFILER=log|raise|trace).
+
+    In raise mode the response is held back until its last body message, so a
+    request over budget is answered with a 500 listing the problems instead.
+    Streaming responses (SSE, exports) are sent as they come and only logged.
+    """
+
+    def __init__(self, app, mode: str = "log"):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(f"{scope['method']} {scope['path']}")
+        token = _request_profile.set(profile)
+        try:
+            if self.mode == "raise":
+                streamed = await self._call_checked(scope, receive, send, profile)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            _request_profile.reset(token)
+        if self.mode != "raise":
+            profile.check(self.mode)
+        elif streamed:
+            profile.check("log")
+
+    async def _call_checked(self, scope, receive, send, profile: QueryProfile) -> bool:
+        """Run the app, replacing a complete response with a 500 when the profile has problems"""
+        held = []
+        streamed = False
+
+        async def send_checked(message):
+            nonlocal streamed
+            if streamed:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                held.append(message)
+                return
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                problems = profile.problems()
+                if problems:
+                    logger.error("%s", profile.report())
+                    body = json.dumps({"detail": "Query budget exceeded", "problems": problems}).encode()
+                    held[:] = [{
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())],
+                    }]
+                    message = {"type": "http.response.body", "body": body}
+            elif message["type"] == "http.response.body":
+                streamed = True
+            for held_message in held:
+                await send(held_message)
+            held.clear()
+            await send(message)
+
+        await self.app(scope, receive, send_checked)
+        return streamed
@@ -0,0 +1,147 @@
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BeforeValidator, ConfigDict, TypeAdapter, create_model
+from typing import Annotated, List, Optional
+from schemas.user_schema import UserResponse
+from schemas.appointment_schema import AppointmentResponse
+import enum
+
+# Bulk serialization for list endpoints. A TypeAdapter validates the whole
+# list (ORM objects or column rows) in one pydantic-core call, and the result
+# is returned as an ORJSONResponse so FastAPI does not validate and encode it
+# a second time through response_model.
+#
+# The row models mirror the response schemas field for field but skip their
+# input validators: rows come from the database and were validated when they
+# were written, and EmailStr checks alone cost more than everything else.
+
+def _enum_value(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+EnumValue = Annotated[str, BeforeValidator(_enum_value)]
+
+def _row_model(schema, name: str, overrides: dict, exclude: set = frozenset()):
+    fields = {}
+    for field_name, field in schema.model_fields.items():
+        if field_name in exclude:
+            continue
+        annotation = overrides.get(field_name, field.annotation)
+        fields[field_name] = (annotation, ... if field.is_required() else field.default)
+    return create_model(name, __config__=ConfigDict(from_attributes=True), **fields)
+
+UserRow = _row_model(UserResponse, "UserRow", {"email": str, "user_type": EnumValue})
+AppointmentRow = _row_model(AppointmentResponse, "AppointmentRow", {
+    "status": EnumValue,
+    "patient": Optional[UserRow],
+    "doctor": Optional[UserRow],
+})
+# Appointment columns only, so patient/doctor are never touched (or lazy-loaded)
+AppointmentSummaryRow = _row_model(
+    AppointmentResponse, "AppointmentSummaryRow", {"status": EnumValue}, exclude={"patient", "doctor"}
+)
+
+user_list_adapter = TypeAdapter(List[UserRow])
+appointment_list_adapter = TypeAdapter(List[AppointmentRow])
+appointment_summary_list_adapter = TypeAdapter(List[AppointmentSummaryRow])
+
+APPOINTMENT_FIELDS = frozenset(AppointmentResponse.model_fields)
+USER_FIELDS = frozenset(UserResponse.model_fields)
+USER_REFERENCES = frozenset({"patient", "doctor"})
+
+def serialize_users(rows) -> list:
+    """Users (ORM objects or rows) as plain dicts"""
+    return user_list_adapter.dump_python(user_list_adapter.validate_python(rows, from_attributes=True))
+
+def serialize_appointments(rows) -> list:
+    """Appointments with their patient and doctor as plain dicts"""
+    return appointment_list_adapter.dump_python(
+        appointment_list_adapter.validate_python(rows, from_attributes=True)
+    )
+
+def serialize_appointment_summary(appointment) -> dict:
+    """One appointment without patient/doctor, as a plain dict"""
+    return appointment_summary_list_adapter.dump_python(
+        appointment_summary_list_adapter.validate_python([appointment], from_attributes=True)
+    )[0]
+
+def parse_fields(value: Optional[str], allowed: frozenset, parameter: str) -> Optional[set]:
+    """Parse a comma separated sparse fieldset, None meaning every field"""
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(",") if field.strip()}
+    unknown = fields - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {parameter}: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return fields
+
+class AppointmentListing:
+    """How an appointment listing should be shaped (from the fields/user_fields/view parameters).
+
+    ``fields`` limits the appointment keys, ``user_fields`` the keys of every
+    embedded or referenced user. The normalized view returns appointments
+    with patient_id/doctor_id only, plus a de-duplicated ``users`` map.
+    """
+
+    def __init__(self, fields: Optional[str] = None, user_fields: Optional[str] = None,
+                 view: str = "embedded"):
+        self.fields = parse_fields(fields, APPOINTMENT_FIELDS, "fields")
+        self.user_fields = parse_fields(user_fields, USER_FIELDS, "user_fields")
+        self.normalized = view == "normalized"
+
+    @property
+    def embeds_users(self) -> bool:
+        """Whether patient/doctor have to be loaded with the appointments"""
+        if self.normalized:
+            return False
+        return self.fields is None or bool(self.fields & USER_REFERENCES)
+
+    @property
+    def references_users(self) -> bool:
+        """Whether the normalized users map is needed"""
+        if not self.normalized:
+            return False
+        return self.fields is None or bool(self.fields & {"patient_id", "doctor_id"})
+
+    def serialize(self, appointments) -> list:
+        if not self.embeds_users:
+            fields = None
+            if self.fields is not None:
+                fields = (self.fields - USER_REFERENCES) or {"id"}
+            rows = appointment_summary_list_adapter.validate_python(appointments, from_attributes=True)
+            return appointment_summary_list_adapter.dump_python(
+                rows, include={"__all__": fields} if fields else None
+            )
+
+        include = None
+        if self.fields is not None or self.user_fields is not None:
+            appointment_include = {field: True for field in (self.fields or APPOINTMENT_FIELDS)}
+            if self.user_fields is not None:
+                for reference in USER_REFERENCES & appointment_include.keys():
+                    appointment_include[reference] = self.user_fields
+            include = {"__all__": appointment_include}
+        rows = appointment_list_adapter.validate_python(appointments, from_attributes=True)
+        return appointment_list_adapter.dump_python(rows, include=include)
+
+    def serialize_users(self, users) -> dict:
+        """Referenced users keyed by id, for the normalized view"""
+        rows = user_list_adapter.validate_python(users, from_attributes=True)
+        include = {"__all__": self.user_fields} if self.user_fields is not None else None
+        return {
+            str(row.id): item
+            for row, item in zip(rows, user_list_adapter.dump_python(rows, include=include))
+        }
+
+    def body(self, appointments, users=None) -> dict:
+        body = {"appointments": self.serialize(appointments)}
+        if self.normalized:
+            body["users"] = self.serialize_users(users or [])
+        return body
+
+def list_response(items: list) -> ORJSONResponse:
+    return ORJSONResponse(items)
+
+def page_response(key: str, items: list, total: int, skip: int, limit: int) -> ORJSONResponse:
+    return ORJSONResponse({key: items, "total": total, "skip": skip, "limit": limit})
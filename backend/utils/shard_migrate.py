@@ -0,0 +1,109 @@
+from sqlalchemy import func, select, delete
+from typing import Dict, List
+import logging
+
+from models.user import User
+from models.appointment import Appointment
+
+logger = logging.getLogger(__name__)
+
+# Moves appointments that were booked on the main database before their
+# division got a shard (SHARD_DATABASE_URLS) onto that shard. Doctor-scoped
+# reads, the booking conflict check and calendars only look at the doctor's
+# shard, so run this before starting the API with the new shard list.
+#
+# Rows keep their ids (links and idempotency replays stay valid) and are
+# copied in batches, each committed on the shard before it is deleted from
+# the main database. A batch found on the shard already (an interrupted run)
+# is only deleted, so the move can be re-run until it reports nothing left.
+
+MOVE_BATCH_SIZE = 1000
+
+def _doctor_ids(connection, divisions: List[str]) -> List[int]:
+    return list(connection.execute(
+        select(User.id).where(func.lower(func.trim(User.address_division)).in_(divisions))
+    ).scalars())
+
+def unmoved_appointments(router=None) -> int:
+    """Appointments on the main database that belong on another shard"""
+    from utils.database import shard_router
+    router = router or shard_router
+    table = Appointment.__table__
+    total = 0
+    with router.engines[0].connect() as connection:
+        for index in router.shards:
+            if index == 0:
+                continue
+            doctor_ids = _doctor_ids(connection, router.divisions_on(index))
+            if doctor_ids:
+                total += connection.execute(
+                    select(func.count()).select_from(table).where(table.c.doctor_id.in_(doctor_ids))
+                ).scalar()
+    return total
+
+def move_appointments(router=None, batch_size: int = MOVE_BATCH_SIZE, dry_run: bool = False) -> Dict[int, int]:
+    """Move main-database appointments of sharded divisions to their shard; count moved per shard"""
+    from utils.database import shard_router, _shard_metadata, set_shard_sequence
+    router = router or shard_router
+    table = Appointment.__table__
+    shard_table = _shard_metadata().tables[table.name]
+    moved = {}
+    for index in router.shards:
+        if index == 0:
+            continue
+        with router.engines[0].connect() as connection:
+            doctor_ids = _doctor_ids(connection, router.divisions_on(index))
+        moved[index] = 0
+        if not doctor_ids:
+            continue
+        last_id = 0
+        while True:
+            with router.engines[0].connect() as connection:
+                rows = [dict(row) for row in connection.execute(
+                    select(table).where(table.c.doctor_id.in_(doctor_ids), table.c.id > last_id)
+                    .order_by(table.c.id).limit(batch_size)
+                ).mappings()]
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            if dry_run:
+                moved[index] += len(rows)
+                continue
+            ids = [row["id"] for row in rows]
+            with router.engines[index].begin() as connection:
+                existing = {
+                    row.id: row for row in connection.execute(
+                        select(shard_table.c.id, shard_table.c.doctor_id).where(shard_table.c.id.in_(ids))
+                    )
+                }
+                clashes = [row["id"] for row in rows
+                           if row["id"] in existing and existing[row["id"]].doctor_id != row["doctor_id"]]
+                if clashes:
+                    # Ids the shard has handed out itself: moving would overwrite bookings
+                    raise RuntimeError(f"Appointment ids already used on shard {index}: {clashes[:10]}")
+                missing = [row for row in rows if row["id"] not in existing]
+                if missing:
+                    connection.execute(shard_table.insert(), missing)
+            with router.engines[0].begin() as connection:
+                connection.execute(delete(table).where(table.c.id.in_(ids)))
+            moved[index] += len(rows)
+            logger.info("Moved %d appointments to shard %d", moved[index], index)
+        if not dry_run:
+            # New ids above the moved ones
+            set_shard_sequence(router.engines[index], index)
+    return moved
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move appointments of sharded divisions off the main database")
+    parser.add_argument("--batch-size", type=int, default=MOVE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the appointments to move")
+    args = parser.parse_args()
+
+    from utils.database import shard_router, create_shard_tables
+    if not shard_router.enabled:
+        parser.error("SHARD_DATABASE_URLS is not set")
+    create_shard_tables()
+    for index, count in move_appointments(batch_size=args.batch_size, dry_run=args.dry_run).items():
+        print(f"shard {index}: {count}")
@@ -0,0 +1,180 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+import os
+
+# Day grids for doctor calendars. A day is split into SLOTS_PER_DAY slots of
+# SLOT_MINUTES within business hours, and a set of slots is an int bitmap
+# (bit i = i-th slot of the day), so a doctor-day is two small ints: the
+# slots that can be booked and the slots that are booked.
+#
+# Bookable slots come from the declared available_timeslots and from the
+# doctor's weekly rules, minus their exceptions (time off). Rules are
+# expanded per requested day only, so publishing availability months ahead
+# costs nothing until those days are looked at.
+
+SLOT_MINUTES = int(os.getenv("CALENDAR_SLOT_MINUTES", "30"))
+# Business hours and days, as enforced by AppointmentCreate
+DAY_START = time(9, 0)
+DAY_END = time(18, 0)
+CLOSED_WEEKDAYS = frozenset({6})
+# Declared available_timeslots, as validated by UserCreate
+TIMESLOT_FORMAT = "%Y-%m-%d %H:%M:%S"
+# A booking is accepted within this many seconds of a declared available slot
+AVAILABILITY_WINDOW_SECONDS = 3600
+
+SLOTS_PER_DAY = (DAY_END.hour * 60 + DAY_END.minute - DAY_START.hour * 60 - DAY_START.minute) // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+def day_range(start: date, end: date) -> Iterator[date]:
+    """Dates from ``start`` to ``end`` inclusive"""
+    for offset in range((end - start).days + 1):
+        yield start + timedelta(days=offset)
+
+def slot_start(day: date, index: int) -> datetime:
+    return datetime.combine(day, DAY_START) + timedelta(minutes=SLOT_MINUTES * index)
+
+def slot_index(moment: datetime) -> Optional[int]:
+    """Index of the slot containing ``moment``, None outside business hours"""
+    minutes = (moment.hour - DAY_START.hour) * 60 + moment.minute - DAY_START.minute
+    if minutes < 0 or moment.weekday() in CLOSED_WEEKDAYS:
+        return None
+    index = minutes // SLOT_MINUTES
+    return index if index < SLOTS_PER_DAY else None
+
+def parse_timeslots(timeslots: Optional[Iterable[str]]) -> List[datetime]:
+    """Declared available slots; malformed entries are skipped like the booking check does"""
+    parsed = []
+    for slot in timeslots or ():
+        if not isinstance(slot, str):
+            continue
+        declared = None
+        # fromisoformat is much faster than strptime; the shape check keeps it
+        # to zero-padded "YYYY-MM-DD HH:MM:SS" without a UTC offset
+        if len(slot) == 19 and slot[10] == " " and slot[16] == ":":
+            try:
+                declared = datetime.fromisoformat(slot)
+            except ValueError:
+                pass
+        if declared is None:
+            # Everything else strptime accepts, e.g. "2026-1-5 9:00:00"
+            try:
+                declared = datetime.strptime(slot, TIMESLOT_FORMAT)
+            except ValueError:
+                continue
+        parsed.append(declared)
+    return parsed
+
+def bookable_masks(timeslots: Iterable[datetime], days: Iterable[date]) -> Dict[date, int]:
+    """Per day, the slots whose start lies within the availability window of a declared slot"""
+    wanted = set(days)
+    window = timedelta(seconds=AVAILABILITY_WINDOW_SECONDS)
+    masks = dict.fromkeys(wanted, 0)
+    for declared in timeslots:
+        for day in {(declared - window).date(), declared.date(), (declared + window).date()} & wanted:
+            if day.weekday() in CLOSED_WEEKDAYS:
+                continue
+            day_start = datetime.combine(day, DAY_START)
+            # Slot starts s with |s - declared| <= window, as a contiguous bit range
+            first = max(0, -(-int((declared - window - day_start).total_seconds()) // (SLOT_MINUTES * 60)))
+            last = min(SLOTS_PER_DAY - 1, int((declared + window - day_start).total_seconds()) // (SLOT_MINUTES * 60))
+            if first <= last:
+                masks[day] |= ((1 << (last - first + 1)) - 1) << first
+    return masks
+
+def busy_masks(booked: Iterable[datetime], days: Iterable[date]) -> Dict[date, int]:
+    """Per day, the slots containing an active booking"""
+    masks = dict.fromkeys(days, 0)
+    for moment in booked:
+        index = slot_index(moment)
+        if index is not None and moment.date() in masks:
+            masks[moment.date()] |= 1 << index
+    return masks
+
+def range_mask(start: time, end: time) -> int:
+    """Slots lying entirely within [start, end)"""
+    day_start = DAY_START.hour * 60 + DAY_START.minute
+    first = max(0, -(-(start.hour * 60 + start.minute - day_start) // SLOT_MINUTES))
+    last = min(SLOTS_PER_DAY, (end.hour * 60 + end.minute - day_start) // SLOT_MINUTES)
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+def weekly_masks(rules: Iterable, days: Iterable[date]) -> Dict[date, int]:
+    """Per day, the slots covered by the weekly rules (weekday, start_time, end_time, valid_from, valid_until)"""
+    by_weekday = {}
+    for rule in rules:
+        by_weekday.setdefault(rule.weekday, []).append(
+            (range_mask(rule.start_time, rule.end_time), rule.valid_from, rule.valid_until)
+        )
+    masks = {}
+    for day in days:
+        mask = 0
+        if day.weekday() not in CLOSED_WEEKDAYS:
+            for rule_mask, valid_from, valid_until in by_weekday.get(day.weekday(), ()):
+                if (valid_from is None or valid_from <= day) and (valid_until is None or day <= valid_until):
+                    mask |= rule_mask
+        masks[day] = mask
+    return masks
+
+def blocked_masks(exceptions: Iterable, days: Iterable[date]) -> Dict[date, int]:
+    """Per day, the slots overlapping an exception (date, start_time, end_time; no times = all day)"""
+    masks = dict.fromkeys(days, 0)
+    day_start = DAY_START.hour * 60 + DAY_START.minute
+    for exception in exceptions:
+        if exception.date not in masks:
+            continue
+        if exception.start_time is None or exception.end_time is None:
+            masks[exception.date] = FULL_DAY
+            continue
+        first = max(0, (exception.start_time.hour * 60 + exception.start_time.minute - day_start) // SLOT_MINUTES)
+        last = min(SLOTS_PER_DAY, -(-(exception.end_time.hour * 60 + exception.end_time.minute - day_start)
+                                    // SLOT_MINUTES))
+        if last > first:
+            masks[exception.date] |= ((1 << (last - first)) - 1) << first
+    return masks
+
+def available_masks(timeslots: Iterable[datetime], rules: Iterable, exceptions: Iterable,
+                    days: Iterable[date]) -> Dict[date, int]:
+    """Per day, declared slots and weekly rules combined, without the exceptions"""
+    days = list(days)
+    declared = bookable_masks(timeslots, days)
+    weekly = weekly_masks(rules, days)
+    blocked = blocked_masks(exceptions, days)
+    return {day: (declared[day] | weekly[day]) & ~blocked[day] for day in days}
+
+def is_available(moment: datetime, timeslots: Iterable[datetime], rules: Iterable, exceptions: Iterable) -> bool:
+    """Whether a booking at ``moment`` is accepted.
+
+    The exact rule behind the bitmaps: within AVAILABILITY_WINDOW_SECONDS of a
+    declared slot (at any minute, not just on the slot grid) or inside a
+    weekly rule, and not during one of the doctor's exceptions.
+    """
+    day, moment_time = moment.date(), moment.time()
+    for exception in exceptions:
+        if exception.date == day and (exception.start_time is None or exception.end_time is None
+                                      or exception.start_time <= moment_time < exception.end_time):
+            return False
+    if any(abs((moment - declared).total_seconds()) <= AVAILABILITY_WINDOW_SECONDS for declared in timeslots):
+        return True
+    return any(
+        rule.weekday == day.weekday() and rule.start_time <= moment_time < rule.end_time
+        and (rule.valid_from is None or rule.valid_from <= day)
+        and (rule.valid_until is None or day <= rule.valid_until)
+        for rule in rules
+    )
+
+def elapsed_mask(day: date, now: datetime) -> int:
+    """Slots of ``day`` that have already started"""
+    if day < now.date():
+        return FULL_DAY
+    if day > now.date():
+        return 0
+    started = 0
+    while started < SLOTS_PER_DAY and slot_start(day, started) <= now:
+        started += 1
+    return (1 << started) - 1
+
+def render_day(bookable: int, busy: int) -> str:
+    """One character per slot: 'f' free, 'b' booked, '.' not available"""
+    return "".join(
+        "b" if busy >> index & 1 else "f" if bookable >> index & 1 else "."
+        for index in range(SLOTS_PER_DAY)
+    )
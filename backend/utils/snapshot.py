@@ -0,0 +1,223 @@
+from sqlalchemy import select, type_coerce, String, Integer, Float, DateTime, Boolean, Text, Enum, ARRAY
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from utils.database import shard_router
+import json
+import os
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columnar snapshots of users, appointments and reports for offline analysis.
+#
+#   <output>/<table>/month=YYYY-MM/part-<snapshot id>.parquet   (or .arrow)
+#   <output>/_snapshots.json                                     (manifest)
+#
+# Rows are read through a server-side cursor SNAPSHOT_BATCH_SIZE at a time
+# and written as typed Arrow record batches, so memory use does not depend
+# on table size. Arrow IPC files can be memory-mapped as they are; Parquet
+# files are smaller (zstd). An incremental snapshot only exports rows whose
+# updated_at is at or after the start of the previous snapshot; a row can
+# appear in several parts, the one with the latest updated_at wins. Deleted
+# rows are not tracked.
+#
+# Needs pyarrow, which the API itself does not import.
+
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "50000"))
+MANIFEST = "_snapshots.json"
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+
+# Never leaves the database
+EXCLUDED_COLUMNS = {"users": {"password"}}
+SHARDED_TABLES = {"appointments"}
+
+def _tables():
+    from models.user import User
+    from models.appointment import Appointment
+    from models.report import Report
+
+    # table -> (model, column the month partition is taken from)
+    return {
+        "users": (User, "created_at"),
+        "appointments": (Appointment, "appointment_datetime"),
+        "reports": (Report, "month"),
+    }
+
+def _arrow_type(column):
+    import pyarrow as pa
+
+    column_type = column.type
+    if isinstance(column_type, Enum):
+        # Plain strings: IPC files cannot change a dictionary between batches
+        # and Parquet dictionary-encodes them anyway
+        return pa.string()
+    if isinstance(column_type, ARRAY):
+        return pa.list_(pa.string())
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, (String, Text)):
+        return pa.string()
+    raise TypeError(f"No Arrow type for {column.table.name}.{column.name} ({column_type})")
+
+def _month(value) -> str:
+    if value is None:
+        return "unknown"
+    if isinstance(value, str):
+        return value[:7]
+    return value.strftime("%Y-%m")
+
+def read_manifest(output_dir: str) -> list:
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as manifest:
+        return json.load(manifest)
+
+def _write_manifest(output_dir: str, snapshots: list):
+    path = os.path.join(output_dir, MANIFEST)
+    with open(path + ".tmp", "w") as manifest:
+        json.dump(snapshots, manifest, indent=2)
+    os.replace(path + ".tmp", path)
+
+class _PartitionWriters:
+    """One open file per month partition of a table"""
+
+    def __init__(self, directory: str, snapshot_id: str, schema, fmt: str):
+        self.directory = directory
+        self.snapshot_id = snapshot_id
+        self.schema = schema
+        self.fmt = fmt
+        self.writers = {}
+        self.rows = {}
+
+    def _open(self, month: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        directory = os.path.join(self.directory, f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{self.snapshot_id}.{FORMATS[self.fmt]}")
+        if self.fmt == "parquet":
+            return pq.ParquetWriter(path, self.schema, compression="zstd")
+        return pa.ipc.new_file(path, self.schema, options=pa.ipc.IpcWriteOptions(compression="lz4"))
+
+    def write(self, month: str, batch):
+        writer = self.writers.get(month)
+        if writer is None:
+            writer = self.writers[month] = self._open(month)
+        if self.fmt == "parquet":
+            writer.write_batch(batch)
+        else:
+            writer.write(batch)
+        self.rows[month] = self.rows.get(month, 0) + batch.num_rows
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+def export_table(db: Session, table: str, output_dir: str, snapshot_id: str, fmt: str = "parquet",
+                 since: Optional[datetime] = None, batch_size: int = SNAPSHOT_BATCH_SIZE) -> Dict[str, int]:
+    """Write one table's snapshot; returns rows written per month partition"""
+    import pyarrow as pa
+
+    model, partition_column = _tables()[table]
+    columns = [
+        column for column in model.__table__.columns if column.name not in EXCLUDED_COLUMNS.get(table, ())
+    ]
+    schema = pa.schema([pa.field(column.name, _arrow_type(column)) for column in columns])
+    # Enums as their database text, skipping the conversion to Python enums
+    selected = [
+        type_coerce(column, String).label(column.name) if isinstance(column.type, Enum) else column
+        for column in columns
+    ]
+    statement = select(*selected).order_by(model.__table__.c[partition_column])
+    if since is not None:
+        statement = statement.where(model.__table__.c.updated_at >= since)
+
+    partition_index = [column.name for column in columns].index(partition_column)
+    # Appointments are read from every shard in turn, into the same files
+    shards = shard_router.shards if table in SHARDED_TABLES else [0]
+    writers = _PartitionWriters(os.path.join(output_dir, table), snapshot_id, schema, fmt)
+    try:
+        for shard in shards:
+            with shard_router.session(db, shard) as session:
+                result = session.execute(statement.execution_options(yield_per=batch_size))
+                for rows in result.partitions():
+                    # Rows arrive in partition order, so a batch usually spans one or two months
+                    by_month = {}
+                    for row in rows:
+                        by_month.setdefault(_month(row[partition_index]), []).append(row)
+                    for month, month_rows in by_month.items():
+                        values = list(zip(*month_rows))
+                        writers.write(month, pa.record_batch(
+                            [pa.array(values[index], type=field.type) for index, field in enumerate(schema)],
+                            schema=schema
+                        ))
+    finally:
+        writers.close()
+    return writers.rows
+
+def create_snapshot(session_factory: Callable, output_dir: str, fmt: str = "parquet", incremental: bool = False,
+                    tables=None, batch_size: int = SNAPSHOT_BATCH_SIZE) -> dict:
+    """Export ``tables`` (default all) and record the snapshot in the manifest"""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    os.makedirs(output_dir, exist_ok=True)
+    snapshots = read_manifest(output_dir)
+    since = None
+    if incremental and snapshots:
+        since = datetime.fromisoformat(snapshots[-1]["started_at"])
+
+    # Taken before reading, so rows changed during the export are picked up
+    # again by the next incremental snapshot
+    started_at = datetime.utcnow()
+    snapshot = {
+        "id": started_at.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6],
+        "started_at": started_at.isoformat(),
+        "since": since.isoformat() if since else None,
+        "format": fmt,
+        "tables": {},
+    }
+    session = session_factory()
+    try:
+        for table in tables or _tables():
+            rows = export_table(session, table, output_dir, snapshot["id"], fmt, since, batch_size)
+            snapshot["tables"][table] = {"rows": sum(rows.values()), "partitions": sorted(rows)}
+            logger.info("Snapshot %s: %s %d rows in %d partitions",
+                        snapshot["id"], table, sum(rows.values()), len(rows))
+    finally:
+        session.close()
+
+    snapshot["finished_at"] = datetime.utcnow().isoformat()
+    snapshots.append(snapshot)
+    _write_manifest(output_dir, snapshots)
+    return snapshot
+
+if __name__ == "__main__":
+    import argparse
+    from utils.database import SessionLocal, replica_router
+
+    parser = argparse.ArgumentParser(description="Write a columnar snapshot of users, appointments and reports")
+    parser.add_argument("output_dir")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rows changed since the previous snapshot in output_dir")
+    parser.add_argument("--table", action="append", choices=sorted(_tables()), dest="tables")
+    parser.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH_SIZE)
+    parser.add_argument("--primary", action="store_true", help="Read from the primary even when replicas exist")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session_factory = SessionLocal if args.primary else replica_router.read_session
+    result = create_snapshot(session_factory, args.output_dir, args.format, args.incremental, args.tables,
+                             args.batch_size)
+    print(json.dumps(result, indent=2))
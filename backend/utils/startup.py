@@ -0,0 +1,104 @@
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from time import perf_counter
+import threading
+import os
+import logging
+from utils.database import engine, create_tables, SessionLocal
+from utils.availability import availability_index
+from utils.health import health_monitor
+from utils.metrics import APP_STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Start-up sequence for a worker. The lifespan hook only starts this in a
+# thread, so the server accepts connections (and answers /health/live) right
+# away while /health/ready stays 503 until the warm-up below has finished.
+
+# create_all() inspects every table on each start; production runs migrations
+# instead and sets AUTO_CREATE_TABLES=false
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "true").lower() in ("1", "true", "yes")
+RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "true").lower() in ("1", "true", "yes")
+# Pool connections to open before reporting ready
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+
+def _process_started() -> float:
+    """perf_counter() value at process start (Linux), else at first import of this module"""
+    now = perf_counter()
+    try:
+        with open("/proc/self/stat") as stat, open("/proc/uptime") as uptime:
+            # Field 22 is the start time in clock ticks after boot; the command
+            # name (field 2) may contain spaces, so split after its parenthesis
+            started_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+            age = float(uptime.read().split()[0]) - started_ticks / os.sysconf("SC_CLK_TCK")
+        return now - max(age, 0.0)
+    except (OSError, ValueError, IndexError):
+        return now
+
+PROCESS_STARTED = _process_started()
+
+def seconds_since_start() -> float:
+    return perf_counter() - PROCESS_STARTED
+
+def _open_connections(count: int):
+    """Fill the pool so the first requests do not pay for connection setup"""
+    connections = []
+    try:
+        for _ in range(count):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+def warm_up():
+    """Run the start-up work, then open the readiness gate"""
+    started = perf_counter()
+    if AUTO_CREATE_TABLES:
+        try:
+            create_tables()
+        except Exception:
+            # create_tables() already logged the error
+            logger.warning("Continuing start-up without creating tables")
+
+    # Partitions for the booking horizon must exist before the first booking,
+    # whether or not tables are created here (migrations don't make future
+    # months, and the maintenance job first runs at 1 AM). Idempotent, and
+    # logs its own errors
+    from utils.tasks import maintain_appointment_partitions
+    maintain_appointment_partitions()
+
+    # Build mapper relationships now instead of on the first query
+    configure_mappers()
+
+    try:
+        _open_connections(WARMUP_CONNECTIONS)
+    except Exception as e:
+        logger.warning("Could not pre-open database connections: %s", e)
+    health_monitor.check_database()
+
+    # In-memory availability index for the earliest-slot search
+    try:
+        with SessionLocal() as db:
+            availability_index.build(db)
+    except Exception as e:
+        logger.warning("Could not build the availability index: %s", e)
+
+    ready = seconds_since_start()
+    health_monitor.mark_warm(warm_up_seconds=round(perf_counter() - started, 3), ready_seconds=round(ready, 3))
+    APP_STARTUP_SECONDS.set(ready, ("ready",))
+    logger.info("Ready %.2fs after process start (warm-up %.2fs)", ready, perf_counter() - started)
+
+    # Not needed to serve requests, so it starts after the gate is open
+    if RUN_SCHEDULER:
+        try:
+            from utils.tasks import setup_scheduler
+            health_monitor.set_scheduler(setup_scheduler())
+        except Exception as e:
+            logger.error("Failed to start scheduler: %s", e)
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
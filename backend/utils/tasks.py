@@ -1,13 +1,9 @@
-from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 from models.appointment import Appointment, AppointmentStatus
 from models.user import User
 from datetime import datetime, timedelta
-from utils.database import SessionLocal
+from utils.database import SessionLocal, shard_router
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
 
 logger = logging.getLogger(__name__)
@@ -16,6 +12,10 @@ class NotificationService:
     @staticmethod
     def send_email_reminder(to_email: str, patient_name: str, doctor_name: str, appointment_time: datetime):
         """Send email reminder for appointment"""
+        # Imported here: only the reminder job needs them, not app startup
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
         try:
             # Email configuration (you should use environment variables)
             smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
@@ -80,11 +80,14 @@ def send_appointment_reminders():
         start_of_tomorrow = tomorrow.replace(hour=0, minute=0, second=0, microsecond=0)
         end_of_tomorrow = start_of_tomorrow + timedelta(days=1)
         
-        appointments = db.query(Appointment).filter(
-            Appointment.available_timeslots >= start_of_tomorrow,
-            Appointment.available_timeslots < end_of_tomorrow,
-            Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
-        ).all()
+        appointments = [
+            appointment for rows in shard_router.scatter(db, lambda session: session.query(Appointment).filter(
+                Appointment.appointment_datetime >= start_of_tomorrow,
+                Appointment.appointment_datetime < end_of_tomorrow,
+                Appointment.status.in_([AppointmentStatus.pending, AppointmentStatus.confirmed])
+            ).all())
+            for appointment in rows
+        ]
         
         notification_service = NotificationService()
         
@@ -99,7 +102,7 @@ def send_appointment_reminders():
                     patient.email,
                     patient.full_name,
                     doctor.full_name,
-                    appointment.available_timeslots
+                    appointment.appointment_datetime
                 )
                 
                 # Send SMS reminder
@@ -107,7 +110,7 @@ def send_appointment_reminders():
                     patient.mobile_number,
                     patient.full_name,
                     doctor.full_name,
-                    appointment.available_timeslots
+                    appointment.appointment_datetime
                 )
         
         logger.info(f"Processed {len(appointments)} appointment reminders")
@@ -124,12 +127,15 @@ def cleanup_old_appointments():
         # Delete cancelled appointments older than 30 days
         cutoff_date = datetime.utcnow() - timedelta(days=30)
         
-        deleted_count = db.query(Appointment).filter(
-            Appointment.status == AppointmentStatus.cancelled,
-            Appointment.created_at < cutoff_date
-        ).delete()
+        def cleanup(session):
+            deleted = session.query(Appointment).filter(
+                Appointment.status == AppointmentStatus.cancelled,
+                Appointment.created_at < cutoff_date
+            ).delete()
+            session.commit()
+            return deleted
         
-        db.commit()
+        deleted_count = sum(shard_router.scatter(db, cleanup))
         logger.info(f"Cleaned up {deleted_count} old cancelled appointments")
         
     except Exception as e:
@@ -137,8 +143,18 @@ def cleanup_old_appointments():
     finally:
         db.close()
 
+def maintain_appointment_partitions():
+    """Create upcoming monthly appointment partitions ahead of time"""
+    try:
+        from utils.partitions import ensure_appointment_partitions
+        for shard_engine in shard_router.engines.values():
+            ensure_appointment_partitions(shard_engine)
+    except Exception as e:
+        logger.error(f"Error in maintain_appointment_partitions: {str(e)}")
+
 def setup_scheduler():
     """Setup background scheduler for tasks"""
+    from apscheduler.schedulers.background import BackgroundScheduler
     scheduler = BackgroundScheduler()
     
     try:
@@ -161,6 +177,15 @@ def setup_scheduler():
             id='weekly_cleanup'
         )
         
+        # Make sure next months' appointment partitions exist, daily at 1 AM
+        scheduler.add_job(
+            maintain_appointment_partitions,
+            'cron',
+            hour=1,
+            minute=0,
+            id='partition_maintenance'
+        )
+        
         scheduler.start()
         logger.info("Background scheduler started successfully")
         
@@ -0,0 +1,192 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from contextvars import ContextVar
+from typing import Dict, Optional
+import asyncio
+import logging
+import os
+import threading
+
+from utils.admission import route_class
+from utils.metrics import DB_STATEMENTS_CANCELLED
+
+logger = logging.getLogger(__name__)
+
+# Statement timeouts and cancellation per request.
+#
+# StatementTimeoutMiddleware picks the request's timeout from its route class
+# (see utils/admission.py) or a path prefix, and every transaction a session
+# begins while serving it starts with SET LOCAL statement_timeout, so a
+# runaway search gives its pooled connection back after that long. When the
+# client disconnects, statements still running for the request are cancelled
+# and further ones are refused.
+#
+#   STATEMENT_TIMEOUTS="reads=5,reports=120,/api/v1/users/=3"   (seconds, 0 = none)
+#
+# PostgreSQL only; background jobs and health checks run without a timeout.
+
+DEFAULT_STATEMENT_TIMEOUTS = {"reads": 5.0, "booking": 5.0, "login": 5.0, "reports": 120.0}
+# PostgreSQL's SQLSTATE for both statement timeouts and cancel requests
+QUERY_CANCELED = "57014"
+
+class ClientDisconnected(Exception):
+    """Raised instead of running a statement for a client that has gone away"""
+
+def _parse_timeouts(value: str) -> Dict[str, float]:
+    """Route class and path prefix timeouts, on top of the defaults"""
+    timeouts = dict(DEFAULT_STATEMENT_TIMEOUTS)
+    for item in value.split(","):
+        key, _, seconds = item.partition("=")
+        if key.strip() and seconds.strip():
+            timeouts[key.strip()] = float(seconds)
+    return timeouts
+
+STATEMENT_TIMEOUTS = _parse_timeouts(os.getenv("STATEMENT_TIMEOUTS", ""))
+
+def statement_timeout_for(method: str, path: str) -> Optional[float]:
+    """Seconds allowed per statement: the longest matching prefix, else the route class"""
+    prefixes = [key for key in STATEMENT_TIMEOUTS if key.startswith("/") and path.startswith(key)]
+    if prefixes:
+        seconds = STATEMENT_TIMEOUTS[max(prefixes, key=len)]
+    else:
+        seconds = STATEMENT_TIMEOUTS.get(route_class(method, path))
+    return seconds or None
+
+class RequestStatements:
+    """Timeout of a request and the database connections currently executing for it"""
+
+    def __init__(self, timeout: Optional[float], label: str):
+        self.timeout_ms = int(timeout * 1000) if timeout else None
+        self.label = label
+        self.disconnected = False
+        self._executing = set()
+        self._lock = threading.Lock()
+
+    def started(self, dbapi_connection):
+        with self._lock:
+            if self.disconnected:
+                raise ClientDisconnected("Client disconnected")
+            self._executing.add(dbapi_connection)
+
+    def finished(self, dbapi_connection):
+        with self._lock:
+            self._executing.discard(dbapi_connection)
+
+    def cancel(self) -> int:
+        """Mark the client gone and cancel what is running (psycopg2 cancel, sqlite3 interrupt)"""
+        # The lock is held while cancelling, so finished() waits: a connection
+        # that finished meanwhile could already be running another request's
+        # statement, and must not be cancelled
+        with self._lock:
+            self.disconnected = True
+            for dbapi_connection in self._executing:
+                cancel = getattr(dbapi_connection, "cancel", None) or getattr(dbapi_connection, "interrupt", None)
+                if cancel is not None:
+                    try:
+                        cancel()
+                    except Exception as e:
+                        logger.warning("Could not cancel statement: %s", e)
+            return len(self._executing)
+
+_request_statements: ContextVar[Optional[RequestStatements]] = ContextVar("request_statements", default=None)
+
+@event.listens_for(Session, "after_begin")
+def _set_statement_timeout(session, transaction, connection):
+    statements = _request_statements.get()
+    if statements is None or statements.timeout_ms is None or connection.dialect.name != "postgresql":
+        return
+    # Straight on the DBAPI connection, so it is not counted as a request statement
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(f"SET LOCAL statement_timeout = {statements.timeout_ms}")
+    finally:
+        cursor.close()
+
+def is_statement_timeout(exc: BaseException) -> bool:
+    orig = getattr(exc, "orig", exc)
+    return getattr(orig, "pgcode", None) == QUERY_CANCELED and "statement timeout" in str(orig)
+
+def is_statement_cancelled(exc: BaseException) -> bool:
+    """Cancelled because the client went away (psycopg2 cancel or sqlite3 interrupt)"""
+    orig = getattr(exc, "orig", exc)
+    if getattr(orig, "pgcode", None) == QUERY_CANCELED:
+        return not is_statement_timeout(orig)
+    return str(orig) == "interrupted"
+
+def install_statement_guard(engine):
+    """Track the statements each request runs and count timeouts and cancellations"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements = _request_statements.get()
+        if statements is not None:
+            statements.started(cursor.connection)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements = _request_statements.get()
+        if statements is not None:
+            statements.finished(cursor.connection)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        statements = _request_statements.get()
+        if statements is None:
+            return
+        cursor = getattr(context.execution_context, "cursor", None)
+        if cursor is not None:
+            statements.finished(cursor.connection)
+        orig = context.original_exception
+        if getattr(orig, "pgcode", None) == QUERY_CANCELED:
+            reason = "timeout" if is_statement_timeout(orig) else "cancelled"
+            DB_STATEMENTS_CANCELLED.inc(labels=(reason, statements.label))
+            logger.warning("Statement %s for %s: %s", reason, statements.label, context.statement)
+        elif statements.disconnected:
+            # sqlite3 interrupt and the like
+            DB_STATEMENTS_CANCELLED.inc(labels=("cancelled", statements.label))
+
+class StatementTimeoutMiddleware:
+    """ASGI middleware applying statement timeouts and cancelling on client disconnect"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        label = route_class(scope["method"], scope["path"]) or "other"
+        statements = RequestStatements(statement_timeout_for(scope["method"], scope["path"]), label)
+        token = _request_statements.set(statements)
+
+        # All messages go through one reader, which notices the disconnect
+        # while the endpoint is still busy in the database
+        messages = asyncio.Queue()
+        response = {"complete": False}
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Servers report a disconnect once the response is out
+                response["complete"] = True
+
+        async def read_messages():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if response["complete"]:
+                        return
+                    cancelled = await asyncio.to_thread(statements.cancel)
+                    if cancelled:
+                        logger.info("Client went away: cancelled %d statement(s) of %s %s",
+                                    cancelled, scope["method"], scope["path"])
+                    return
+
+        reader = asyncio.create_task(read_messages())
+        try:
+            await self.app(scope, messages.get, send_wrapper)
+        finally:
+            reader.cancel()
+            _request_statements.reset(token)
@@ -1,20 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from schemas.appointment_schema import (
-    AppointmentCreate, AppointmentResponse, AppointmentStatusUpdate, AppointmentFilter
+    AppointmentCreate, AppointmentResponse, AppointmentStatusUpdate, AppointmentFilter, AppointmentPage
 )
-from controllers.appointment_controller import AppointmentController
-from utils.database import get_db
-from utils.auth import get_current_user
+from controllers.appointment_controller import AppointmentController, EXPORT_COLUMNS, EXPORT_NAME_COLUMNS
+from utils.database import get_db, get_read_db, mark_recent_write, replica_router
+from utils.export import FORMATS, stream_rows
+from utils.auth import get_current_user, oauth2_scheme, token_claims, authenticate_token
+from utils.etags import make_etag, etag_matches, set_etag, not_modified
+from utils.serialization import AppointmentListing, list_response, serialize_appointments
+from utils.idempotency import idempotency_store, fingerprint
+from utils.events import publish_appointment_event
 from schemas.user_schema import UserResponse
 from typing import List, Optional
 from datetime import datetime
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
-@router.post("/", response_model=AppointmentResponse, status_code=status.HTTP_201_CREATED)
+def appointment_listing(
+    fields: Optional[str] = Query(None, description="Comma separated appointment fields, e.g. id,appointment_datetime,status"),
+    user_fields: Optional[str] = Query(None, description="Comma separated fields for patient/doctor, e.g. id,full_name"),
+    view: str = Query("embedded", pattern="^(embedded|normalized)$",
+                      description="normalized: patient_id/doctor_id plus a de-duplicated users map")
+) -> AppointmentListing:
+    """Sparse fieldset and normalization options shared by the listing endpoints"""
+    return AppointmentListing(fields, user_fields, view)
+
+def book_appointment(db: Session, appointment: AppointmentCreate, current_user: UserResponse,
+                     retry: bool = False) -> ORJSONResponse:
+    try:
+        db_appointment = AppointmentController.create_appointment(db, appointment, current_user.id)
+    except HTTPException as exc:
+        # A retry whose first attempt went through elsewhere (another worker,
+        # or a lost response before the key was stored) finds its own booking
+        existing = None
+        if retry and exc.status_code == status.HTTP_400_BAD_REQUEST:
+            existing = AppointmentController.get_own_active_booking(db, appointment, current_user.id)
+        if existing is None:
+            raise
+        return ORJSONResponse(serialize_appointments([existing])[0], status_code=status.HTTP_201_CREATED)
+    
+    mark_recent_write(current_user.id)
+    publish_appointment_event("appointment.created", db_appointment)
+    return ORJSONResponse(serialize_appointments([db_appointment])[0], status_code=status.HTTP_201_CREATED)
+
+def listing_body(db: Session, listing: AppointmentListing, appointments: list) -> dict:
+    users = None
+    if listing.references_users:
+        users = AppointmentController.get_referenced_users(db, appointments)
+    return listing.body(appointments, users)
+
+@router.post("/", response_model=AppointmentResponse, status_code=status.HTTP_201_CREATED,
+             response_class=ORJSONResponse)
 def create_appointment(
     appointment: AppointmentCreate,
+    idempotency_key: Optional[str] = Header(
+        None, description="Client-generated key; retries with the same key return the first response"
+    ),
     current_user: UserResponse = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -25,19 +68,40 @@ def create_appointment(
                 detail="Only patients can book appointments"
 )
     
-    return AppointmentController.create_appointment(db, appointment, current_user.id)
+    if idempotency_key is None:
+        return book_appointment(db, appointment, current_user)
+    
+    scope = str(current_user.id)
+    request_fingerprint = fingerprint(appointment)
+    replay = idempotency_store.begin(scope, idempotency_key, request_fingerprint)
+    if replay is not None:
+        return replay
+    
+    try:
+        response = book_appointment(db, appointment, current_user, retry=True)
+    except HTTPException as exc:
+        idempotency_store.finish(scope, idempotency_key, request_fingerprint, ORJSONResponse(
+            {"detail": exc.detail}, status_code=exc.status_code
+        ))
+        raise
+    except Exception:
+        idempotency_store.release(scope, idempotency_key)
+        raise
+    idempotency_store.finish(scope, idempotency_key, request_fingerprint, response)
+    return response
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=AppointmentPage, response_class=ORJSONResponse)
 def get_appointments(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    status: Optional[str] = Query(None, regex="^(pending|confirmed|cancelled|completed)$"),
+    status: Optional[str] = Query(None, pattern="^(pending|confirmed|cancelled|completed)$"),
     doctor_id: Optional[int] = None,
     patient_id: Optional[int] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
+    listing: AppointmentListing = Depends(appointment_listing),
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get appointments with filtering and pagination"""
     
@@ -52,54 +116,103 @@ def get_appointments(
     )
     
     result = AppointmentController.get_appointments(
-        db, filters, current_user.id, current_user.user_type
+        db, filters, current_user.id, current_user.user_type, load_users=listing.embeds_users
     )
     
-    return {
-        "appointments": [AppointmentResponse.from_orm(apt) for apt in result["appointments"]],
-        "total": result["total"],
-        "skip": result["skip"],
-        "limit": result["limit"]
-    }
+    body = listing_body(db, listing, result["appointments"])
+    body.update(total=result["total"], skip=result["skip"], limit=result["limit"])
+    return ORJSONResponse(body)
+
+@router.get("/export")
+def export_appointments(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = Query(False, description="Compress the download (.gz)"),
+    include_names: bool = Query(False, description="Add patient_name and doctor_name columns"),
+    status: Optional[str] = Query(None, pattern="^(pending|confirmed|cancelled|completed)$"),
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Stream all matching appointments as CSV or NDJSON (Admins only)"""
+    if current_user.user_type != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    filters = AppointmentFilter(
+        status=status, doctor_id=doctor_id, patient_id=patient_id, date_from=date_from, date_to=date_to
+    )
+    columns = EXPORT_COLUMNS + (EXPORT_NAME_COLUMNS if include_names else ())
+    media_type, extension = FORMATS[format]
+    filename = f"appointments.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    
+    rows = stream_rows(
+        lambda: replica_router.read_session(current_user.id),
+        lambda session: AppointmentController.export_rows(session, filters, include_names),
+        columns, format, compress=gzip,
+    )
+    return StreamingResponse(rows, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @router.get("/{appointment_id}", response_model=AppointmentResponse)
 def get_appointment(
     appointment_id: int,
-    current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
 ):
-    """Get appointment by ID"""
-    return AppointmentController.get_appointment_by_id(
+    """Get appointment by ID (304 when If-None-Match has the current ETag)"""
+    if if_none_match:
+        user_id, email = token_claims(token)
+        versions = AppointmentController.get_visible_versions(db, appointment_id, user_id, email)
+        if versions is not None and etag_matches(if_none_match, make_etag("appointment", appointment_id, *versions)):
+            return not_modified(make_etag("appointment", appointment_id, *versions))
+    
+    current_user = authenticate_token(token, db)
+    appointment = AppointmentController.get_appointment_by_id(
         db, appointment_id, current_user.id, current_user.user_type
     )
+    set_etag(response, make_etag("appointment", appointment.id, *AppointmentController.etag_versions(appointment)))
+    return appointment
 
 @router.put("/{appointment_id}/status", response_model=AppointmentResponse)
 def update_appointment_status(
     appointment_id: int,
     status_update: AppointmentStatusUpdate,
+    response: Response,
     current_user: UserResponse = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update appointment status"""
-    return AppointmentController.update_appointment_status(
+    appointment = AppointmentController.update_appointment_status(
         db, appointment_id, status_update.status.value, current_user.id, current_user.user_type
     )
+    mark_recent_write(current_user.id)
+    publish_appointment_event("appointment.status_changed", appointment)
+    set_etag(response, make_etag("appointment", appointment.id, *AppointmentController.etag_versions(appointment)))
+    return appointment
 
-@router.get("/my/upcoming", response_model=List[AppointmentResponse])
+@router.get("/my/upcoming", response_model=List[AppointmentResponse], response_class=ORJSONResponse)
 def get_my_upcoming_appointments(
+    listing: AppointmentListing = Depends(appointment_listing),
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get current user's upcoming appointments"""
     appointments = AppointmentController.get_upcoming_appointments(
-        db, current_user.id, current_user.user_type
+        db, current_user.id, current_user.user_type, load_users=listing.embeds_users
     )
-    return [AppointmentResponse.from_orm(apt) for apt in appointments]
+    body = listing_body(db, listing, appointments)
+    return ORJSONResponse(body) if listing.normalized else list_response(body["appointments"])
 
-@router.get("/today/all", response_model=List[AppointmentResponse])
+@router.get("/today/all", response_model=List[AppointmentResponse], response_class=ORJSONResponse)
 def get_todays_appointments(
+    listing: AppointmentListing = Depends(appointment_listing),
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get today's appointments (for dashboard)"""
     today = datetime.utcnow().date()
@@ -111,22 +224,23 @@ def get_todays_appointments(
     )
     
     result = AppointmentController.get_appointments(
-        db, filters, current_user.id, current_user.user_type
+        db, filters, current_user.id, current_user.user_type, load_users=listing.embeds_users
     )
     
-    return [AppointmentResponse.from_orm(apt) for apt in result["appointments"]]
+    body = listing_body(db, listing, result["appointments"])
+    return ORJSONResponse(body) if listing.normalized else list_response(body["appointments"])
 
 @router.get("/stats/summary")
 def get_appointment_stats(
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get appointment statistics for dashboard"""
     
     # Get all appointments for the current user
     filters = AppointmentFilter(skip=0, limit=1000)
     result = AppointmentController.get_appointments(
-        db, filters, current_user.id, current_user.user_type
+        db, filters, current_user.id, current_user.user_type, load_users=False
     )
     
     appointments = result["appointments"]
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from utils.database import get_read_db
+from utils.auth import authenticate_token, optional_oauth2_scheme
+from utils.events import event_hub, user_topic, encode_frame
+from schemas.user_schema import UserResponse
+from time import monotonic
+from typing import Optional
+import asyncio
+import os
+
+router = APIRouter(prefix="/live", tags=["live"])
+
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+# Streams are closed after this long and the browser reconnects (with
+# Last-Event-ID), which spreads clients over workers and lets deploys drain
+LIVE_STREAM_MAX_SECONDS = float(os.getenv("LIVE_STREAM_MAX_SECONDS", "300"))
+
+def get_stream_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = Query(None, description="Bearer token, for EventSource clients that cannot set headers"),
+    db: Session = Depends(get_read_db)
+) -> UserResponse:
+    return authenticate_token(token or access_token, db)
+
+@router.get("/appointments")
+async def appointment_events(
+    current_user: UserResponse = Depends(get_stream_user),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Server-Sent Events stream of appointment changes visible to the current user.
+
+    Events: ``appointment.created`` and ``appointment.status_changed``, each with
+    the appointment (without patient/doctor). Patients and doctors receive their
+    own appointments, admins all of them. ``resync`` means events were missed
+    and the client should reload its data.
+    """
+    topic = user_topic(current_user.user_type, current_user.id)
+    subscription = event_hub.subscribe(topic)
+
+    backlog = []
+    if last_event_id:
+        backlog = event_hub.replay_after(last_event_id, topic)
+        if backlog is None:
+            backlog = [encode_frame(last_event_id, "resync", {})]
+
+    async def stream():
+        deadline = monotonic() + LIVE_STREAM_MAX_SECONDS
+        try:
+            yield b"retry: 3000\n\n"
+            for frame in backlog:
+                yield frame
+            while True:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    frame = await asyncio.wait_for(
+                        subscription.queue.get(), min(LIVE_HEARTBEAT_SECONDS, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield b": keep-alive\n\n"
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,18 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from schemas.report_schema import ReportResponse
+from schemas.report_schema import ReportResponse, ReportJobCreate, ReportJobResponse
 from controllers.report_controller import ReportController
-from utils.database import get_db
+from controllers.analytics_controller import AnalyticsController
+from utils.database import get_db, get_read_db
 from utils.auth import get_current_user
 from schemas.user_schema import UserResponse
-from typing import List
+from typing import List, Optional
+from datetime import date
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+def require_admin(current_user: UserResponse):
+    if current_user.user_type != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
 @router.post("/generate/{year}/{month}", response_model=List[ReportResponse])
 def generate_monthly_report(year: int, month: int,
                           current_user: UserResponse = Depends(get_current_user),
                           db: Session = Depends(get_db)):
-    if current_user.user_type != "admin":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    return ReportController.generate_monthly_report(db, year, month)
\ No newline at end of file
+    require_admin(current_user)
+    return ReportController.generate_monthly_report(db, year, month)
+
+@router.post("/jobs", response_model=ReportJobResponse, status_code=202)
+def create_report_job(job: ReportJobCreate,
+                      current_user: UserResponse = Depends(get_current_user),
+                      db: Session = Depends(get_db)):
+    """Generate reports for a range of months in the background; poll the returned job"""
+    require_admin(current_user)
+    return ReportController.create_job(db, job.start_month, job.end_month, current_user.id)
+
+@router.get("/jobs/{job_id}", response_model=ReportJobResponse)
+def get_report_job(job_id: str,
+                   current_user: UserResponse = Depends(get_current_user),
+                   db: Session = Depends(get_db)):
+    require_admin(current_user)
+    return ReportController.get_job(db, job_id)
+
+@router.post("/jobs/{job_id}/cancel", response_model=ReportJobResponse)
+def cancel_report_job(job_id: str,
+                      current_user: UserResponse = Depends(get_current_user),
+                      db: Session = Depends(get_db)):
+    require_admin(current_user)
+    return ReportController.cancel_job(db, job_id)
+
+@router.get("/jobs/{job_id}/reports", response_model=List[ReportResponse])
+def get_report_job_reports(job_id: str,
+                           skip: int = Query(0, ge=0),
+                           limit: int = Query(100, ge=1, le=1000),
+                           current_user: UserResponse = Depends(get_current_user),
+                           db: Session = Depends(get_db)):
+    require_admin(current_user)
+    return ReportController.get_job_reports(db, job_id, skip, limit)
+
+@router.get("/analytics/trends")
+def get_booking_trends(date_from: date, date_to: date,
+                       group_by: str = Query("day", description="day, specialization or division"),
+                       window: Optional[int] = Query(None, ge=2, le=90, description="Rolling window in days"),
+                       current_user: UserResponse = Depends(get_current_user),
+                       db: Session = Depends(get_read_db)):
+    """Bookings, cancellation and no-show rates over a date range"""
+    require_admin(current_user)
+    return AnalyticsController.get_trends(db, date_from, date_to, group_by, window)
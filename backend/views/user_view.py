@@ -1,17 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, UploadFile, File, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from schemas.user_schema import UserCreate, UserResponse, LoginRequest, TokenResponse, UserUpdateRequest
+from schemas.user_schema import (
+    UserCreate, UserResponse, LoginRequest, TokenResponse, UserUpdateRequest, UserPage, DoctorPage
+)
+from schemas.availability_schema import (
+    AvailabilityResponse, AvailabilityRulesUpdate, AvailabilityRuleResponse, AvailabilityExceptionCreate,
+    AvailabilityExceptionResponse
+)
 from controllers.user_controller import UserController
-from utils.database import get_db
-from utils.auth import get_current_user, create_access_token
+from controllers.calendar_controller import CalendarController
+from controllers.availability_controller import AvailabilityController
+from utils.database import get_db, get_read_db, mark_recent_write
+from utils.auth import (
+    get_current_user, create_access_token, oauth2_scheme, token_claims, load_token_user, authenticate_token
+)
+from utils.etags import make_etag, etag_matches, set_etag, not_modified
+from utils.serialization import serialize_users, page_response
+from utils.events import publish_doctor_event
 from typing import List, Optional
+from datetime import date, datetime, timedelta
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user (patient, doctor, or admin)"""
-    return UserController.create_user(db, user)
+    db_user = UserController.create_user(db, user)
+    mark_recent_write(db_user.id)
+    if db_user.user_type.value == "doctor":
+        publish_doctor_event(db_user.id)
+    return db_user
 
 @router.post("/login", response_model=TokenResponse)
 def login(login_data: LoginRequest, db: Session = Depends(get_db)):
@@ -32,29 +51,99 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     }
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_profile(current_user: UserResponse = Depends(get_current_user)):
-    """Get current user's profile"""
-    return current_user
+def get_current_user_profile(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
+):
+    """Get current user's profile (304 when If-None-Match has the current ETag)"""
+    user_id, email = token_claims(token)
+    if if_none_match:
+        version = UserController.get_visible_version(db, user_id, user_id, email)
+        if version is not None and etag_matches(if_none_match, make_etag("user", user_id, version)):
+            return not_modified(make_etag("user", user_id, version))
+    
+    user = load_token_user(db, user_id, email)
+    set_etag(response, make_etag("user", user.id, user.version))
+    return user
 
 @router.put("/me", response_model=UserResponse)
 def update_current_user_profile(
     user_update: UserUpdateRequest,
+    response: Response,
     current_user: UserResponse = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update current user's profile"""
-    return UserController.update_user(db, current_user.id, user_update)
+    user = UserController.update_user(db, current_user.id, user_update)
+    mark_recent_write(current_user.id)
+    if current_user.user_type == "doctor":
+        publish_doctor_event(current_user.id)
+    set_etag(response, make_etag("user", user.id, user.version))
+    return user
+
+def require_doctor(current_user: UserResponse):
+    if current_user.user_type != "doctor":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only doctors have availability")
+
+@router.get("/me/availability", response_model=AvailabilityResponse)
+def get_my_availability(
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Weekly availability rules and upcoming time off of the current doctor"""
+    require_doctor(current_user)
+    return AvailabilityController.get_availability(db, current_user.id)
+
+@router.put("/me/availability/rules", response_model=List[AvailabilityRuleResponse])
+def replace_my_availability_rules(
+    update: AvailabilityRulesUpdate,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Replace the current doctor's weekly availability rules"""
+    require_doctor(current_user)
+    rules = AvailabilityController.replace_rules(db, current_user.id, update.rules)
+    mark_recent_write(current_user.id)
+    publish_doctor_event(current_user.id)
+    return rules
 
-@router.get("/", response_model=dict)
+@router.post("/me/availability/exceptions", response_model=AvailabilityExceptionResponse,
+             status_code=status.HTTP_201_CREATED)
+def add_my_availability_exception(
+    exception: AvailabilityExceptionCreate,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add time off (a whole day or a time range)"""
+    require_doctor(current_user)
+    db_exception = AvailabilityController.add_exception(db, current_user.id, exception)
+    mark_recent_write(current_user.id)
+    publish_doctor_event(current_user.id)
+    return db_exception
+
+@router.delete("/me/availability/exceptions/{exception_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_my_availability_exception(
+    exception_id: int,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    require_doctor(current_user)
+    AvailabilityController.delete_exception(db, current_user.id, exception_id)
+    mark_recent_write(current_user.id)
+    publish_doctor_event(current_user.id)
+
+@router.get("/", response_model=UserPage, response_class=ORJSONResponse)
 def get_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    user_type: Optional[str] = Query(None, regex="^(admin|doctor|patient)$"),
+    user_type: Optional[str] = Query(None, pattern="^(admin|doctor|patient)$"),
     specialization: Optional[str] = None,
     division: Optional[str] = None,
     search: Optional[str] = None,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get users with filtering and pagination (Admin only for all users, others can see doctors)"""
     
@@ -66,48 +155,92 @@ def get_users(
         db, skip, limit, user_type, specialization, division, search
     )
     
-    return {
-        "users": [UserResponse.from_orm(user) for user in result["users"]],
-        "total": result["total"],
-        "skip": result["skip"],
-        "limit": result["limit"]
-    }
+    return page_response(
+        "users", serialize_users(result["users"]), result["total"], result["skip"], result["limit"]
+    )
 
-@router.get("/doctors", response_model=dict)
+@router.get("/doctors", response_model=DoctorPage, response_class=ORJSONResponse)
 def get_doctors(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     specialization: Optional[str] = None,
     division: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get doctors with filtering and pagination (Public endpoint)"""
     result = UserController.get_users(
         db, skip, limit, "doctor", specialization, division, search
     )
     
-    return {
-        "doctors": [UserResponse.from_orm(user) for user in result["users"]],
-        "total": result["total"],
-        "skip": result["skip"],
-        "limit": result["limit"]
-    }
+    return page_response(
+        "doctors", serialize_users(result["users"]), result["total"], result["skip"], result["limit"]
+    )
+
+@router.get("/doctors/earliest-slots", response_class=ORJSONResponse)
+def get_earliest_slots(
+    specialization: Optional[str] = None,
+    division: Optional[str] = None,
+    district: Optional[str] = None,
+    max_fee: Optional[float] = Query(None, ge=0),
+    after: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Soonest free slots across all doctors matching the filters"""
+    slots = CalendarController.get_earliest_slots(
+        db, limit, after, specialization=specialization, division=division, district=district, max_fee=max_fee
+    )
+    return ORJSONResponse({"slots": slots})
+
+@router.get("/doctors/{doctor_id}/calendar", response_class=ORJSONResponse)
+def get_doctor_calendar(
+    doctor_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Free/busy grid of a doctor per day (defaults to the next 7 days)"""
+    date_from = date_from or date.today()
+    date_to = date_to or date_from + timedelta(days=6)
+    return ORJSONResponse(CalendarController.get_doctor_calendar(db, doctor_id, date_from, date_to))
+
+@router.get("/doctors/{doctor_id}/availability", response_model=AvailabilityResponse)
+def get_doctor_availability(
+    doctor_id: int,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Weekly availability rules and upcoming time off of a doctor"""
+    return AvailabilityController.get_availability(db, doctor_id)
 
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user_by_id(
     user_id: int,
-    current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
 ):
-    """Get user by ID (Admin only or own profile)"""
+    """Get user by ID (Admin only or own profile; 304 when If-None-Match has the current ETag)"""
+    if if_none_match:
+        requester_id, email = token_claims(token)
+        version = UserController.get_visible_version(db, user_id, requester_id, email)
+        if version is not None and etag_matches(if_none_match, make_etag("user", user_id, version)):
+            return not_modified(make_etag("user", user_id, version))
+    
+    current_user = authenticate_token(token, db)
     if current_user.user_type != "admin" and current_user.id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view this user"
         )
     
-    return UserController.get_user_by_id(db, user_id)
+    user = UserController.get_user_by_id(db, user_id)
+    set_etag(response, make_etag("user", user.id, user.version))
+    return user
 
 @router.post("/upload-profile-image")
 def upload_profile_image(
@@ -116,20 +249,22 @@ def upload_profile_image(
     db: Session = Depends(get_db)
 ):
     """Upload profile image for current user"""
-    return UserController.upload_profile_image(db, current_user.id, file)
+    result = UserController.upload_profile_image(db, current_user.id, file)
+    mark_recent_write(current_user.id)
+    return result
 
-@router.get("/doctors/available/{date}")
+@router.get("/doctors/available/{date}", response_class=ORJSONResponse)
 def get_available_doctors(
     date: str,
     time_slot: Optional[str] = Query(None, description="Time slot in format 'HH:MM - HH:MM'"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get available doctors for a specific date and (optionally) time slot"""
     doctors = UserController.get_doctors_by_availability(db, date, time_slot)
     response = {
-        "available_doctors": [UserResponse.from_orm(doctor) for doctor in doctors],
+        "available_doctors": serialize_users(doctors),
         "date": date
     }
     if time_slot is not None:
         response["time_slot"] = time_slot
-    return response
\ No newline at end of file
+    return ORJSONResponse(response)
\ No newline at end of file